@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 02:15:37 2026
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import sys
+
+import SOFIACruiseTools.support.batch
+
+
+if __name__ == '__main__':
+    sys.exit(SOFIACruiseTools.support.batch.main())
@@ -18,6 +18,7 @@ import glob
 import fnmatch
 import datetime
 import itertools
+from timeit import default_timer
 from os import listdir, walk
 from os.path import join, basename, getmtime
 
@@ -208,6 +209,64 @@ class FITSKeyWordDialog(QtWidgets.QDialog, fkwp.Ui_FITSKWDialog):
         self.headers = [hlab.upper() for hlab in self.headers]
 
 
+class DiagnosticsDialog(QtWidgets.QDialog):
+    """
+    Hidden panel (Ctrl+Shift+D) showing how long the things in the GUI loop
+    are taking, refreshed every second while it's open.  Nothing in the
+    generated panels, so it's all set up by hand here.
+    """
+    def __init__(self, parent=None):
+        super(DiagnosticsDialog, self).__init__(parent)
+        self.setWindowTitle("Director Diagnostics")
+        self.resize(720, 260)
+
+        self.report = QtWidgets.QPlainTextEdit(self)
+        self.report.setReadOnly(True)
+        self.report.setFont(QtGui.QFontDatabase.systemFont(
+            QtGui.QFontDatabase.FixedFont))
+        self.report.setLineWrapMode(QtWidgets.QPlainTextEdit.NoWrap)
+
+        self.dumpbutton = QtWidgets.QPushButton("Dump to File", self)
+        self.closebutton = QtWidgets.QPushButton("Close", self)
+        buttons = QtWidgets.QHBoxLayout()
+        buttons.addStretch(1)
+        buttons.addWidget(self.dumpbutton)
+        buttons.addWidget(self.closebutton)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.report)
+        layout.addLayout(buttons)
+
+        self.dumpbutton.clicked.connect(self.dumpreport)
+        self.closebutton.clicked.connect(self.hide)
+
+        self.looptimers = self.parentWidget().looptimers
+        self.refresher = QtCore.QTimer(self)
+        self.refresher.timeout.connect(self.refresh)
+
+    def refresh(self):
+        self.report.setPlainText(self.looptimers.report())
+
+    def showEvent(self, event):
+        self.refresh()
+        self.refresher.start(1000)
+        super(DiagnosticsDialog, self).showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresher.stop()
+        super(DiagnosticsDialog, self).hideEvent(event)
+
+    def dumpreport(self):
+        dtxt = 'Save Diagnostics As'
+        outname = QtWidgets.QFileDialog.getSaveFileName(self, dtxt)[0]
+        if outname != '':
+            try:
+                self.looptimers.dump(outname, samples=True)
+            except Exception as why:
+                print(str(why))
+                self.report.appendPlainText("ERROR WRITING TO FILE!")
+
+
 class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
     def __init__(self):
         # Since the SOFIACruiseDirectorPanel file will be overwritten each time
@@ -220,9 +279,44 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
 
         self.setupUi(self)
 
+        # LOS rewind countdown; it goes in the leg details right under
+        #   the obs. plan, but it's added here since the panel is generated
+        self.txt_rewind = QtWidgets.QLabel(self.leg_details)
+        font = QtGui.QFont()
+        font.setBold(True)
+        font.setWeight(75)
+        self.txt_rewind.setFont(font)
+        self.txt_rewind.setText("Next LOS Rewind")
+        self.gridLayout_6.addWidget(self.txt_rewind, 6, 0, 1, 1)
+        self.leg_rewind = QtWidgets.QLabel(self.leg_details)
+        self.leg_rewind.setText("")
+        self.gridLayout_6.addWidget(self.leg_rewind, 6, 1, 1, 1)
+        # Same deal for the live planned values at the current time
+        self.txt_plannednow = QtWidgets.QLabel(self.leg_details)
+        self.txt_plannednow.setFont(font)
+        self.txt_plannednow.setText("Planned Now")
+        self.gridLayout_6.addWidget(self.txt_plannednow, 7, 0, 1, 1)
+        self.leg_plannednow = QtWidgets.QLabel(self.leg_details)
+        self.leg_plannednow.setText("")
+        self.gridLayout_6.addWidget(self.leg_plannednow, 7, 1, 1, 1)
+        # And how far off the plan's schedule we're running
+        self.txt_slip = QtWidgets.QLabel(self.leg_details)
+        self.txt_slip.setFont(font)
+        self.txt_slip.setText("Schedule Slip")
+        self.gridLayout_6.addWidget(self.txt_slip, 8, 0, 1, 1)
+        self.leg_slip = QtWidgets.QLabel(self.leg_details)
+        self.leg_slip.setText("")
+        self.gridLayout_6.addWidget(self.leg_slip, 8, 1, 1, 1)
+
         # Some constants/tracking variables and various defaults
         self.legpos = 0
         self.successparse = False
+        self.rewinds = None
+        self.flightindex = None
+        self.drift = None
+        # Leg that was last auto-selected by time; stepping through the legs
+        #   by hand sticks until the plan moves on to another leg
+        self.autolegpos = -1
         self.toggle_legparam_values_off()
         self.metcounting = False
         self.ttlcounting = False
@@ -299,6 +393,23 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         # Actually show the table
         self.table_datalog.show()
 
+        # Time the things in the GUI loop that could get slow as the night
+        #   goes on, before anything gets hooked up to them
+        self.tickinterval = 500
+        self.lasttick = None
+        self.looptimers = fpmis.looptimers()
+        self.showlcd = self.looptimers.wrap('showlcd', self.showlcd)
+        self.updateDatalog = self.looptimers.wrap('updateDatalog',
+                                                  self.updateDatalog)
+        self.setTableData = self.looptimers.wrap('setTableData',
+                                                 self.setTableData)
+        self.writedatalog = self.looptimers.wrap('writedatalog',
+                                                 self.writedatalog)
+        self.diagnostics = DiagnosticsDialog(self)
+        self.diagnosticskey = QtWidgets.QShortcut(
+            QtGui.QKeySequence("Ctrl+Shift+D"), self)
+        self.diagnosticskey.activated.connect(self.toggleDiagnostics)
+
         # Hooking up the various buttons to their actions to take
         # Open the file chooser for the flight plan input
         self.flightplan_openfile.clicked.connect(self.selectInputFile)
@@ -331,8 +442,11 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
 
         self.datalog_opendir.clicked.connect(self.selectDir)
         self.datalog_savefile.clicked.connect(self.selectLogOutputFile)
-        self.datalog_forcewrite.clicked.connect(self.writedatalog)
-        self.datalog_forceupdate.clicked.connect(self.updateDatalog)
+        # The timed wrappers take anything, so don't let clicked's checked
+        #   argument through to methods that don't want it
+        self.datalog_forcewrite.clicked.connect(lambda: self.writedatalog())
+        self.datalog_forceupdate.clicked.connect(
+            lambda: self.updateDatalog())
         self.datalog_editkeywords.clicked.connect(self.spawnkwwindow)
         self.datalog_addrow.clicked.connect(self.adddatalogrow)
         self.datalog_deleterow.clicked.connect(self.deldatalogrow)
@@ -342,9 +456,15 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         # Generic timer setup stuff
         timer = QtCore.QTimer(self)
         timer.timeout.connect(self.showlcd)
-        timer.start(500)
+        timer.start(self.tickinterval)
         self.showlcd()
 
+    def toggleDiagnostics(self):
+        if self.diagnostics.isVisible() is True:
+            self.diagnostics.hide()
+        else:
+            self.diagnostics.show()
+
     def spawnkwwindow(self):
         window = FITSKeyWordDialog(self)
         result = window.exec_()
@@ -392,6 +512,8 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
             except Exception:
                 self.txt_logoutputname.setText("ERROR WRITING TO FILE!")
 
+        return timestamp
+
     def mark_faultmccs(self):
         line = "MCCS fault encountered"
         self.linestamper(line)
@@ -402,23 +524,33 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
 
     def mark_landing(self):
         line = "End of flight, packing up and sitting down"
-        self.linestamper(line)
+        timestamp = self.linestamper(line)
+        if self.drift is not None:
+            self.drift.markLanding(timestamp)
 
     def mark_onheading(self):
         line = "On heading, TOs setting up"
-        self.linestamper(line)
+        timestamp = self.linestamper(line)
+        if self.drift is not None:
+            self.drift.markLegStart(timestamp)
 
     def mark_ontarget(self):
         line = "On target, SI taking over"
-        self.linestamper(line)
+        timestamp = self.linestamper(line)
+        if self.drift is not None:
+            self.drift.markOnTarget(timestamp)
 
     def mark_takeoff(self):
         line = "Beginning of flight, getting set up"
-        self.linestamper(line)
+        timestamp = self.linestamper(line)
+        if self.drift is not None:
+            self.drift.markTakeoff(timestamp)
 
     def mark_turning(self):
         line = "Turning off target"
-        self.linestamper(line)
+        timestamp = self.linestamper(line)
+        if self.drift is not None:
+            self.drift.markLegEnd(timestamp)
 
     def selectOutputFile(self):
         """
@@ -587,6 +719,14 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         Since the times were converted to local elsewhere,
         we ditch the tzinfo to make everything naive to subtract easier.
         """
+        # How late this tick is compared to when the timer should have
+        #   fired; if this creeps up, the clocks are lagging
+        tick = default_timer()
+        if self.lasttick is not None:
+            self.looptimers.add('ticklag', max(0., tick - self.lasttick -
+                                               self.tickinterval/1000.))
+        self.lasttick = tick
+
         # Update the current local/utc times before computing timedeltas
         self.update_times()
         # We set the takeoff time to be in local time, and we know the
@@ -645,6 +785,13 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
                 self.legelapsedstr = self.totalsec_to_hms_str(self.legelapsed)
                 self.txt_leg_timer.setText(self.legelapsedstr)
 
+        if self.successparse is True and self.drift is not None:
+            self.updateDrift()
+        if self.successparse is True and self.flightindex is not None:
+            self.updatePlannedState()
+        if self.successparse is True and self.rewinds is not None:
+            self.updateRewindCountdown()
+
         self.txt_utc.setText(self.utcnow_str)
         self.txt_localtime.setText(self.localnow_str)
 
@@ -654,6 +801,85 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
                 self.updateDatalog()
 #                print self.datatable
 
+    def sinceTakeoff(self):
+        """
+        Seconds since takeoff; once takeoff has been marked this is where
+        we are in the plan's timeline allowing for the schedule slip,
+        otherwise it goes by the actual takeoff time if the MET is
+        counting, or the takeoff time in the flight plan if not
+        """
+        if self.drift is not None and self.drift.started is True:
+            return self.drift.plantime
+        elif self.metcounting is True:
+            return self.met.total_seconds()
+        else:
+            return (self.utcnow - self.flightinfo.takeoff).total_seconds()
+
+    def updatePlannedState(self):
+        """
+        Look up where the flight plan says we should be right now; move
+        the leg display along when the plan moves on to the next leg, and
+        show the planned values at this instant.
+        """
+        state = self.flightindex.stateAt(self.sinceTakeoff())
+        if state.legindex < 0:
+            self.leg_plannednow.setText('')
+            return
+
+        if state.legindex != self.autolegpos:
+            self.autolegpos = state.legindex
+            self.legpos = state.legindex
+            self.lginfo = self.flightinfo.legs[self.legpos]
+            self.updateLegInfoWindow()
+
+        nowstr = "THdg %.1f  %.2f, %.2f" % (state.thdg, state.lat, state.lon)
+        if state.leg.legtype == 'Observing':
+            nowstr = "Elev %.1f  ROF %.1f (%.2f/min)  " % \
+                (state.elev, state.rof, state.rofrt) + nowstr
+        self.leg_plannednow.setText(nowstr)
+
+    def updateDrift(self):
+        """
+        Bring the schedule slip up to now and show it along with the
+        projected landing time.
+        """
+        if self.drift.started is False:
+            self.leg_slip.setText('')
+            return
+
+        slip = self.drift.tick(self.utcnow)
+        slipstr = "%s  Landing %s UTC" % \
+            (self.totalsec_to_hms_str(datetime.timedelta(seconds=slip)),
+             self.drift.projectedlanding.strftime('%H:%M:%S'))
+        self.leg_slip.setText(slipstr)
+
+        # Visual indicators setup; behind by 10 minutes or more is red
+        if slip >= 600:
+            self.leg_slip.setStyleSheet("QLabel { color : red; }")
+        else:
+            self.leg_slip.setStyleSheet("QLabel { color : black; }")
+
+    def updateRewindCountdown(self):
+        """
+        Show the countdown to the next LOS rewind in the flight plan.
+        """
+        sincetakeoff = self.sinceTakeoff()
+        row = fpmis.nextRewind(self.rewinds, sincetakeoff)
+        if row is None:
+            self.leg_rewind.setText('')
+            return
+
+        tminus = datetime.timedelta(seconds=row['reltime'] - sincetakeoff)
+        rewindstr = "%s (Leg %i, #%i)" % (self.totalsec_to_hms_str(tminus),
+                                          row['legno'], row['rewind'])
+        self.leg_rewind.setText(rewindstr)
+
+        # Visual indicators setup; times are in seconds
+        if tminus.total_seconds() < 60:
+            self.leg_rewind.setStyleSheet("QLabel { color : red; }")
+        else:
+            self.leg_rewind.setStyleSheet("QLabel { color : black; }")
+
     def adddatalogrow(self):
         rowPosition = self.table_datalog.rowCount()
         self.table_datalog.insertRow(rowPosition)
@@ -815,7 +1041,9 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
                 rowPosition = self.table_datalog.rowCount()
                 self.table_datalog.insertRow(rowPosition)
                 # Actually get the header data
-                theData = headerDict(realfile, self.headers, HDU=self.fitshdu)
+                with self.looptimers.time('headerDict'):
+                    theData = headerDict(realfile, self.headers,
+                                         HDU=self.fitshdu)
 #                self.allData.append(theData)
                 self.datanew.append(theData)
 
@@ -894,6 +1122,9 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         self.txt_obsplan.setVisible(False)
         self.txt_rof.setVisible(False)
         self.txt_target.setVisible(False)
+        self.txt_rewind.setVisible(False)
+        self.txt_plannednow.setVisible(False)
+        self.txt_slip.setVisible(False)
 
     def toggle_legparam_values_off(self):
         """
@@ -914,6 +1145,9 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         self.txt_obsplan.setVisible(True)
         self.txt_rof.setVisible(True)
         self.txt_target.setVisible(True)
+        self.txt_rewind.setVisible(True)
+        self.txt_plannednow.setVisible(True)
+        self.txt_slip.setVisible(True)
 
     def updateLegInfoWindow(self):
         """
@@ -1027,9 +1261,31 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         self.flightplan_filename.setStyleSheet("QLabel { color : black; }")
         self.flightplan_filename.setText(basename(str(self.fname)))
         try:
-            self.flightinfo = fpmis.parseMIS(self.fname)
+            fpmis.reset_parse_stats()
+            # The rewinds, planned state and drift all need every leg as
+            #   soon as the clock ticks, so there's nothing to gain from
+            #   parsing lazily here.  A bad field or leg gets noted rather
+            #   than sinking the lot.
+            self.flightinfo = fpmis.parseMIS(self.fname, resilient=True)
             self.lginfo = self.flightinfo.legs[self.legpos]
+            # If a leg is too broken for these, the rest of the plan is
+            #   still usable without them
+            try:
+                self.rewinds = fpmis.rewindSchedule([self.flightinfo])
+                self.flightindex = fpmis.flightindex(self.flightinfo)
+                self.drift = fpmis.drifttracker(self.flightinfo)
+            except Exception as why:
+                print("Plan is too broken for the live trackers: %s" %
+                      (str(why)))
+                self.rewinds = None
+                self.flightindex = None
+                self.drift = None
+            self.autolegpos = -1
             self.successparse = True
+            self.showParseProblems()
+            # Only says anything if SOFIA_PARSE_STATS is set
+            if fpmis.get_parse_stats()['enabled'] is True:
+                print(fpmis.format_parse_stats())
             self.updateLegInfoWindow()
             if self.set_takeoffFP.isChecked() is True:
                 self.updateTakeoffTime()
@@ -1038,11 +1294,35 @@ class SOFIACruiseDirectorApp(QtWidgets.QMainWindow, scdp.Ui_MainWindow):
         except Exception as why:
             print(str(why))
             self.flightinfo = ''
+            self.rewinds = None
+            self.flightindex = None
+            self.drift = None
             self.errmsg = 'ERROR: Failure Parsing File!'
             self.flightplan_filename.setStyleSheet("QLabel { color : red; }")
             self.flightplan_filename.setText(self.errmsg)
             self.successparse = False
 
+    def showParseProblems(self):
+        """
+        If the flight plan only partially parsed, make the filename label
+        orange and put what went wrong in its tooltip
+        """
+        diags = self.flightinfo.diagnostics
+        if diags == []:
+            self.flightplan_filename.setToolTip(str(self.fname))
+            return
+
+        problems = '\n'.join(["Line %d: %s, %s" % (lno, field, why)
+                              for lno, field, why in diags])
+        print("Parsed %s with %d problems:" % (self.fname, len(diags)))
+        print(problems)
+        self.flightplan_filename.setStyleSheet(
+            "QLabel { color : darkorange; }")
+        self.flightplan_filename.setText("%s (%d parse problems)" %
+                                         (basename(str(self.fname)),
+                                          len(diags)))
+        self.flightplan_filename.setToolTip(problems)
+
     def browse_folder(self):
         """
         What is this function for?  Is it vestigial?  I don't remember
@@ -5,14 +5,15 @@ Created on Sun Oct  9 01:14:39 2016
 @author: rhamilton
 """
 
+from __future__ import division, print_function
+
 import sys
 import getpass
 import datetime
-import numpy as np
-import astropy.table as aptable
 
-import newparse as fpmis
-import AORinator as aorparse
+from .. import support as fpmis
+from ..support import AORinator as aorparse
+from ..support import tablewriter as tw
 
 
 def underliner(instr, char="="):
@@ -45,41 +46,21 @@ def confluencer(infile):
     # Where the magic happens
     flight = fpmis.parseMIS(infile)
 
-    print "*Notes:*\n"
-    print "Flight Plan Filename: %s, Vintage: %s" %\
-        (flight.filename, flight.saved)
+    print("*Notes:*\n")
+    print("Flight Plan Filename: %s, Vintage: %s" %
+          (flight.filename, flight.saved))
 
     summy = flight.summarize()
     # Break at the line breaks so we can indent it
     #   (ended up taking out the tabs, but keeping this in case we want it)
     summarylines = summy.split("\n")
     for line in summarylines:
-        print "%s" % (line)
-    print ""
-
-    for j, oach in enumerate(flight.legs):
-        if oach.legtype != "Observing":
-            oach.ra = None
-            oach.dec = None
-            oach.range_rof = [None, None]
-            oach.range_elev = [None, None]
-
-        # print the header before the first leg
-        if j == 0:
-            print "||*Leg Number*",
-            print "||*Time Since Takeoff at Leg Start (hrs)*",
-            print "||*Leg Type*||*Target*||*RA (2000)*||*Dec (2000)*",
-            print "||*Obs Duration*||*Elevation Range*||*ROF Range*||"
-
-        # Should be self explanatory here
-        if oach.legtype == "Takeoff" or oach.legtype == "Landing" or\
-           oach.legtype == "Observing":
-            print "|%02d|%02.1f|%s|%s|%s|%s|%s|%s, %s|%s, %s|" %\
-                  (oach.legno, oach.relative_time[0]/60./60.,
-                   oach.legtype, oach.target, oach.ra, oach.dec,
-                   oach.obsdur, oach.range_elev[0], oach.range_elev[1],
-                   oach.range_rof[0], oach.range_rof[1])
-    print "----"
+        print("%s" % (line))
+    print("")
+
+    names, columns = tw.flightLegTable(flight)
+    tw.renderTable(names, columns, output='confluence')
+    print("----")
 
 
 def reSTer(infile, title, role='Team'):
@@ -94,22 +75,22 @@ def reSTer(infile, title, role='Team'):
     flight = fpmis.parseMIS(infile)
 
     h1 = "%s" % (title)
-    print underliner(h1)
-    print h1
-    print underliner(h1)
-    print ""
-    print "Cheat Sheet generated on %s" % (datetime.datetime.now()),
-    print "by %s in %s mode" % (getpass.getuser(), role)
-    print ""
+    print(underliner(h1))
+    print(h1)
+    print(underliner(h1))
+    print("")
+    print("Cheat Sheet generated on %s" % (datetime.datetime.now()), end=' ')
+    print("by %s in %s mode" % (getpass.getuser(), role))
+    print("")
 
     if role == 'Team':
         h2 = "Flight Path"
-        print h2
-        print underliner(h2)
-        print ""
+        print(h2)
+        print(underliner(h2))
+        print("")
         fpimg = infile[:-4] + ".png"
-        print ".. image:: %s" % (fpimg)
-        print ""
+        print(".. image:: %s" % (fpimg))
+        print("")
 
 #    flightnotes = []
 #    try:
@@ -126,67 +107,30 @@ def reSTer(infile, title, role='Team'):
 #    print ""
 
     h2 = "Flight Metadata"
-    print h2
-    print underliner(h2)
-    print "* Plan Filename: %s, Vintage: %s" %\
-        (flight.filename, flight.saved)
+    print(h2)
+    print(underliner(h2))
+    print("* Plan Filename: %s, Vintage: %s" %
+          (flight.filename, flight.saved))
     summy = flight.summarize()
     # Break at the line breaks so we can indent it
     #   (ended up taking out the tabs, but keeping this in case we want it)
     summarylines = summy.split("\n")
     for line in summarylines:
-        print "* %s" % (line)
-    print ""
+        print("* %s" % (line))
+    print("")
 
     # Note that this will grab the table of JUST the
     #   takeoff, observing, and landing leg details
-    obstab = []
-    obstabhed = []
-    for j, oach in enumerate(flight.legs):
-        if oach.legtype != "Observing":
-            oach.ra = None
-            oach.dec = None
-            oach.range_rof = [None, None]
-            oach.range_elev = [None, None]
-            oach.range_rofrt = [None, None]
-            oach.range_thdgrt = [None, None]
-
-        # print the header before the first leg
-        if j == 0:
-            obstabhed = ["Leg Number",
-                         "Time Since Takeoff at Leg Start (hrs)",
-                         "Leg Type", "ObsBlk", "Target",
-                         "RA (2000)", "Dec (2000)",
-                         "Obs Duration",
-                         "Elevation Range",
-                         "ROF Range",
-                         "ROF Rate", "THdg Rate"]
-
-        # Should be self explanatory here
-        if oach.legtype == "Takeoff" or oach.legtype == "Landing" or\
-           oach.legtype == "Observing":
-            tabdat = [oach.legno,
-                      np.round(oach.relative_time[0]/60./60., 1),
-                      oach.legtype, oach.obsblk,
-                      oach.target, oach.ra, oach.dec,
-                      str(oach.obsdur),
-                      str(oach.range_elev),
-                      str(oach.range_rof),
-                      str(oach.range_rofrt),
-                      str(oach.range_thdgrt)]
-
-            obstab.append(tabdat)
+    names, columns = tw.flightLegTable(flight, rates=True)
     if role == 'Team':
-        tabbie = aptable.Table(rows=obstab, names=obstabhed)
-        tabbie.write(sys.stdout, format='ascii.rst')
+        tw.renderTable(names, columns, output='rst', outie=sys.stdout)
     elif role == 'TO':
-        tabbie = aptable.Table(rows=obstab, names=obstabhed)
-        tabbie.write(sys.stdout, format='ascii.csv')
-    print ""
+        tw.renderTable(names, columns, output='csv', outie=sys.stdout)
+    print("")
 
-    print "Flight AOR Catalog"
-    print underliner("Flight AOR Catalog")
-    print ""
+    print("Flight AOR Catalog")
+    print(underliner("Flight AOR Catalog"))
+    print("")
 
 #    OMC AORs
 #    aorids = [['88_0005_43', '88_0005_42', '88_0005_41', '88_0005_40',
@@ -228,9 +172,9 @@ def reSTer(infile, title, role='Team'):
 
     # Now go leg-by-leg and print out the gory details.
     if role == 'Team':
-        print "Leg Details"
-        print underliner("Leg Details")
-        print ""
+        print("Leg Details")
+        print(underliner("Leg Details"))
+        print("")
         legnotes = []
         try:
             f = open(infile[:-4] + '.conf')
@@ -241,10 +185,11 @@ def reSTer(infile, title, role='Team'):
         for j, cleg in enumerate(flight.legs):
             pass
 
-    print ""
+    print("")
 
 
-inloc = '/Users/rhamilton/Research/HAWC/201612/Flights/wx/201612_HA_04_WX12.mis'
+if __name__ == "__main__":
+    inloc = '/Users/rhamilton/Research/HAWC/201612/Flights/wx/201612_HA_04_WX12.mis'
 
-reSTer(inloc, 'HAWC+ Comissioning Part 3 and OC4-L', role='Team')
-confluencer(inloc)
+    reSTer(inloc, 'HAWC+ Comissioning Part 3 and OC4-L', role='Team')
+    confluencer(inloc)
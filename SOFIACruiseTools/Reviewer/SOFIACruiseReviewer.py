@@ -12,14 +12,32 @@ from os.path import basename
 
 import numpy as np
 import astropy.table as apt
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+from PyQt5.QtGui import QColor
 from PyQt5.QtWidgets import QMainWindow, QApplication, QFileDialog, \
-    QHeaderView, QTableWidgetItem
+    QHeaderView, QTableWidgetItem, QMessageBox
 
 from . import mainwindow as panel
 from .. import support as fpmis
 
 
+class AutoReviewThread(QThread):
+    """
+    Runs the auto review for a bunch of flights, one after another, without
+    blocking the GUI, emitting each flight's comments as soon as its review
+    is done.  No worker processes here; forking from a thread isn't safe.
+    """
+    reviewed = pyqtSignal(str, object)
+
+    def __init__(self, flights, parent=None):
+        super(AutoReviewThread, self).__init__(parent)
+        self.flights = flights
+
+    def run(self):
+        for fhash, coms in fpmis.autoReviewSeries(self.flights):
+            self.reviewed.emit(fhash, coms)
+
+
 class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
     def __init__(self):
         # Since the ...Panel file will be overwritten each time
@@ -35,6 +53,7 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
         self.flightbasics = {}
         self.listoflights = []
         self.newflights = []
+        self.reviewthreads = []
 
         # I think this is cross-platform?  I guess we'll see
         self.lineEditUserName.setText(getpass.getuser())
@@ -53,6 +72,11 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
         # Click to change to the details for that flight
         self.tableWidgetFlightBasics.clicked.connect(self.selectFlight)
         
+        # Saving/restoring a whole review session
+        filemenu = self.menuBar().addMenu("File")
+        filemenu.addAction("Open Review Session...", self.loadSession)
+        filemenu.addAction("Save Review Session...", self.saveSession)
+
         # Autoreview/clear review
         self.pushButtonAutoReview.clicked.connect(self.autoReviewSelected)
         
@@ -87,13 +111,65 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
         selHash = self.tableWidgetFlightBasics.item(sel, 1).toolTip()
         print("Row %i selected, file has hash %s" % (sel, selHash))
         
-        coms = fpmis.autoReview(self.seReview.flights[selHash])
-        self.seReview.flights[selHash].reviewComments = coms
+        flight = self.seReview.flights[selHash]
+        # A fresh auto review replaces the old comments, so put the parse
+        #   problems back in too
+        coms = fpmis.autoReview(flight)
+        flight.reviewComments = fpmis.diagnosticComments(flight,
+                                                         comments=coms)
         print(coms)        
 
         # Now fill out the text boxes with the contents of the auto review
         self.fillReviewBoxes()
 
+    def startAutoReview(self, flights):
+        """
+        Kick off the auto review of the given flights (dict keyed by hash)
+        in the background; results land in storeAutoReview as they finish.
+        """
+        if flights == {}:
+            return
+
+        thread = AutoReviewThread(flights, parent=self)
+        thread.reviewed.connect(self.storeAutoReview)
+        thread.finished.connect(self.autoReviewFinished)
+        # Keep a reference so it doesn't get garbage collected mid-review
+        self.reviewthreads.append(thread)
+        self.statusbar.showMessage("Auto reviewing %i flights..." %
+                                   (len(flights)))
+        thread.start()
+
+    def autoReviewFinished(self):
+        # Drop our references to any review threads that are all done
+        self.reviewthreads = [thread for thread in self.reviewthreads
+                              if thread.isFinished() is False]
+        if self.reviewthreads == []:
+            self.statusbar.showMessage("Auto review complete", 5000)
+
+    def storeAutoReview(self, fhash, coms):
+        """
+        Store one flight's auto review comments, and only redraw the
+        review boxes if that's the flight currently being looked at.
+        """
+        # The flight could have been removed while it was being reviewed
+        if fhash in self.seReview.flights:
+            flight = self.seReview.flights[fhash]
+            # Keep the parse problems noted when it was loaded
+            flight.reviewComments = fpmis.diagnosticComments(flight,
+                                                             comments=coms)
+            if fhash == self.selectedFlightHash():
+                self.fillReviewBoxes()
+
+    def selectedFlightHash(self):
+        """
+        Return the hash of the currently selected flight, or None if
+        nothing is selected
+        """
+        sel = self.tableWidgetFlightBasics.selectionModel().selectedRows()
+        if sel == []:
+            return None
+        return self.tableWidgetFlightBasics.item(sel[0].row(), 1).toolTip()
+
     def fillReviewBoxes(self):
         # Clear the boxes of their former contents
         self.plainTextEditNotes.clear()
@@ -209,6 +285,7 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
 
         # Create a new fresh dict
         self.seReview.flights = {}
+        toreview = {}
 
         self.tableWidgetFlightBasics.setRowCount(0)
         # Note the order here is the order it'll show in the table
@@ -221,19 +298,35 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
             print("Parsing %s ..." % each, end=' ')
             bname = basename(each)
             fdict = {}
+            problems = ''
             try:
-                # Parse the flight here
-                cflight = fpmis.parseMIS(each)
-                if cflight.hash in oldHashes:
-                    self.seReview.flights.update({cflight.hash: 
-                                                  oldFlights[cflight.hash]})
+                # Hashing is cheap, so check whether we already have this
+                #   exact flight before going to the trouble of parsing it
+                fhash = fpmis.computeHash(each)
+                if fhash in oldHashes:
+                    cflight = oldFlights[fhash]
+                    self.seReview.flights.update({fhash: cflight})
                 else:
-                    # If Auto auto review is on, do it.
+                    # Parse the flight here; a bad field or leg just gets
+                    #   noted rather than throwing out the whole flight
+                    cflight = fpmis.parseMIS(each, resilient=True)
+                    if cflight.diagnostics != []:
+                        cflight.reviewComments = fpmis.diagnosticComments(
+                            cflight, comments=cflight.reviewComments)
+                    # If Auto auto review is on, queue it up; they're all
+                    #   done in the background once everything is parsed
                     if self.checkBoxAutoAutoReview.isChecked() is True:
-                        coms = fpmis.autoReview(cflight)
-                        cflight.reviewComments = coms
+                        toreview.update({cflight.hash: cflight})
                     self.seReview.flights.update({cflight.hash: cflight})
-                print("Success!")
+                if cflight.diagnostics != []:
+                    problems = '\n'.join(["Line %d: %s, %s" % (lno, fld, why)
+                                          for lno, fld, why in
+                                          cflight.diagnostics])
+                    print("Success, but with %d problems:" %
+                          (len(cflight.diagnostics)))
+                    print(problems)
+                else:
+                    print("Success!")
 
                 # Now fill in the table
                 fdict['Filename'] = bname
@@ -262,7 +355,13 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
                 newitem.setTextAlignment(Qt.AlignCenter)
                 if hkey != 'hash':
                     self.tableWidgetFlightBasics.setItem(i, j, newitem)
-            self.tableWidgetFlightBasics.item(i, 0).setToolTip(each)
+            if problems != '':
+                self.tableWidgetFlightBasics.item(i, 0).setToolTip(
+                    each + '\n' + problems)
+                self.tableWidgetFlightBasics.item(i, 0).setForeground(
+                    QColor('darkorange'))
+            else:
+                self.tableWidgetFlightBasics.item(i, 0).setToolTip(each)
             self.tableWidgetFlightBasics.item(i, 1).setToolTip(fdict['hash'])
 
         # Resize before displaying
@@ -271,6 +370,7 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
         hhead.setSectionResizeMode(QHeaderView.Stretch)
 
         self.printSeriesSummary()
+        self.startAutoReview(toreview)
 
     def printSeriesSummary(self):
         self.seReview.summarize()
@@ -285,6 +385,47 @@ class SOFIACruiseReviewerApp(QMainWindow, panel.Ui_MainWindow):
                 for i, sobs in enumerate(self.seReview.progs[prog][targ]):
                     print("\t\t%s, %s" % (sobs[0], sobs[1]))
 
+    def saveSession(self):
+        """
+        Save the whole series review (flights, comments, etc.) to a
+        snapshot file so it can be picked back up later
+        """
+        tstr = "Save Review Session"
+        filt = "Review Session (*.srs)"
+        fname = QFileDialog.getSaveFileName(self, tstr, '', filt)[0]
+        if fname != '':
+            try:
+                fpmis.saveSeries(self.seReview, fname)
+            except Exception as why:
+                QMessageBox.warning(self, tstr, "Couldn't save %s:\n%s" %
+                                    (basename(fname), why))
+                return
+            self.statusbar.showMessage("Saved %s" % (basename(fname)), 5000)
+
+    def loadSession(self):
+        """
+        Restore a series review from a snapshot file.  The flight plans are
+        only hashed, not re-parsed or re-reviewed, if they haven't changed.
+        """
+        tstr = "Open Review Session"
+        filt = "Review Session (*.srs)"
+        fname = QFileDialog.getOpenFileName(self, tstr, '', filt)[0]
+        if fname != '':
+            # Corrupt, not a snapshot, or from a newer version of this
+            #   code; either way, keep the current review as it is
+            try:
+                review = fpmis.loadSeries(fname)
+            except Exception as why:
+                QMessageBox.warning(self, tstr, "Couldn't open %s:\n%s" %
+                                    (basename(fname), why))
+                return
+            self.seReview = review
+            self.lineEditSeriesTitle.setText(self.seReview.seriesname)
+            self.lineEditUserName.setText(self.seReview.reviewername)
+            self.listoflights = [flight.filepath for flight in
+                                 self.seReview.flights.values()]
+            self.parseFlightList()
+
     def addFlightToList(self):
         tstr = "Load SOFIA Flight Plan"
         filt = "MIS (*.mis);;FSR (*.fsr)"
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 14:02:47 2026
+
+A catalog of AORs spanning many AOR files (i.e. all of the proposals
+going into a flight series) so things can be looked up directly by AOR ID,
+proposal, target, instrument or observing mode without re-parsing and
+walking each AOR file every time.
+
+Parsed files are cached by their hash, so reloading a directory only
+parses the files that are new or have changed since the last time.
+"""
+
+from __future__ import division, print_function
+
+import os
+import glob
+import multiprocessing
+
+from .MISparse import computeHash
+from .AORinator import parseAOR
+
+
+def parseHashedAOR(hashedfile):
+    """
+    Helper for aorcatalog.loadFiles; takes a (hash, filename) tuple so it
+    can be handed to worker processes, and gives back (hash, AOR).
+    """
+    ahash, infile = hashedfile
+    return ahash, parseAOR(infile)
+
+
+class aorcatalog(object):
+    def __init__(self):
+        # Filename -> hash of the file the last time it was loaded
+        self.files = {}
+        # Hash -> parsed AOR class, which is also the parse cache
+        self.aors = {}
+        # Hash -> list of AOR IDs that came from that file
+        self.aorids = {}
+
+        # The actual indices; everything but byid is a list of AOR IDs
+        self.byid = {}
+        self.byproposal = {}
+        self.bytarget = {}
+        self.byinstrument = {}
+        self.bymode = {}
+
+    def __len__(self):
+        return len(self.byid)
+
+    def __contains__(self, aorid):
+        return aorid in self.byid
+
+    def __getitem__(self, aorid):
+        return self.byid[aorid]
+
+    def loadDirectory(self, path, pattern='*.aor', processes=None):
+        """
+        Load all of the AOR files in the given directory that match pattern
+        """
+        infiles = sorted(glob.glob(os.path.join(path, pattern)))
+        return self.loadFiles(infiles, processes=processes)
+
+    def loadFiles(self, infiles, processes=None):
+        """
+        Given a list of AOR files, parse any that aren't already in the
+        cache (or have changed since they were loaded) across a pool of
+        worker processes and add them all to the indices.
+
+        processes defaults to the number of CPUs available.
+        Returns the list of hashes of the given files.
+        """
+        hashes = []
+        toparse = {}
+        for infile in infiles:
+            ahash = computeHash(infile)
+            hashes.append(ahash)
+
+            oldhash = self.files.get(infile)
+            if oldhash is not None and oldhash != ahash:
+                self.unindexAOR(oldhash)
+            self.files[infile] = ahash
+
+            if ahash in self.aors:
+                # Cache hit, but it might have been dropped from the indices
+                if ahash not in self.aorids:
+                    self.indexAOR(ahash, self.aors[ahash])
+            else:
+                toparse[ahash] = infile
+
+        hashedfiles = list(toparse.items())
+        # Not worth spinning up a pool for just one file
+        if processes == 1 or len(hashedfiles) < 2:
+            results = map(parseHashedAOR, hashedfiles)
+            for ahash, aor in results:
+                self.indexAOR(ahash, aor)
+        else:
+            pool = multiprocessing.Pool(processes)
+            try:
+                for ahash, aor in pool.imap_unordered(parseHashedAOR,
+                                                      hashedfiles):
+                    self.indexAOR(ahash, aor)
+            finally:
+                pool.close()
+                pool.join()
+
+        return hashes
+
+    def loadFile(self, infile):
+        """
+        Load a single AOR file (from the cache if possible) and return
+        its AOR class
+        """
+        ahash = self.loadFiles([infile], processes=1)[0]
+        return self.aors[ahash]
+
+    def indexAOR(self, ahash, aor):
+        """
+        Add all of the observations in the given AOR class to the indices
+        """
+        self.aors[ahash] = aor
+        self.aorids[ahash] = []
+        for aorid, obs in aor.observations.items():
+            self.aorids[ahash].append(aorid)
+            self.byid[aorid] = obs
+            self.byproposal.setdefault(aor.propid, []).append(aorid)
+            self.bytarget.setdefault(obs.target.lower(), []).append(aorid)
+            self.byinstrument.setdefault(obs.instrument, []).append(aorid)
+            self.bymode.setdefault((obs.instrument, obs.obsplanmode),
+                                   []).append(aorid)
+
+    def unindexAOR(self, ahash):
+        """
+        Remove all of the observations from the given AOR file (by hash)
+        from the indices.  The parsed AOR stays in the cache.
+        """
+        aor = self.aors.get(ahash)
+        for aorid in self.aorids.pop(ahash, []):
+            obs = self.byid.pop(aorid, None)
+            if obs is None:
+                continue
+            keys = [(self.byproposal, aor.propid),
+                    (self.bytarget, obs.target.lower()),
+                    (self.byinstrument, obs.instrument),
+                    (self.bymode, (obs.instrument, obs.obsplanmode))]
+            for index, key in keys:
+                if aorid in index.get(key, []):
+                    index[key].remove(aorid)
+                    if index[key] == []:
+                        del index[key]
+
+    def lookup(self, aorids):
+        """
+        Given a list of AOR IDs, return the list of Observations for them.
+        Missing AOR IDs come back as None.
+        """
+        return [self.byid.get(aorid) for aorid in aorids]
+
+    def proposal(self, propid):
+        return self.lookup(self.byproposal.get(propid, []))
+
+    def target(self, name):
+        return self.lookup(self.bytarget.get(name.lower(), []))
+
+    def instrument(self, inst):
+        return self.lookup(self.byinstrument.get(inst, []))
+
+    def mode(self, inst, obsplanmode):
+        return self.lookup(self.bymode.get((inst, obsplanmode), []))
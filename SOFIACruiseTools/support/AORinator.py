@@ -5,15 +5,21 @@ Created on Sat Oct  8 01:23:08 2016
 @author: rhamilton
 """
 
+from __future__ import division, print_function
+
 import sys
-# You'll probably have to pip install this one, but by jove it's worth it
-import untangle
+import time
+try:
+    import xml.etree.cElementTree as ET
+except ImportError:
+    import xml.etree.ElementTree as ET
 import numpy as np
 
 import astropy.units as apu
 import astropy.coordinates as apc
 import astropy.table as aptable
-import astropy.io.ascii as apascii
+
+from .tablewriter import renderTable
 
 
 def underliner(instr, char="="):
@@ -25,6 +31,16 @@ def underliner(instr, char="="):
     return ostr
 
 
+# Observation attributes that AORs are grouped/sorted by, in order
+obsGroupKeys = ('instrument', 'obsplanconfig', 'obsplanmode', 'scantype')
+
+# Chunks of the AOR file that are never used, so they're dropped as soon as
+#   they've been read.  The standalone target list (Sofia*Single) is just
+#   a repeat of what's in each Request.
+skippedtags = ['guideStarList', 'SofiaTargetFixedSingle',
+               'SofiaTargetMovingSingle']
+
+
 class AOR(object):
     def __init__(self):
         self.propid = ''
@@ -129,424 +145,481 @@ class Observation(object):
 
 def parseAOR(infile, summarize=False):
     """
+    Given an AOR file, parse it into an AOR class containing all of the
+    Observations (keyed by AOR ID) within it.
+
+    The file is streamed through with iterparse rather than being turned
+    into a full object tree, and everything we don't care about (like the
+    rather huge guide star lists) is thrown away as soon as it's been read.
     """
 #    print "Parsing %s" % (infile)
+    thisAOR = AOR()
 
     try:
-        aorfile = untangle.parse(infile)
-    except ImportError:
-        print "FATAL ERROR: Install the 'untangle' python library!"
-        sys.exit(-1)
+        for event, elem in ET.iterparse(infile, events=('end',)):
+            tag = elem.tag
+            if tag == 'Request':
+                obs = parseRequest(elem)
+                # Stuff it into the base dict
+                thisAOR.observations[obs.aorid] = obs
+                elem.clear()
+            elif tag in skippedtags:
+                elem.clear()
+            elif tag == 'ProposalInfo':
+                thisAOR.pi = elem.findtext('ProposalPI')
+                thisAOR.title = elem.findtext('ProposalTitle')
+                thisAOR.propid = elem.findtext('ProposalID')
+                elem.clear()
     except IOError:
-        print "FATAL ERROR: File not found!"
+        print("FATAL ERROR: File not found!")
         sys.exit(-1)
 
-    # More or less a standard path to get down into the useful stuff
-    aors = aorfile.AORs.list
-    thisAOR = AOR()
-    thisAOR.pi = aors.ProposalInfo.ProposalPI.cdata
-    thisAOR.title = aors.ProposalInfo.ProposalTitle.cdata
-    thisAOR.propid = aors.ProposalInfo.ProposalID.cdata
-
-    for each in aors.vector.Request:
-        obs = Observation()
-        # Common to each AOR
-        obs.aorid = each.aorID.cdata
-        obs.aname = each.title.cdata
-        obs.duration = np.float(each.est.duration.cdata)
-        obs.overhead = np.float(each.overhead.cdata)
-
-        # Not always comments in there, depends on the GI
-        try:
-            obs.GIcomments = each.observerComment
-        except IndexError:
-            obs.GIcomments = None
-
-        tar = each.target
-        tartype = tar['class']
-        obs.target = tar.name.cdata
-        # added to help with confluence exporting
-        obs.target = obs.target.replace('[', '').replace(']', '')
-
-        if tartype == "SofiaTargetMovingSingle":
-            obs.naifID = np.int(tar.ephemeris.naifID.cdata)
-            obs.naifName = tar.ephemeris.naifName.cdata
-            obs.tartype = 'Non-Sidereal'
-        elif tartype == "SofiaTargetFixedSingle":
-            obs.coord1 = np.float(tar.position.lat.cdata)
-            obs.coord1PM = np.float(tar.position.pm.latPm.cdata)
-            obs.coord2 = np.float(tar.position.lon.cdata)
-            obs.coord2PM = np.float(tar.position.pm.lonPm.cdata)
-            obs.coordepoch = tar.position.epoch.cdata
-            obs.coordsys = tar.position.coordSystem.coodSysName
-
-            sc = apc.SkyCoord(ra=obs.coord2, dec=obs.coord1, unit='deg',
-                              equinox=obs.coordepoch)
-
-            hms = "%02dh%02dm%05.2fs" % (sc.ra.hms)
-            obs.coord2 = hms
-            obs.coord1 = sc.dec.to_string(alwayssign=True,
-                                          pad=True, precision=2)
-            obs.tartype = 'Sidereal'
-
-        # Was undefined in the example AOR I'm working from
-        #   but its usefulness largely depends on the GI
-        latts = each.target.locationAttributes
-        tatts = each.target.targetAttributes
-
-        inst = each.instrument.data
-        obs.order = inst.order.cdata
-        obs.spectel1 = inst.InstrumentSpectralElement1.cdata
-        obs.spectel2 = inst.InstrumentSpectralElement2.cdata
-
-        # Instrument specific stuff
-        obs.instrument = inst.InstrumentName.cdata
-        if obs.instrument == "HAWC_PLUS":
-            obs = parseHAWCpObs(inst, obs)
-
-        # Stuff it into the base dict
-        thisAOR.observations[obs.aorid] = obs
+    formatCoords(list(thisAOR.observations.values()))
+
+    if summarize is True:
+        print(thisAOR.summarize(output='txt'))
 
     return thisAOR
 
 
+def parseRequest(req):
+    """
+    Given the (ElementTree) element of a single Request within an AOR file,
+    pull out the bits that we care about and return it as an Observation
+    """
+    obs = Observation()
+    # Common to each AOR
+    obs.aorid = req.findtext('aorID')
+    obs.aname = req.findtext('title')
+    obs.duration = float(req.findtext('est/duration'))
+    obs.overhead = float(req.findtext('overhead'))
+
+    # Not always comments in there, depends on the GI; None if missing
+    obs.GIcomments = req.findtext('observerComment')
+
+    tar = req.find('target')
+    tartype = tar.get('class')
+    obs.target = tar.findtext('name')
+    # added to help with confluence exporting
+    obs.target = obs.target.replace('[', '').replace(']', '')
+
+    if tartype == "SofiaTargetMovingSingle":
+        obs.naifID = int(tar.findtext('ephemeris/naifID'))
+        obs.naifName = tar.findtext('ephemeris/naifName')
+        obs.tartype = 'Non-Sidereal'
+    elif tartype == "SofiaTargetFixedSingle":
+        pos = tar.find('position')
+        obs.coord1 = float(pos.findtext('lat'))
+        obs.coord1PM = float(pos.findtext('pm/latPm'))
+        obs.coord2 = float(pos.findtext('lon'))
+        obs.coord2PM = float(pos.findtext('pm/lonPm'))
+        obs.coordepoch = pos.findtext('epoch')
+        obs.coordsys = pos.findtext('coordSystem/coodSysName')
+        # NOTE: coord1/coord2 are left in degrees here; formatCoords turns
+        #   them into strings for the whole AOR file in one go
+        obs.tartype = 'Sidereal'
+
+    inst = req.find('instrument/data')
+    # Not every instrument has (or needs) an order
+    order = inst.findtext('order')
+    if order is not None:
+        obs.order = order
+    obs.spectel1 = inst.findtext('InstrumentSpectralElement1')
+    obs.spectel2 = inst.findtext('InstrumentSpectralElement2')
+
+    # Every instrument has an observing plan config and mode, which is
+    #   what the observations get grouped by later on
+    obs.instrument = inst.findtext('InstrumentName')
+    obs.obsplanmode = inst.findtext('ObsPlanMode', default='')
+    obs.obsplanconfig = inst.findtext('ObsPlanConfig', default='')
+    repeats = inst.findtext('Repeat')
+    if repeats is not None:
+        obs.repeats = int(repeats)
+
+    # Instrument specific stuff
+    parser = instrumentParsers.get(obs.instrument)
+    if parser is not None:
+        obs = parser(inst, obs)
+
+    return obs
+
+
+def formatCoords(observations):
+    """
+    Given a list of Observations, turn the coordinates (in degrees) of all
+    the sidereal ones into RA/Dec strings.
+
+    Making a SkyCoord is pretty expensive, so rather than one per target
+    there's one (vector) SkyCoord per equinox and they're all formatted
+    at once.
+    """
+    groups = {}
+    for obs in observations:
+        if obs.tartype == 'Sidereal':
+            groups.setdefault(obs.coordepoch, []).append(obs)
+
+    for epoch, gobs in groups.items():
+        ras = np.array([obs.coord2 for obs in gobs], dtype=np.float64)
+        decs = np.array([obs.coord1 for obs in gobs], dtype=np.float64)
+
+        # Astropy wants a proper Julian equinox rather than just a year
+        sc = apc.SkyCoord(ra=ras, dec=decs, unit='deg',
+                          equinox="J%s" % (epoch))
+        rah, ram, ras = sc.ra.hms
+        decstrs = sc.dec.to_string(alwayssign=True, pad=True, precision=2)
+
+        for i, obs in enumerate(gobs):
+            obs.coord2 = "%02dh%02dm%05.2fs" % (rah[i], ram[i], ras[i])
+            obs.coord1 = str(decstrs[i])
+
+    return observations
+
+
 def parseHAWCpObs(root, aobs):
     """
-    Given an untangle'd object representing a HAWC+ AOR, unpack it
+    Given the instrument data element of a HAWC+ AOR, unpack it
     """
-    aobs.obsplanmode = root.ObsPlanMode.cdata
-    aobs.obsplanconfig = root.ObsPlanConfig.cdata
-    aobs.repeats = np.int(root.Repeat.cdata)
     if aobs.obsplanmode == "OTFMAP":
         # NOTE: Not currently supporting chopped scans
         # Parameters comment to both scan types
-        aobs.scantype = root.ScanType.cdata
-        aobs.scananglow = np.float(root.ScanAngleRange_Low.cdata)
-        aobs.scananghigh = np.float(root.ScanAngleRange_High.cdata)
-        aobs.scanrate = np.float(root.ScanRate.cdata)
-        aobs.exptime = np.float(root.TotalTime.cdata)
+        aobs.scantype = root.findtext('ScanType')
+        aobs.scananglow = float(root.findtext('ScanAngleRange_Low'))
+        aobs.scananghigh = float(root.findtext('ScanAngleRange_High'))
+        aobs.scanrate = float(root.findtext('ScanRate'))
+        aobs.exptime = float(root.findtext('TotalTime'))
         if aobs.scantype == "Box":
-            aobs.scanstepsize = np.float(root.ScanStepSize.cdata)
-            aobs.scansteps = np.float(root.ScanSteps.cdata)
-            aobs.scancross = np.bool(root.ScanCross.cdata)
-            aobs.scansize = np.float(root.ScanSize.cdata)
-            aobs.subscans = np.int(root.NumSubscan.cdata)
+            aobs.scanstepsize = float(root.findtext('ScanStepSize'))
+            aobs.scansteps = float(root.findtext('ScanSteps'))
+            aobs.scancross = bool(root.findtext('ScanCross'))
+            aobs.scansize = float(root.findtext('ScanSize'))
+            aobs.subscans = int(root.findtext('NumSubscan'))
         elif aobs.scantype == "Lissajous":
-            aobs.scanamp = np.float(root.ScanAmplitude.cdata)
-            aobs.scanfreq = np.float(root.ScanFreq.cdata)
-            aobs.scanphase = np.float(root.ScanPhase.cdata)
+            aobs.scanamp = float(root.findtext('ScanAmplitude'))
+            aobs.scanfreq = float(root.findtext('ScanFreq'))
+            aobs.scanphase = float(root.findtext('ScanPhase'))
 #        print aobs.aname, aobs.aorid, aobs.target, aobs.instrument,
 #        print aobs.obsplanconfig, aobs.obsplanmode, aobs.scantype
     elif aobs.obsplanmode == "C2N":
         # Parameters common to both total_intensity and polarization obs
-        aobs.nodtype = root.NodType.cdata
+        aobs.nodtype = root.findtext('NodType')
         if aobs.nodtype == "Nod_Match_Chop":
             # General chopping stuff...might work for other instruments
-            aobs.chopcrsys = root.ChopAngleCoordinate.cdata
-            aobs.chopangle = np.float(root.ChopAngle.cdata)
+            aobs.chopcrsys = root.findtext('ChopAngleCoordinate')
+            aobs.chopangle = float(root.findtext('ChopAngle'))
             aobs.chopanglesofia = (180. - aobs.chopangle)
-            aobs.chopthrow = np.float(root.ChopThrow.cdata)
-            aobs.chopfreq = np.float(root.ChopFreq.cdata)
-            aobs.choptype = root.ChopType.cdata
-            aobs.chopsrc = root.ChopSyncSrc.cdata
-            aobs.choponfpa = np.bool(root.ChopOnFPA.cdata)
-            aobs.nodcrsys = root.NodAngleCoordinate.cdata
-            aobs.nodangle = np.float(root.NodAngle.cdata)
+            aobs.chopthrow = float(root.findtext('ChopThrow'))
+            aobs.chopfreq = float(root.findtext('ChopFreq'))
+            aobs.choptype = root.findtext('ChopType')
+            aobs.chopsrc = root.findtext('ChopSyncSrc')
+            aobs.choponfpa = bool(root.findtext('ChopOnFPA'))
+            aobs.nodcrsys = root.findtext('NodAngleCoordinate')
+            aobs.nodangle = float(root.findtext('NodAngle'))
             aobs.nodanglesofia = (aobs.chopanglesofia - 180.)
-            aobs.nodthrow = np.float(root.NodThrow.cdata)
-            aobs.nodtime = np.float(root.NodTime.cdata)
+            aobs.nodthrow = float(root.findtext('NodThrow'))
+            aobs.nodtime = float(root.findtext('NodTime'))
 
             # Dithering
-            aobs.ditherpatt = root.DitherPattern.cdata
-            aobs.dithercoord = root.DitherCoord.cdata
-            aobs.ditherstretchx = np.float(root.DitherOffsetX.cdata)
-            aobs.ditherstretchy = np.float(root.DitherOffsetY.cdata)
-            aobs.ditherscale = np.float(root.DitherScale.cdata)
+            aobs.ditherpatt = root.findtext('DitherPattern')
+            aobs.dithercoord = root.findtext('DitherCoord')
+            aobs.ditherstretchx = float(root.findtext('DitherOffsetX'))
+            aobs.ditherstretchy = float(root.findtext('DitherOffsetY'))
+            aobs.ditherscale = float(root.findtext('DitherScale'))
             if aobs.obsplanconfig == "TOTAL_INTENSITY":
                 # Nothing further specific for total intensity observations
                 pass
             elif aobs.obsplanconfig == "POLARIZATION":
-                aobs.hwpstep = np.float(root.StepHWP.cdata)
-                aobs.hwpini = np.float(root.InitialHWP.cdata)
-                aobs.hwpnum = np.int(root.NumHWP.cdata)
+                aobs.hwpstep = float(root.findtext('StepHWP'))
+                aobs.hwpini = float(root.findtext('InitialHWP'))
+                aobs.hwpnum = int(root.findtext('NumHWP'))
 
 #        print aobs.aname, aobs.aorid, aobs.target, aobs.instrument,
 #        print aobs.obsplanconfig, aobs.obsplanmode, aobs.nodtype
     return aobs
 
 
+# Instrument name (InstrumentName in the AOR) -> function that pulls the
+#   instrument specific bits out of its instrument data element.  Each one
+#   takes (element, Observation) and gives back the Observation.
+instrumentParsers = {'HAWC_PLUS': parseHAWCpObs}
+
+
+def registerInstrumentParser(instrument, parser):
+    """
+    Add (or replace) the function used to parse the instrument specific
+    parts of an AOR for the given instrument
+    """
+    instrumentParsers[instrument] = parser
+
+
+def benchmarkAORParsing(infiles, repeats=3):
+    """
+    Given a list of AOR files (a whole bundle of proposals, say), time how
+    long it takes to parse all of them with parseAOR.  If untangle is
+    installed, also time how long it takes just to build its object tree
+    of the same files, which is what the old parser had to do first.
+
+    Returns a dict of the best total times (seconds) across the repeats.
+    """
+    timings = {}
+
+    best = None
+    for i in range(repeats):
+        tstart = time.time()
+        for each in infiles:
+            parseAOR(each)
+        tdelta = time.time() - tstart
+        if best is None or tdelta < best:
+            best = tdelta
+    timings['iterparse'] = best
+
+    try:
+        import untangle
+        best = None
+        for i in range(repeats):
+            tstart = time.time()
+            for each in infiles:
+                untangle.parse(each)
+            tdelta = time.time() - tstart
+            if best is None or tdelta < best:
+                best = tdelta
+        timings['untangle'] = best
+    except ImportError:
+        pass
+
+    print("Parsed %d AOR files (best of %d):" % (len(infiles), repeats))
+    for key in sorted(timings.keys()):
+        print("    %s: %.3f s" % (key, timings[key]))
+
+    return timings
+
+
+def obsTable(observations):
+    """
+    Given a list of Observations, return a flat astropy table of them with
+    one row per Observation, containing the grouping keys (obsGroupKeys),
+    the AOR ID, and the Observation itself (in the 'obs' column).
+
+    The table is sorted by the grouping keys, and within that stays in the
+    order that the Observations were given.
+    """
+    keys = list(obsGroupKeys)
+    cols = [[getattr(obs, key) for obs in observations] for key in keys]
+    cols.append([obs.aorid for obs in observations])
+    cols.append(np.arange(len(observations)))
+
+    # Build the object column by hand so numpy doesn't try to look inside
+    objs = np.empty(len(observations), dtype=object)
+    objs[:] = observations
+    cols.append(objs)
+
+    names = keys + ['aorid', 'index', 'obs']
+    dtypes = [str]*(len(keys) + 1) + [int, object]
+    if len(observations) == 0:
+        tab = aptable.Table(names=names, dtype=dtypes)
+    else:
+        tab = aptable.Table(cols, names=names)
+    tab.sort(keys + ['index'])
+
+    return tab
+
+
+def groupObservations(observations):
+    """
+    Given a list of Observations, group them by instrument and observing
+    mode (the keys in obsGroupKeys).  Returns a grouped astropy table; use
+    iterObsGroups to walk through it.
+    """
+    tab = obsTable(observations)
+    # Can't group nothing, but an empty table iterates just fine anyways
+    if len(tab) == 0:
+        return tab
+    return tab.group_by(list(obsGroupKeys))
+
+
+def iterObsGroups(obsgroups):
+    """
+    Given a grouped table from groupObservations, yield a (key, observations)
+    tuple for each group, where key is a tuple of the obsGroupKeys values.
+    """
+    if len(obsgroups) == 0:
+        return
+    for key, group in zip(obsgroups.groups.keys, obsgroups.groups):
+        yield tuple(str(key[each]) for each in obsGroupKeys), \
+            list(group['obs'])
+
+
+def obsGroupTitle(key):
+    """
+    Given a group key from iterObsGroups, return a title for it.  HAWC+
+    groups are titled by their observing mode, as they always have been
+    (e.g. "TOTAL_INTENSITY OTFMAP Box", or just "POLARIZATION"); anything
+    else gets the whole key (e.g. "FLITECAM IMAGING ...")
+    """
+    instrument, config, mode, scantype = key
+    if instrument == 'HAWC_PLUS':
+        if config == 'POLARIZATION':
+            return config
+        key = key[1:]
+    return " ".join([each for each in key if each != ''])
+
+
+def hawcTableKeys(key):
+    """
+    Given a group key from iterObsGroups, return the (key1, key2) that the
+    HAWC+ AOR tables (hawcColumns) are keyed by; they're keyed by polarization, or by
+    observing mode and scan type for total intensity
+    """
+    instrument, config, mode, scantype = key
+    if config == 'POLARIZATION':
+        return config, ''
+    else:
+        return mode, scantype
+
+
+def iterHAWCGroups(obsgroups, skipped=None):
+    """
+    Like iterObsGroups, but only the HAWC+ groups that actually have an
+    AOR table (see hawcColumns) so nothing gets a title without a table.
+    Yields (key, key1, key2, observations) where key1/key2 are from
+    hawcTableKeys.
+
+    If skipped is a list, the (key, observations) of every other group
+    are appended to it so they can be mentioned (see skippedGroupsNote).
+    """
+    for key, group in iterObsGroups(obsgroups):
+        key1, key2 = hawcTableKeys(key)
+        if key[0] != 'HAWC_PLUS' or group == [] or \
+                (key1, key2) not in hawcColumns:
+            if skipped is not None and group != []:
+                skipped.append((key, group))
+            continue
+        yield key, key1, key2, group
+
+
+def skippedGroupsNote(skipped):
+    """
+    Given the skipped groups from iterHAWCGroups, return a reST paragraph
+    saying which ones didn't get a table, or '' if none were skipped
+    """
+    if skipped == []:
+        return ''
+    groups = ["%s (%d)" % (obsGroupTitle(key), len(group))
+              for key, group in skipped]
+
+    return "*No AOR table for: %s*\n" % (", ".join(groups))
+
+
 def summarizeObsGroups(obsgroups, output='rst'):
     """
-    Given a dict of sorted AORs, make a nice little table about each group
-    """
-    # Top level groups; should be main distinct observing modes
-    #   For HAWC+: TOTAL_INTENSITY and POLARIZATION
-    tkeys = obsgroups.keys()
-    for okey in tkeys:
-        thisgroup = obsgroups[okey]
-        if type(thisgroup) == dict:
-            # Next level - variations on the main observing modes
-            #   For HAWC+: TOTAL_INTENSITY OTFMAP or C2N
-            for ikey in thisgroup.keys():
-                innergroup = thisgroup[ikey]
-                # Innermost level - variations on a variation of a main mode
-                #  FOR HAWC+: TOTAL_INTENSITY OTFMAP ScanVariants
-                if type(innergroup) == dict:
-                    for iikey in innergroup.keys():
-                        final = innergroup[iikey]
-                        if type(final) == list:
-                            print ""
-                            print "**" + okey, ikey, iikey + "**\n"
-                            if output == 'rst':
-                                hawcAORreSTer(innergroup[iikey], ikey, iikey)
-                            elif output == 'confluence':
-                                hawcAORConfluencer(innergroup[iikey], ikey,
-                                                   iikey)
-                            elif output == 'tab':
-                                hawcAORtabber(innergroup[iikey], ikey,
-                                              iikey)
-
-                        else:
-                            print ""
-                            print "**" + okey, ikey, iikey + "**\n"
-                            if output == 'rst':
-                                hawcAORreSTer(innergroup, ikey, iikey)
-                            elif output == 'confluence':
-                                hawcAORConfluencer(innergroup, ikey, iikey)
-                            elif output == 'tab':
-                                hawcAORtabber(thisgroup, ikey, iikey)
-                else:
-                    print ""
-#                    print "**" + okey, ikey, innergroup + "**\n"
-        elif type(thisgroup) == list:
-            # Simple modes - a mode name, and a list of matching AORs
-            #  For HAWC+: POLARIZATION C2N
-            print ""
-            print "**" + okey + "**\n"
-            if output == "rst":
-                hawcAORreSTer(thisgroup, 'POLARIZATION')
-            elif output == 'confluence':
-                hawcAORConfluencer(thisgroup, 'POLARIZATION')
-            elif output == 'tab':
-                hawcAORtabber(thisgroup, 'POLARIZATION')
-
-
-def hawcAORConfluencer(AORgroup, key1, key2=''):
-    """
-    Given a sorted grouping of AORs in a dictionary, print a Confluence
-    formatted table for use elsewhere.
-    """
-    if key1 == "POLARIZATION" and AORgroup != []:
-        print "||*AORID*",
-        print "||*AOR Name*",
-        print "||*Target*||*Spectel1*||*Spectel2",
-        print "||*RA (2000)*||*Dec (2000)*",
-        print "||*ExpTime*",
-        print "||*ChopSys*||*ChopAngle*||*NodAngle*||*ChopThrow*",
-        print "||*DthScale*||"
-        for taor in AORgroup:
-            os = "|%s|%s|%s|%s|%s|%s|%s|%05.2f|" %\
-                (taor.aorid, taor.aname, taor.target,
-                 taor.spectel1, taor.spectel2, taor.coord2, taor.coord1,
-                 taor.duration-taor.overhead)
-            os += "%s|%04.1f|%04.1f|%04.1f|%02.1f|" %\
-                  (taor.chopcrsys, taor.chopangle,
-                   taor.nodangle, taor.chopthrow, taor.ditherscale)
-            print os
-    if key1 == 'OTFMAP' and AORgroup != []:
-        if key2 == 'Box':
-            print "||*AORID*",
-            print "||*AOR Name*",
-            print "||*Target*||*Spectel1*||*Spectel2",
-            print "||*RA (2000)*||*Dec (2000)*",
-            print "||*ExpTime*",
-            print "||*ScanLength*||*StepSize*||*NLines*||*ScanIters*",
-            print "||*AngLow*||*AngHigh*|",
-            print "||*SubScans*||"
-            for taor in AORgroup:
-                os = "|%s|%s|%s|%s|%s|%s|%s|%05.2f|" %\
-                    (taor.aorid, taor.aname, taor.target,
-                     taor.spectel1, taor.spectel2, taor.coord2,
-                     taor.coord1,
-                     taor.duration-taor.overhead)
-                os += "%04.1f|%03.1f|%03.1f|%02d|%+03.1f|%+03.1f|%02d|" %\
-                    (taor.scansize, taor.scanstepsize, taor.scansteps,
-                     taor.repeats, taor.scananglow, taor.scananghigh,
-                     taor.subscans)
-                print os
-        if key2 == 'Lissajous':
-            print "||*AORID*",
-            print "||*AOR Name*",
-            print "||*Target*||*Spectel1*||*Spectel2",
-            print "||*RA (2000)*||*Dec (2000)*",
-            print "||*ExpTime*",
-            print "||*ScanAmp*||*ScanIters*|"
-            for taor in AORgroup:
-                os = "|%s|%s|%s|%s|%s|%s|%s|%05.2f|" %\
-                    (taor.aorid, taor.aname, taor.target,
-                     taor.spectel1, taor.spectel2, taor.coord2,
-                     taor.coord1,
-                     taor.duration-taor.overhead)
-                os += "%04.1f|%02d|" %\
-                    (taor.scanamp, taor.repeats,
-                     taor.scananglow, taor.scananghigh)
-                print os
-
-
-def hawcAORreSTer(AORgroup, key1, key2='', outie=sys.stdout):
-    """
-    Given a sorted grouping of AORs in a dictionary, print a reST
-    formatted blob of text for use elsewhere.
-    """
-    if key1 == "POLARIZATION" and AORgroup != []:
-        hed = ["AORID", "AOR Name", "Target",
-               "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-               "ExpTime", "ChopSys", "ChopAngle", "Nod Angle",
-               "ChopAngle-WoN", "NodAngle-WoN",
-               "ChopThrow", "DthScale"]
-        tabdat = []
-        for taor in AORgroup:
-            tabdat.append([taor.aorid, taor.aname, taor.target,
-                          taor.spectel1, taor.spectel2,
-                          taor.coord2, taor.coord1,
-                          taor.duration-taor.overhead,
-                          taor.chopcrsys, taor.chopangle, taor.nodangle,
-                          taor.chopanglesofia, taor.nodanglesofia,
-                          taor.chopthrow, taor.ditherscale])
-        tabbie = aptable.Table(rows=tabdat, names=hed)
-        tabbie.write(outie, format='ascii.rst')
-        print ""
-    if key1 == 'OTFMAP' and AORgroup != []:
-        if key2 == 'Box':
-            hed = ["AORID", "AOR Name", "Target",
-                   "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-                   "ExpTime", "ScanRate", "ScanLength", "StepSize", "NLines",
-                   "ScanIters", "AngLow", "AngHigh", "SubScans"]
-            tabdat = []
-            for taor in AORgroup:
-                tabdat.append([taor.aorid, taor.aname, taor.target,
-                               taor.spectel1, taor.spectel2, taor.coord2,
-                               taor.coord1, taor.duration-taor.overhead,
-                               taor.scanrate,
-                               taor.scansize, taor.scanstepsize,
-                               taor.scansteps, taor.repeats,
-                               taor.scananglow, taor.scananghigh,
-                               taor.subscans])
-            tabbie = aptable.Table(rows=tabdat, names=hed)
-            tabbie.write(outie, format='ascii.rst')
-            print ""
-        if key2 == 'Lissajous':
-            hed = ["AORID", "AOR Name", "Target",
-                   "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-                   "ExpTime", "ScanRate", "ScanAmp", "ScanIters", "ScanPhase"]
-            tabdat = []
-            for taor in AORgroup:
-                tabdat.append([taor.aorid, taor.aname, taor.target,
-                               taor.spectel1, taor.spectel2, taor.coord2,
-                               taor.coord1, taor.duration-taor.overhead,
-                               taor.scanrate,
-                               taor.scanamp, taor.repeats, taor.scanphase])
-            tabbie = aptable.Table(rows=tabdat, names=hed)
-            tabbie.write(outie, format='ascii.rst')
-            print ""
-
-
-def hawcAORtabber(AORgroup, key1, key2=''):
-    """
-    Given a sorted grouping of AORs in a dictionary, print a tab seperated
-    formatted blob of text for use elsewhere.
-    """
-    if key1 == "POLARIZATION" and AORgroup != []:
-        hed = ["AORID", "AOR Name", "Target",
-               "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-               "ExpTime", "ChopSys", "ChopAngle",
-               "NodAngle", "ChopThrow", "DthScale"]
-        tabdat = []
-        for taor in AORgroup:
-            tabdat.append([taor.aorid, taor.aname, taor.target,
-                          taor.spectel1, taor.spectel2,
-                          taor.coord2, taor.coord1,
-                          taor.duration-taor.overhead,
-                          taor.chopcrsys, taor.chopangle,
-                          taor.nodangle, taor.chopthrow, taor.ditherscale])
-        tabbie = aptable.Table(rows=tabdat, names=hed)
-        tabbie.write(sys.stdout, format='ascii.csv')
-        print ""
-    if key1 == 'OTFMAP' and AORgroup != []:
-        if key2 == 'Box':
-            hed = ["AORID", "AOR Name", "Target",
-                   "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-                   "ExpTime", "ScanRate", "ScanLength", "StepSize", "NLines",
-                   "ScanIters", "AngLow", "AngHigh", "SubScans"]
-            tabdat = []
-            for taor in AORgroup:
-                tabdat.append([taor.aorid, taor.aname, taor.target,
-                               taor.spectel1, taor.spectel2, taor.coord2,
-                               taor.coord1, taor.duration-taor.overhead,
-                               taor.scanrate,
-                               taor.scansize, taor.scanstepsize,
-                               taor.scansteps, taor.repeats,
-                               taor.scananglow, taor.scananghigh,
-                               taor.subscans])
-            tabbie = aptable.Table(rows=tabdat, names=hed)
-            tabbie.write(sys.stdout, format='ascii.csv')
-            print ""
-        if key2 == 'Lissajous':
-            hed = ["AORID", "AOR Name", "Target",
-                   "Spectel1", "Spectel2", "RA (2000)", "Dec (2000)",
-                   "ExpTime", "ScanRate", "ScanAmp", "ScanIters", "ScanPhase",
-                   "AngLow", "AngHigh"]
-            tabdat = []
-            for taor in AORgroup:
-                tabdat.append([taor.aorid, taor.aname, taor.target,
-                               taor.spectel1, taor.spectel2, taor.coord2,
-                               taor.coord1, taor.duration-taor.overhead,
-                               taor.scanrate,
-                               taor.scanamp, taor.repeats, taor.scanphase,
-                               taor.scananglow, taor.scananghigh])
-            tabbie = aptable.Table(rows=tabdat, names=hed)
-            tabbie.write(sys.stdout, format='ascii.csv')
-            print ""
-
-
-def HAWCAORSorter(infile, aorids=[], output='rst', silent=False):
+    Given a grouped table of AORs (from groupObservations), make a nice
+    little table about each group
+    """
+    skipped = []
+    for key, key1, key2, group in iterHAWCGroups(obsgroups, skipped):
+        print("")
+        print("**" + obsGroupTitle(key) + "**\n")
+        hawcAORrenderer(group, key1, key2, output=output)
+    if skipped != []:
+        print("")
+        print(skippedGroupsNote(skipped))
+
+
+def expTime(aobs):
+    return aobs.duration - aobs.overhead
+
+
+# Columns that go into the HAWC+ AOR tables for each mode, as a list of
+#   (column name, Observation attribute or function of the Observation)
+hawcCommonColumns = [("AORID", 'aorid'), ("AOR Name", 'aname'),
+                     ("Target", 'target'),
+                     ("Spectel1", 'spectel1'), ("Spectel2", 'spectel2'),
+                     ("RA (2000)", 'coord2'), ("Dec (2000)", 'coord1'),
+                     ("ExpTime", expTime)]
+
+hawcColumns = {('POLARIZATION', ''): hawcCommonColumns +
+               [("ChopSys", 'chopcrsys'), ("ChopAngle", 'chopangle'),
+                ("Nod Angle", 'nodangle'),
+                ("ChopAngle-WoN", 'chopanglesofia'),
+                ("NodAngle-WoN", 'nodanglesofia'),
+                ("ChopThrow", 'chopthrow'), ("DthScale", 'ditherscale')],
+               ('OTFMAP', 'Box'): hawcCommonColumns +
+               [("ScanRate", 'scanrate'), ("ScanLength", 'scansize'),
+                ("StepSize", 'scanstepsize'), ("NLines", 'scansteps'),
+                ("ScanIters", 'repeats'), ("AngLow", 'scananglow'),
+                ("AngHigh", 'scananghigh'), ("SubScans", 'subscans')],
+               ('OTFMAP', 'Lissajous'): hawcCommonColumns +
+               [("ScanRate", 'scanrate'), ("ScanAmp", 'scanamp'),
+                ("ScanIters", 'repeats'), ("ScanPhase", 'scanphase'),
+                ("AngLow", 'scananglow'), ("AngHigh", 'scananghigh')]}
+
+
+def hawcAORTable(AORgroup, key1, key2=''):
+    """
+    Given a group of HAWC+ AORs (and the keys from hawcTableKeys), return
+    the (names, columns) of the table for that group, or (None, None)
+    if there's no table defined for it.
+    """
+    try:
+        colspec = hawcColumns[(key1, key2)]
+    except KeyError:
+        return None, None
+
+    names = [name for name, attr in colspec]
+    columns = []
+    for name, attr in colspec:
+        if callable(attr):
+            columns.append([attr(taor) for taor in AORgroup])
+        else:
+            columns.append([getattr(taor, attr) for taor in AORgroup])
+
+    return names, columns
+
+
+def hawcAORrenderer(AORgroup, key1, key2='', output='rst', outie=None):
+    """
+    Given a sorted grouping of AORs, write out a table of them in the given
+    output style (rst, confluence, csv/tab, or markdown) for use elsewhere.
+    outie defaults to stdout.
+    """
+    if AORgroup == []:
+        return
+    if outie is None:
+        outie = sys.stdout
+
+    names, columns = hawcAORTable(AORgroup, key1, key2)
+    if names is not None:
+        renderTable(names, columns, output=output, outie=outie)
+        outie.write("\n")
+
+
+def HAWCAORSorter(infile, aorids=[], output='rst', silent=False,
+                  catalog=None):
     """
     Given an AOR file and an optional list of AOR IDs to summarize,
     parse the AOR and return either all or the specific AOR IDs in a nicely
     summarized text format for insertion into something else.
 
-    Returns the full AOR object as well as the sorted dict of AOR types.
+    If an aorcatalog is given, the AOR is pulled from (or added to) it
+    rather than parsing the file again.
+
+    Returns the full AOR object as well as the grouped table of AORs
+    (see groupObservations and iterObsGroups).
     """
     # Actually parse the file first
-    aor = parseAOR(infile)
-
-    # There are many total_intensity variants, but only one for polarization
-    hawcgroups = {'TOTAL_INTENSITY': {'C2N': [],
-                                      'OTFMAP': {
-                                                 'Box': [],
-                                                 'Lissajous': []
-                                                 }
-                                      },
-                  'POLARIZATION': []}
+    if catalog is None:
+        aor = parseAOR(infile)
+    else:
+        aor = catalog.loadFile(infile)
 
     if aorids == []:
         aorids = aor.observations.keys()
 
-    for aorid in aorids:
-        taor = aor.observations[aorid]
-        # Now try to group things via observing modes to make printing easier
-        #   (will be specific for each instrument)
-        if taor.obsplanconfig == 'POLARIZATION':
-            hawcgroups[taor.obsplanconfig].append(taor)
-        elif taor.obsplanconfig == 'TOTAL_INTENSITY' and\
-                taor.obsplanmode == 'C2N':
-            hawcgroups[taor.obsplanconfig][taor.obsplanmode].append(taor)
-        elif taor.obsplanconfig == 'TOTAL_INTENSITY' and\
-                taor.obsplanmode == 'OTFMAP':
-            hawcgroups[taor.obsplanconfig][taor.obsplanmode][taor.scantype].append(taor)
+    # Group things via observing modes to make printing easier
+    hawcgroups = groupObservations([aor.observations[aorid]
+                                    for aorid in aorids])
 
     if silent is False:
-        print aor.summarize(output='reST')
+        print(aor.summarize(output='reST'))
         summarizeObsGroups(hawcgroups, output=output)
 
     return aor, hawcgroups
@@ -8,14 +8,149 @@ Created on Mon Jun 20 16:21:44 2016
 # Trying to ensure Python 2/3 coexistance ...
 from __future__ import division, print_function
 
+import os
 import re
+import glob
+import fnmatch
 import copy
 import hashlib
 import itertools
 import numpy as np
 import scipy.interpolate as spi
+from timeit import default_timer
 from datetime import datetime, timedelta
 
+from .dialects import sniffDialect, getDialect
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+# Parse profiling is off unless SOFIA_PARSE_STATS is set in the environment
+#   (or set_parse_stats() turns it on); set it to 'alloc' to also track how
+#   much memory each stage allocates, which is a lot slower
+_statsenv = os.environ.get('SOFIA_PARSE_STATS', '').strip().lower()
+_profiling = _statsenv not in ['', '0', 'no', 'false', 'off']
+_allocs = _statsenv == 'alloc'
+_stages = {}
+_counters = {}
+
+
+class _nulltimer(object):
+    """
+    Does nothing, so parse stages cost next to nothing when not profiling
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_notimer = _nulltimer()
+
+
+class _stagetimer(object):
+    """
+    Adds the time (and optionally the memory allocated) while inside the
+    with block to the running totals for the given parse stage
+    """
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        if _allocs is True:
+            self.mem = tracemalloc.get_traced_memory()[0]
+        self.t0 = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = default_timer() - self.t0
+        stats = _stages.setdefault(self.stage, {'calls': 0, 'time': 0.,
+                                                'alloc': 0})
+        stats['calls'] += 1
+        stats['time'] += elapsed
+        if _allocs is True:
+            stats['alloc'] += tracemalloc.get_traced_memory()[0] - self.mem
+        return False
+
+
+def parseTimer(stage):
+    """
+    Context manager that times the given parse stage if profiling is on
+    """
+    if _profiling is False:
+        return _notimer
+    return _stagetimer(stage)
+
+
+def countParse(counter, n=1):
+    """
+    Add n to the given parse counter if profiling is on
+    """
+    if _profiling is True:
+        _counters[counter] = _counters.get(counter, 0) + n
+
+
+def set_parse_stats(enabled=True, allocations=False):
+    """
+    Turn parse profiling on or off; allocations=True also tracks the
+    memory allocated in each stage (via tracemalloc, if available)
+    """
+    global _profiling, _allocs
+    _profiling = enabled
+    _allocs = enabled is True and allocations is True and \
+        tracemalloc is not None
+    if _allocs is True and tracemalloc.is_tracing() is False:
+        tracemalloc.start()
+
+
+def reset_parse_stats():
+    """
+    Zero out all the parse timers and counters
+    """
+    _stages.clear()
+    _counters.clear()
+
+
+def get_parse_stats():
+    """
+    Return the parse profiling numbers gathered so far (since the last
+    reset_parse_stats) as a dict with two parts:
+        'stages': stage name -> dict of calls, total time (s), and bytes
+                  allocated (if tracking allocations)
+        'counters': counter name -> count (regex searches, lines read, etc.)
+    Everything is empty if profiling was never turned on.
+    """
+    return {'enabled': _profiling,
+            'stages': dict((k, dict(v)) for k, v in _stages.items()),
+            'counters': dict(_counters)}
+
+
+def format_parse_stats(stats=None):
+    """
+    Return the given (or current) parse stats as a little text table
+    """
+    if stats is None:
+        stats = get_parse_stats()
+    lines = ["%-12s %6s %10s %10s" % ("Stage", "Calls", "Time (ms)",
+                                      "Alloc (kB)")]
+    for stage in sorted(stats['stages'].keys()):
+        each = stats['stages'][stage]
+        lines.append("%-12s %6i %10.2f %10.1f" % (stage, each['calls'],
+                                                  each['time']*1000.,
+                                                  each['alloc']/1024.))
+    for counter in sorted(stats['counters'].keys()):
+        lines.append("%-12s %6i" % (counter, stats['counters'][counter]))
+
+    return '\n'.join(lines)
+
+
+if _allocs is True:
+    set_parse_stats(True, allocations=True)
+
 
 def sortByDate(inlist):
     """
@@ -45,6 +180,32 @@ def go_iso(var):
     return var.isoformat()
 
 
+def hmsToSeconds(hms):
+    """
+    Given a "HH:MM:SS" string, return the number of seconds since
+    midnight as an integer.  Done with plain slicing since strptime() is
+    ridiculously slow when you call it for every single waypoint.
+    """
+    return int(hms[0:2])*3600 + int(hms[3:5])*60 + int(hms[6:8])
+
+
+def secondsSinceTakeoff(sods, takeoff):
+    """
+    Given a sequence of seconds-of-day (from hmsToSeconds) and the takeoff
+    datetime, return the integer seconds since takeoff as an array.
+
+    Anything that appears to happen before takeoff actually happened after
+    midnight UTC, so it gets an extra day tacked on.  That assumes a flight
+    is less than 24 hours long, which is a safe bet for SOFIA.
+    """
+    sods = np.asarray(sods, dtype=np.int64)
+    tsod = takeoff.hour*3600 + takeoff.minute*60 + takeoff.second
+    reltime = sods - tsod
+    reltime[reltime < 0] += 86400
+
+    return reltime
+
+
 def commentinator(coms, ctype, btag, tag):
     """
     Given a comment class/structure, append the message 
@@ -79,50 +240,75 @@ class flightcomments(object):
 
 class seriesreview(object):
     """
+    A whole series of flights (keyed by hash in self.flights) along with
+    the reviewer and the series summary.
 
+    self.progs is the obsplan -> target -> [[date, obsdur], ...] summary
+    of the series; it's kept up to date by summarize().
     """
     def __init__(self):
         self.seriesname = ''
         self.reviewername = ''
         self.flights = {}
         self.summary = ''
-        
-    def summarize(self):
         self.progs = {}
-        flighthashes = self.flights.keys()
-        for fhash in flighthashes:
-            flight = self.flights[fhash]
-            for eachleg in flight.legs:
-                if eachleg.legtype == "Observing":
-                    # Group in an obsplan by target name to catch obs
-                    #   that are split across multiple flights
-                    bundle = {eachleg.target: [[str(flight.takeoff.date()),
-                                               str(eachleg.obsdur)]]}
-                    # Check to see if the obsplan already has targets in
-                    #   the series; if so, append to that so we don't lose any
-                    
-                    if eachleg.obsplan in self.progs.keys():
-#                        print("obsplan %s already here" % (eachleg.obsplan))
-                        # Check to see if this target has any other obs
-                        targsinprog = self.progs[eachleg.obsplan].keys()
-#                        print(targsinprog)
-
-                        # Still need to catch case differences ?
-                        if eachleg.target in targsinprog:
-#                            print("")
-#                            print("another obs of target %s" % eachleg.target)
-                            # Need to use atarg here because that was the 
-                            #   one already stored and it'll have the correct
-                            #   case!
-                            sht = self.progs[eachleg.obsplan][eachleg.target]
-                            sht.append(bundle[eachleg.target][0])
-#                            print("")
-                        else:
-#                            print("target %s isn't here yet" % (eachleg.target))
-                            self.progs[eachleg.obsplan].update(bundle)
-                    else:
-                        self.progs.update({eachleg.obsplan: bundle})                    
-#        print(self.progs)
+        # Flight hash -> the (obsplan, target key, entry) bits it added to
+        #   self.progs, so it can be taken back out again if it's removed
+        self.indexed = {}
+        # (obsplan, lowercase target) -> target name as it's shown in progs
+        self.targnames = {}
+
+    def indexFlight(self, fhash, flight):
+        """
+        Add the observing legs of one flight into self.progs
+        """
+        contributed = []
+        for eachleg in flight.legs:
+            if eachleg.legtype == "Observing":
+                # Group in an obsplan by target name to catch obs
+                #   that are split across multiple flights.  Target names
+                #   are grouped without caring about case, but we show the
+                #   first version of the name that we came across
+                tkey = (eachleg.obsplan, eachleg.target.lower())
+                targ = self.targnames.setdefault(tkey, eachleg.target)
+                entry = [str(flight.takeoff.date()), str(eachleg.obsdur)]
+
+                prog = self.progs.setdefault(eachleg.obsplan, {})
+                prog.setdefault(targ, []).append(entry)
+                contributed.append((eachleg.obsplan, tkey, entry))
+        self.indexed[fhash] = contributed
+
+    def unindexFlight(self, fhash):
+        """
+        Take the observing legs of a (previously indexed) flight back out
+        of self.progs, cleaning up any targets/obsplans left empty
+        """
+        for obsplan, tkey, entry in self.indexed.pop(fhash):
+            targ = self.targnames[tkey]
+            obs = self.progs[obsplan][targ]
+            # Has to be by identity; another flight could have an
+            #   entry that's equal to this one
+            for k, each in enumerate(obs):
+                if each is entry:
+                    del obs[k]
+                    break
+            if obs == []:
+                del self.progs[obsplan][targ]
+                del self.targnames[tkey]
+                if self.progs[obsplan] == {}:
+                    del self.progs[obsplan]
+
+    def summarize(self):
+        """
+        Bring self.progs up to date with self.flights.  Only the flights
+        that were added or removed since the last call are looked at.
+        """
+        for fhash in [fh for fh in self.indexed if fh not in self.flights]:
+            self.unindexFlight(fhash)
+
+        for fhash, flight in self.flights.items():
+            if fhash not in self.indexed:
+                self.indexFlight(fhash, flight)
 
 
 class nonsiderial(object):
@@ -139,12 +325,58 @@ class nonsiderial(object):
         self.epochjd = 0.
 
 
+class lazylegs(object):
+    """
+    Stand-in for the flightprofile.legs list that only parses a leg the
+    first time it's accessed, using the leg header (lhed) and leg data (ldat)
+    line locations that parseMISlightly already found.  Parsed legs are kept
+    so each one is only ever parsed once.
+    """
+    def __init__(self, flight, lhed, ldat, cont):
+        self.flight = flight
+        self.lhed = lhed
+        self.ldat = ldat
+        self.cont = cont
+        self.parsed = [None]*len(lhed)
+
+    def __len__(self):
+        return len(self.parsed)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[j] for j in range(*idx.indices(len(self)))]
+
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("leg index out of range")
+
+        if self.parsed[idx] is None:
+            self.parsed[idx] = parseLeg(idx, self.flight, self.lhed,
+                                        self.ldat, self.cont)
+        return self.parsed[idx]
+
+    def __setitem__(self, idx, leg):
+        self.parsed[idx] = leg
+
+    def __iter__(self):
+        for j in range(len(self)):
+            yield self[j]
+
+    def append(self, leg):
+        # Added legs are already parsed, so there's nothing to look up later
+        self.parsed.append(leg)
+
+
 class flightprofile(object):
     """
     Defining several common flight plan ... thingies.
     """
     def __init__(self):
         self.filename = ''
+        # Where the file was actually read from, as opposed to the
+        #   filename that's written inside of it
+        self.filepath = ''
         self.hash = ''
         self.saved = ''
         self.origin = ''
@@ -177,6 +409,15 @@ class flightprofile(object):
         self.nlegs = 0
         self.legs = []
         self.reviewComments = flightcomments()
+        # Anything odd about the structure of the file; see segmentMIS
+        self.anomalies = []
+        # Problems noted during a resilient parse, as (line number, field,
+        #   reason); always empty otherwise.  See parseMIS
+        self.diagnostics = []
+        self.resilient = False
+        # Which .mis vintage it was parsed as (see dialects.py), or
+        #   'generic' if none of them claimed it
+        self.dialect = 'generic'
 
     def add_leg(self, parsedleg):
         self.legs.append(parsedleg)
@@ -213,13 +454,67 @@ class flightprofile(object):
         return txtStr
 
 
+def statRange(vals):
+    """
+    Return the (min, max, mean) of an array, ignoring NaNs; if there's
+    nothing valid in there at all, return NaNs instead of complaining.
+    """
+    vals = np.asarray(vals, dtype=np.float64)
+    good = vals[np.isfinite(vals)]
+    if good.size == 0:
+        return (np.NaN, np.NaN, np.NaN)
+    else:
+        return (good.min(), good.max(), good.mean())
+
+
+class legstats(object):
+    """
+    Derived per-leg statistics, computed in one go from the waypoint data.
+    Each of the range attributes is a (min, max, mean) tuple.
+
+    Don't make these directly; use legprofile.stats, which caches them.
+    """
+    def __init__(self, leg):
+        self.elev = statRange(leg.elev)
+        self.rof = statRange(leg.rof)
+        self.rofrt = statRange(leg.rofrt)
+        self.sunelev = statRange(leg.sunelev)
+        self.loswv = statRange(leg.loswv)
+
+        # True heading rate (deg/min) between each pair of waypoints,
+        #   taking care of the wrap at 0/360 degrees
+        thdg = np.asarray(leg.thdg, dtype=np.float64)
+        etime = np.asarray(leg.elapsedtime, dtype=np.float64)
+        if thdg.size > 1 and etime.size == thdg.size:
+            dhdg = (np.diff(thdg) + 180.) % 360. - 180.
+            dtime = np.diff(etime)/60.
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.thdgrates = np.where(dtime > 0, dhdg/dtime, np.NaN)
+        else:
+            self.thdgrates = np.array([])
+        self.thdgrt = statRange(self.thdgrates)
+
+        # ROF rate combined with the heading rate; the first ROF rate of a
+        #   leg is always N/A so this lines up with the heading rate steps
+        rofrt = np.asarray(leg.rofrt, dtype=np.float64)
+        if self.thdgrates.size > 0 and rofrt.size == thdg.size:
+            self.comborates = rofrt[1:] + self.thdgrates
+        else:
+            self.comborates = np.array([])
+        self.comborate = statRange(self.comborates)
+
+
 class legprofile(object):
     """
     Defining several common leg characteristics, to be imbedded inside a
     flightprofile object for easy access.
     """
+    # Changing any of these means the cached legstats are wrong
+    _statsdeps = ('elev', 'rof', 'rofrt', 'thdg', 'sunelev', 'loswv',
+                  'elapsedtime')
 
     def __init__(self):
+        self._stats = None
         self.legno = 0
         self.legtype = ''
         self.target = ''
@@ -240,8 +535,11 @@ class legprofile(object):
         self.range_thdgrtu = ''
         self.moonangle = 0
         self.moonillum = ''
-        self.utc = []
-        self.utcdt = []
+        # Reference time that relative_time counts from (the takeoff);
+        #   utc and utcdt are built from it only when someone asks for them
+        self.reftime = None
+        self._utc = None
+        self._utcdt = None
         self.elapsedtime = []
         self.mhdg = []
         self.thdg = []
@@ -263,6 +561,58 @@ class legprofile(object):
         self.nonsid = False
         self.naifid = -1
 
+    def __setattr__(self, name, value):
+        if name in self._statsdeps:
+            self.__dict__['_stats'] = None
+        object.__setattr__(self, name, value)
+
+    @property
+    def stats(self):
+        """
+        Derived statistics (legstats) of the waypoint data, computed the
+        first time they're asked for and kept until the data is replaced.
+        """
+        if self._stats is None:
+            self._stats = legstats(self)
+        return self._stats
+
+    def invalidateStats(self):
+        """
+        Throw away the cached legstats; only needed if you change the
+        waypoint lists in place rather than assigning new ones.
+        """
+        self._stats = None
+
+    @property
+    def utcdt(self):
+        """
+        Waypoint timestamps as datetime objects, created on first access
+        """
+        if self._utcdt is None:
+            if self.reftime is None:
+                return []
+            self._utcdt = [self.reftime + timedelta(seconds=int(each))
+                           for each in self.relative_time]
+        return self._utcdt
+
+    @utcdt.setter
+    def utcdt(self, value):
+        self._utcdt = value
+        self._utc = None
+
+    @property
+    def utc(self):
+        """
+        Waypoint timestamps as ISO formatted strings, created on first access
+        """
+        if self._utc is None:
+            self._utc = list(map(go_iso, self.utcdt))
+        return self._utc
+
+    @utc.setter
+    def utc(self, value):
+        self._utc = value
+
     def summarize(self):
         """
         Returns a nice summary string about the current leg
@@ -334,7 +684,7 @@ def interp_flight(oflight, npts, timestep=55):
     i = 0
     j = 0
     for leg in iflight.legs:
-        if len(leg.utcdt) > 1:
+        if len(leg.relative_time) > 1:
             # Construct our point timings, done poorly but quickly
             filler = np.arange(leg.relative_time[0],
                                leg.relative_time[-1]+delta,
@@ -413,6 +763,7 @@ def findLegHeaders(words, header, how='match'):
     Use the 'how' keyword to control the searching;
         header.match() checks the BEGINNING of the words string only
     """
+    countParse('regex', len(words))
     locs = []
     for i, line in enumerate(words):
         match = header.match(line)
@@ -422,6 +773,122 @@ def findLegHeaders(words, header, how='match'):
     return locs
 
 
+class MISFormatError(ValueError):
+    """
+    The .mis file's leg structure doesn't make sense; anomalies is the
+    list of (line number, severity, message) that segmentMIS found
+    """
+    def __init__(self, message, anomalies=None):
+        super(MISFormatError, self).__init__(message)
+        if anomalies is None:
+            anomalies = []
+        self.anomalies = anomalies
+
+
+class missegments(object):
+    """
+    Where the leg blocks are in a .mis file (0-indexed line offsets):
+    the leg header (lhed) and waypoint data header (ldat) lines of each
+    leg, and where each leg's block ends (ends; exclusive, so it's the
+    next leg header or the end of the file).  A leg with no data header
+    gets None in ldat, so the three always line up.
+
+    anomalies is a list of (line number (1-indexed, like an editor),
+    severity, message); severity is 'error' for things that make the legs
+    unparseable and 'warning' for things that are just odd.
+    """
+    def __init__(self):
+        self.lhed = []
+        self.ldat = []
+        self.ends = []
+        self.anomalies = []
+
+    def errors(self):
+        return [each for each in self.anomalies if each[1] == 'error']
+
+
+# Leg and waypoint data header lines, and both of those plus the NAIF ID
+#   line in one go so the segmenter only has to try one regex per line
+leghead = re.compile("Leg \d* \(.*\)")
+datahead = re.compile("UTC\s*MHdg")
+blockhead = re.compile("(%s)|(%s)|(NAIF ID)" % (leghead.pattern,
+                                               datahead.pattern))
+
+
+def segmentMIS(lines):
+    """
+    Given the lines of a .mis file (via readlines()), find the leg header,
+    waypoint data header and block end lines of every leg in one pass,
+    along with anything structurally odd along the way.  Returns a
+    missegments class.
+    """
+    segs = missegments()
+    countParse('regex', len(lines))
+
+    # Only the interesting lines come out of here, with which group
+    #   matched: 1 for a leg header, 2 for a data header, 3 for NAIF ID
+    hits = [(i, match.lastindex) for i, match in
+            enumerate(map(blockhead.match, lines)) if match is not None]
+
+    # Whether the current leg has had its data header yet
+    havedata = True
+    for i, kind in hits:
+        if kind == 1:
+            if havedata is False:
+                segs.anomalies.append((segs.lhed[-1] + 1, 'error',
+                                       "Leg header with no waypoint data "
+                                       "before the next leg (line %d)" %
+                                       (i + 1)))
+                segs.ldat.append(None)
+            if len(segs.lhed) > 0:
+                segs.ends.append(i)
+            segs.lhed.append(i)
+            havedata = False
+        elif kind == 2:
+            if len(segs.lhed) == 0:
+                segs.anomalies.append((i + 1, 'error', "Waypoint data "
+                                       "header before any leg header"))
+            elif havedata is True:
+                segs.anomalies.append((i + 1, 'error', "Second waypoint "
+                                       "data header in leg %d" %
+                                       (len(segs.lhed))))
+            else:
+                segs.ldat.append(i)
+            havedata = True
+        else:
+            # The README says to delete these by hand, but the metadata
+            #   parsing copes with them now so it's just a heads up
+            segs.anomalies.append((i + 1, 'warning', "NAIF ID line in the "
+                                   "header of leg %d (nonsidereal target)" %
+                                   (len(segs.lhed))))
+    if len(segs.lhed) > 0:
+        segs.ends.append(len(lines))
+        if havedata is False:
+            segs.anomalies.append((segs.lhed[-1] + 1, 'error',
+                                   "Last leg header has no waypoint data"))
+            segs.ldat.append(None)
+    else:
+        segs.anomalies.append((0, 'error', "No leg headers found (looking "
+                               "for '%s')" % (leghead.pattern)))
+
+    # First and last legs are always parsed as departure and arrival no
+    #   matter what they're called, so at least say if that looks wrong
+    if len(segs.lhed) > 1:
+        first = lines[segs.lhed[0]]
+        if leghead.match(first).group().find('(Departure)') == -1:
+            segs.anomalies.append((segs.lhed[0] + 1, 'warning',
+                                   "First leg isn't called 'Departure' but "
+                                   "is treated as the takeoff leg"))
+        last = leghead.match(lines[segs.lhed[-1]]).group()
+        if last.find('(Arrival') == -1 and last.find('(Approach') == -1:
+            segs.anomalies.append((segs.lhed[-1] + 1, 'warning',
+                                   "Last leg isn't called 'Arrival' or "
+                                   "'Approach' but is treated as the "
+                                   "landing leg"))
+
+    return segs
+
+
 def keyValuePair(line, key, delim=":", dtype=None, linelen=None, pos=1):
     """
     Given a line and a key supposedly occuring on that line, return its
@@ -498,7 +965,7 @@ def keyValuePairTD(line, key, delim=":", length=8):
     #   we're going to go the annoying way around
     dtobj = timedelta(days=0, weeks=0,
                       hours=np.float(val[0:2]), minutes=np.float(val[3:5]),
-                      seconds=np.float(val[7:]))
+                      seconds=np.float(val[6:8]))
     return dtobj
 
 
@@ -532,6 +999,7 @@ def regExper(lines, key, keytype='key:val', howmany=1, nextkey=None):
         print("Volguus Zildrohoar, Lord of the Seboullia.")
         print("Are you the Gatekeeper?")
 
+    countParse('regex', len(lines))
     for each in lines:
         if keytype == 'threeline':
             cmatch = re.findall(mask, each.strip())
@@ -583,120 +1051,235 @@ def isItBlankOrNot(stupidkeyval):
     return result
 
 
-def parseLegData(i, contents, leg, flight):
+def keyLine(lines, key):
     """
+    Return the index of the first of the given lines containing key, or
+    None if there isn't one
+    """
+    if lines is not None and key is not None:
+        for j, line in enumerate(lines):
+            if line.find(key) != -1:
+                return j
+    return None
+
+
+class _fieldguard(object):
+    """
+    For resilient parsing; any error in the with block is swallowed and
+    recorded in diags as (line number, field, reason) instead, leaving
+    whatever the field already was (usually the class default)
+    """
+    def __init__(self, diags, field, lines, offset, key):
+        self.diags = diags
+        self.field = field
+        self.lines = lines
+        self.offset = offset
+        self.key = key
+        self.failed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, etype, evalue, tb):
+        if etype is None or not issubclass(etype, Exception):
+            return False
+
+        # If the key isn't anywhere, the first line of the block is the
+        #   best we can do for where it should have been
+        j = keyLine(self.lines, self.key)
+        if self.lines is None:
+            lno = self.offset + 1
+            reason = "couldn't parse (%s: %s)" % (etype.__name__, evalue)
+        elif j is None:
+            lno = self.offset + 1
+            reason = "missing"
+        else:
+            lno = self.offset + j + 1
+            reason = "couldn't parse (%s: %s)" % (etype.__name__, evalue)
+        self.diags.append((lno, self.field, reason))
+        self.failed = True
+        countParse('diagnostics')
+
+        return True
+
 
+def guardField(diags, field, lines=None, offset=0, key=None):
+    """
+    Context manager around the parsing of one field.  If diags is None
+    (the normal, strict way) errors go right on through; otherwise they're
+    recorded in diags and parsing carries on.  key is what to look for to
+    find the offending line, defaulting to the field name.
+    """
+    if diags is None:
+        return _notimer
+    if key is None:
+        key = field
+    return _fieldguard(diags, field, lines, offset, key)
+
+
+# Waypoint lists that get one entry per waypoint row in parseLegData
+waypointlists = ['mhdg', 'thdg', 'lat', 'long', 'wind_dir', 'wind_speed',
+                 'temp', 'lst', 'elev', 'rof', 'rofrt', 'loswv', 'sunelev',
+                 'comments']
+
+
+def parseLegData(i, contents, leg, flight, diags=None, offset=0):
+    """
+    Given the block of lines holding a leg's waypoint table, parse each
+    waypoint into the leg class and return it.
+
+    Times are kept as integer seconds since takeoff (relative_time) and
+    since the start of the leg (elapsedtime); the datetime and ISO string
+    versions (utcdt and utc) are only made if something actually asks.
+
+    If diags is a list, any waypoint row that can't be parsed is skipped
+    and noted there rather than raising; offset is the line number of the
+    start of contents, so the notes point at the right line.
     """
 #    print "\nParsing leg %d" % (i + 1)
 #    print contents
     # I probably should learn to do stuff better than this someday.
     #  Today is not that day, FOR TONIGHT WE DINE IN HELL.
-    ptime = 0.
+    start = False
+    sods = []
     for j, line in enumerate(contents):
         if line.strip() != '':
             if line.split()[0] == 'UTC':
                 start = True
-                k = 0
         if start is True:
             line = line.strip().split()
             # If it's a full line (plus maybe a comment)
             if len(line) > 14:
-                tobj = datetime.strptime(line[0], "%H:%M:%S")
-                # Might contain wrong day, but we'll correct for it
-                utcdt = flight.takeoff.replace(hour=tobj.hour,
-                                               minute=tobj.minute,
-                                               second=tobj.second)
-                if k == 0:
-                    startdtobj = utcdt
-                    leg.elapsedtime.append(0)
-                else:
-                    # When reconstructing an ISO timestamp, check for a
-                    #  change of day that we'll have to set manually
-                    if ptime.hour == 23 and utcdt.hour == 0:
-                        utcdt.replace(day=flight.takeoff.day + 1)
-                        print("Bastard day change")
-                    # Start trackin the relative time from start too
-                    leg.elapsedtime.append((utcdt-startdtobj).seconds)
-                leg.utcdt.append(utcdt)
-                leg.relative_time.append((utcdt -
-                                          flight.takeoff).seconds)
-                leg.utc.append(utcdt.isoformat())
-
-                leg.mhdg.append(np.float(line[1]))
-                leg.thdg.append(np.float(line[2]))
-#                    leg.lat.append(line[3:5])
-                leg.lat.append(np.float(line[3][1:]) +
-                               np.float(line[4])/60.)
-                if line[3][0] == 'S':
-                    leg.lat[-1] *= -1
-                leg.long.append(np.float(line[5][1:]) +
-                                np.float(line[6])/60.)
-                if line[5][0] == 'W':
-                    leg.long[-1] *= -1
-
-                leg.wind_dir.append(np.float(line[7].split('/')[0]))
-                leg.wind_speed.append(np.float(line[7].split('/')[1]))
-                leg.temp.append(np.float(line[8]))
-                leg.lst.append(line[9])
-                if line[10] == "N/A":
-                    leg.elev.append(np.NaN)
-                else:
-                    leg.elev.append(np.float(line[10]))
-                if line[11] == 'N/A':
-                    leg.rof.append(np.NaN)
-                else:
-                    leg.rof.append(np.float(line[11]))
-                if line[12] == 'N/A':
-                    leg.rofrt.append(np.NaN)
-                else:
-                    leg.rofrt.append(np.float(line[12]))
-                if line[13] == 'N/A':
-                    leg.loswv.append(np.NaN)
-                else:
-                    leg.loswv.append(np.float(line[13]))
-                leg.sunelev.append(np.float(line[14]))
-                if len(line) == 16:
-                    leg.comments.append(line[15])
-                else:
-                    leg.comments.append('')
+                try:
+                    # Seconds since midnight; converted to relative times
+                    #   (with any day change) once we've got them all
+                    sods.append(hmsToSeconds(line[0]))
+
+                    leg.mhdg.append(np.float(line[1]))
+                    leg.thdg.append(np.float(line[2]))
+#                        leg.lat.append(line[3:5])
+                    leg.lat.append(np.float(line[3][1:]) +
+                                   np.float(line[4])/60.)
+                    if line[3][0] == 'S':
+                        leg.lat[-1] *= -1
+                    leg.long.append(np.float(line[5][1:]) +
+                                    np.float(line[6])/60.)
+                    if line[5][0] == 'W':
+                        leg.long[-1] *= -1
+
+                    leg.wind_dir.append(np.float(line[7].split('/')[0]))
+                    leg.wind_speed.append(np.float(line[7].split('/')[1]))
+                    leg.temp.append(np.float(line[8]))
+                    leg.lst.append(line[9])
+                    if line[10] == "N/A":
+                        leg.elev.append(np.NaN)
+                    else:
+                        leg.elev.append(np.float(line[10]))
+                    if line[11] == 'N/A':
+                        leg.rof.append(np.NaN)
+                    else:
+                        leg.rof.append(np.float(line[11]))
+                    if line[12] == 'N/A':
+                        leg.rofrt.append(np.NaN)
+                    else:
+                        leg.rofrt.append(np.float(line[12]))
+                    if line[13] == 'N/A':
+                        leg.loswv.append(np.NaN)
+                    else:
+                        leg.loswv.append(np.float(line[13]))
+                    leg.sunelev.append(np.float(line[14]))
+                    if len(line) == 16:
+                        leg.comments.append(line[15])
+                    else:
+                        leg.comments.append('')
+                except Exception as why:
+                    if diags is None:
+                        raise
+                    # Throw out whatever part of the row made it in so
+                    #   all the waypoint lists still line up
+                    n = len(leg.comments)
+                    del sods[n:]
+                    for attr in waypointlists:
+                        del getattr(leg, attr)[n:]
+                    diags.append((offset + j + 1, 'waypoint',
+                                  "row skipped (%s: %s)" %
+                                  (type(why).__name__, why)))
+                    countParse('diagnostics')
+
+    # Do all the time math in one go; this also takes care of the
+    #   bastard day change if the flight goes past midnight UTC
+    leg.reftime = flight.takeoff
+    leg.relative_time = secondsSinceTakeoff(sods, flight.takeoff)
+    if len(sods) > 0:
+        leg.elapsedtime = leg.relative_time - leg.relative_time[0]
+    else:
+        leg.elapsedtime = leg.relative_time.copy()
 
-                # Store the current datetime for comparison to the next
-                ptime = utcdt
-                k += 1
-        
     return leg
 
 
-def parseLegMetadata(i, words, ltype=None):
+def parseLegMetadata(i, words, ltype=None, diags=None, offset=0,
+                     dialect=None):
     """
     Given a block of lines from the .MIS file that contain the leg's
     metadata and actual data starting lines, parse all the crap in between
     that's important and useful and return the leg class for further use.
+
+    If diags is a list, fields that can't be found or parsed are noted
+    there (see guardField) and left at their defaults; offset is the line
+    number of the start of words.  If a dialect (see dialects.py) is given,
+    the first header line is read with it, falling back to searching for
+    everything if that doesn't work.
     """
 #    print "\nParsing leg %d" % (i + 1)
     newleg = legprofile()
     newleg.legno = i + 1
 
+    def guard(field, key=None):
+        return guardField(diags, field, words, offset, key=key)
+
+    fasthead = None
+    if dialect is not None:
+        try:
+            fasthead = dialect.parseLegHead(words[0])
+        except ValueError:
+            countParse('fallbacks')
+
     # Use the regexp setup used in parseMISPreamble to make this not awful
-    legtarg = regExper(words, 'Leg', howmany=1, keytype='legtarg')
-    # NOTE: need pos=2 here because it's splitting on the spaces, and the
-    #   format is "Leg N (stuff)" and [1:-1] excludes the parentheses
-    newleg.target = keyValuePair(legtarg.group(),
-                                 "Leg", delim=' ', pos=2, dtype=str)[1:-1]
-
-    start = regExper(words, 'Start', howmany=1, keytype='key:val')
-    newleg.start = keyValuePairTD(start.group(), "Start")
-
-    dur = regExper(words, 'Leg Dur', howmany=1, keytype='key:val')
-    newleg.duration = keyValuePairTD(dur.group(), "Leg Dur")
-
-    alt = regExper(words, 'Req. Alt', howmany=1, keytype='key:val')
-    if alt is None:
-        # And it begins; needed for Cycle 5 MIS files due to a name change
-        alt = regExper(words, 'Alt.', howmany=1, keytype='key:val')
-        newleg.altitude = keyValuePair(alt.group(), "Alt", dtype=float)
+    with guard('Leg'):
+        if fasthead is not None:
+            # Dialect says the header's the first line, so only look there
+            legtarg = regExper(words[0:1], 'Leg', howmany=1,
+                               keytype='legtarg')
+        else:
+            legtarg = regExper(words, 'Leg', howmany=1, keytype='legtarg')
+        # NOTE: need pos=2 here because it's splitting on the spaces, and
+        #   the format is "Leg N (stuff)" and [1:-1] excludes the parentheses
+        newleg.target = keyValuePair(legtarg.group(),
+                                     "Leg", delim=' ', pos=2, dtype=str)[1:-1]
+
+    if fasthead is not None:
+        newleg.start, newleg.duration, newleg.altitude = fasthead
     else:
-        newleg.altitude = keyValuePair(alt.group(), "Req. Alt", dtype=float)
+        with guard('Start'):
+            start = regExper(words, 'Start', howmany=1, keytype='key:val')
+            newleg.start = keyValuePairTD(start.group(), "Start")
+
+        with guard('Leg Dur'):
+            dur = regExper(words, 'Leg Dur', howmany=1, keytype='key:val')
+            newleg.duration = keyValuePairTD(dur.group(), "Leg Dur")
+
+        with guard('Alt', key='Alt'):
+            alt = regExper(words, 'Req. Alt', howmany=1, keytype='key:val')
+            if alt is None:
+                # And it begins; needed for Cycle 5 MIS files due to a
+                #   name change
+                alt = regExper(words, 'Alt.', howmany=1, keytype='key:val')
+                newleg.altitude = keyValuePair(alt.group(), "Alt",
+                                               dtype=float)
+            else:
+                newleg.altitude = keyValuePair(alt.group(), "Req. Alt",
+                                               dtype=float)
 
     # Now we begin the itterative approach to parsing (with some help)
     if ltype == 'Takeoff':
@@ -718,60 +1301,75 @@ def parseLegMetadata(i, words, ltype=None):
             target = 'Undefined'
             newleg.legtype = 'Other'
         else:
-            target = isItBlankOrNot(target.groups()[1])
-#            target = target.groups()[1].split(':')[1].strip()
-            if target == '':
-                target = 'Undefined'
-#            newleg.target = target
-            # Added this to help with exporting to confluence down the line
-            newleg.target = target.replace('[', '').replace(']', '')
             newleg.legtype = 'Observing'
-
-            odur = regExper(words, 'Obs Dur', howmany=1, keytype='key:val')
-            newleg.obsdur = keyValuePairTD(odur.group(), "Obs Dur")
-
-            ra = regExper(words, 'RA', howmany=1, keytype='key:val')
-            newleg.ra = keyValuePair(ra.group(), "RA", dtype=str)
-
-            epoch = regExper(words, 'Equinox', howmany=1, keytype='key:val')
-            newleg.epoch = keyValuePair(epoch.group(), "Equinox", dtype=str)
-
-            dec = regExper(words, 'Dec', howmany=1, keytype='key:val')
-            newleg.dec = keyValuePair(dec.group(), "Dec", dtype=str)
+            with guard('Target'):
+                target = isItBlankOrNot(target.groups()[1])
+#                target = target.groups()[1].split(':')[1].strip()
+                if target == '':
+                    target = 'Undefined'
+#                newleg.target = target
+                # Added this to help with exporting to confluence later
+                newleg.target = target.replace('[', '').replace(']', '')
+
+            with guard('Obs Dur'):
+                odur = regExper(words, 'Obs Dur', howmany=1,
+                                keytype='key:val')
+                newleg.obsdur = keyValuePairTD(odur.group(), "Obs Dur")
+
+            with guard('RA'):
+                ra = regExper(words, 'RA', howmany=1, keytype='key:val')
+                newleg.ra = keyValuePair(ra.group(), "RA", dtype=str)
+
+            with guard('Equinox'):
+                epoch = regExper(words, 'Equinox', howmany=1,
+                                 keytype='key:val')
+                newleg.epoch = keyValuePair(epoch.group(), "Equinox",
+                                            dtype=str)
+
+            with guard('Dec'):
+                dec = regExper(words, 'Dec', howmany=1, keytype='key:val')
+                newleg.dec = keyValuePair(dec.group(), "Dec", dtype=str)
 
             # First shot at parsing blank values. Was a bit hokey.
 #            opidline = regExper(words, ['ObspID', 'Blk', 'Priority'],
 #                                howmany=1, keytype='threeline')
 
-            opid = regExper(words, 'ObspID', howmany=1, nextkey='Blk',
-                            keytype='key+nextkey')
-            obsblk = regExper(words, 'Blk', howmany=1, nextkey='Priority',
-                              keytype='key+nextkey')
-
             # Note: these are for the original (threeline) parsing method
 #            newleg.obsplan = isItBlankOrNot(opidline[0][1])
 #            newleg.obsblk = isItBlankOrNot(opidline[0][2])
 
-            newleg.obsplan = isItBlankOrNot(opid.groups()[1])
-            newleg.obsblk = isItBlankOrNot(obsblk.groups()[1])
-
-            naif = regExper(words, 'NAIF ID', howmany=1, keytype='key:val')
-            if naif is None:
-                newleg.nonsid = False
-                newleg.naifid = -1
-            else:
-                newleg.nonsid = True
-                newleg.naifid = keyValuePair(naif.group(), 'NAIF ID',
-                                             dtype=int)
+            with guard('ObspID'):
+                opid = regExper(words, 'ObspID', howmany=1, nextkey='Blk',
+                                keytype='key+nextkey')
+                newleg.obsplan = isItBlankOrNot(opid.groups()[1])
+            with guard('Blk'):
+                obsblk = regExper(words, 'Blk', howmany=1,
+                                  nextkey='Priority', keytype='key+nextkey')
+                newleg.obsblk = isItBlankOrNot(obsblk.groups()[1])
+
+            with guard('NAIF ID'):
+                naif = regExper(words, 'NAIF ID', howmany=1,
+                                keytype='key:val')
+                if naif is None:
+                    newleg.nonsid = False
+                    newleg.naifid = -1
+                else:
+                    newleg.nonsid = True
+                    newleg.naifid = keyValuePair(naif.group(), 'NAIF ID',
+                                                 dtype=int)
 
             # Big of manual magic to deal with the stupid brackets
-            rnge_e = regExper(words, 'Elev', howmany=1, keytype='bracketvals')
-            rnge_e = rnge_e.groups()[1][1:-1].split(',')
-            newleg.range_elev = [np.float(each) for each in rnge_e]
-
-            rnge_rof = regExper(words, 'ROF', howmany=1, keytype='bracketvals')
-            rnge_rof = rnge_rof.groups()[1][1:-1].split(',')
-            newleg.range_rof = [np.float(each) for each in rnge_rof]
+            with guard('Elev'):
+                rnge_e = regExper(words, 'Elev', howmany=1,
+                                  keytype='bracketvals')
+                rnge_e = rnge_e.groups()[1][1:-1].split(',')
+                newleg.range_elev = [np.float(each) for each in rnge_e]
+
+            with guard('ROF'):
+                rnge_rof = regExper(words, 'ROF', howmany=1,
+                                    keytype='bracketvals')
+                rnge_rof = rnge_rof.groups()[1][1:-1].split(',')
+                newleg.range_rof = [np.float(each) for each in rnge_rof]
 
             # Yet another madman decision - using the same keyword twice!
             #   This will return both the rate for the ROF [0] and the
@@ -806,20 +1404,24 @@ def parseLegMetadata(i, words, ltype=None):
                 newleg.range_thdgrt = "Undefined"
                 newleg.range_thdgrtu = "Undefined"
 
-            moon = regExper(words, 'Moon Angle', howmany=1, keytype='key:val')
-            newleg.moonangle = keyValuePair(moon.group(), "Moon", dtype=float)
+            with guard('Moon Angle'):
+                moon = regExper(words, 'Moon Angle', howmany=1,
+                                keytype='key:val')
+                newleg.moonangle = keyValuePair(moon.group(), "Moon",
+                                                dtype=float)
 
             # Moon illumination isn't always there
-            moonillum = regExper(words, 'Moon Illum',
-                                 howmany=1, keytype='key:val')
-            if moonillum is not None:
-                newleg.moonillum = keyValuePair(moonillum.group(),
-                                                "Moon Illum", dtype=str)
+            with guard('Moon Illum'):
+                moonillum = regExper(words, 'Moon Illum',
+                                     howmany=1, keytype='key:val')
+                if moonillum is not None:
+                    newleg.moonillum = keyValuePair(moonillum.group(),
+                                                    "Moon Illum", dtype=str)
 
         return newleg
 
 
-def parseMISPreamble(lines, flight, summarize=False):
+def parseMISPreamble(lines, flight, summarize=False, diags=None):
     """
     Returns valuable parameters from the preamble section, such as flight
     duration, locations, etc. directly to the flight class and returns it.
@@ -828,7 +1430,12 @@ def parseMISPreamble(lines, flight, summarize=False):
     preamble block each time, customizing the searches based on what
     we're actually looking for (keytype).
 
+    If diags is a list, fields that can't be found or parsed are noted
+    there (see guardField) and left at their defaults.
     """
+    def guard(field):
+        return guardField(diags, field, lines, 0)
+
     # Attempt to parse stuff from the Flight Plan ID bit. Fancy logic for
     #   grabbing the fancy name, which didn't always exist
     try:
@@ -847,45 +1454,56 @@ def parseMISPreamble(lines, flight, summarize=False):
         fid = ['', '', '']
 
     # Grab the filename and date of MIS file creation
-    filename = regExper(lines, 'Filename', howmany=1, keytype='key:val')
-    flight.filename = keyValuePair(filename.group(), "Filename", dtype=str)
+    with guard('Filename'):
+        filename = regExper(lines, 'Filename', howmany=1, keytype='key:val')
+        flight.filename = keyValuePair(filename.group(), "Filename",
+                                       dtype=str)
 
     # Note: the saved key is a timestamp, with a space in between stuff.
-    saved = regExper(lines, 'Saved', howmany=1, keytype='key:dtime')
-    flight.saved = keyValuePairDT(saved.group(), "Saved")
+    with guard('Saved'):
+        saved = regExper(lines, 'Saved', howmany=1, keytype='key:dtime')
+        flight.saved = keyValuePairDT(saved.group(), "Saved")
 
     # Search for two airports; first is takeoff, second is landing
-    airports = regExper(lines, 'Airport', howmany=2, keytype='key:val')
-    if airports is not None and len(airports) == 2:
-        flight.origin = keyValuePair(airports[0].group(),
-                                     "Airport", dtype=str)
-        flight.destination = keyValuePair(airports[1].group(),
-                                          "Airport", dtype=str)
-    elif len(airports) != 2 or airports is None:
-        print("WARNING: Couldn't find departure/arrival information!")
-        flight.origin = "Unknown"
-        flight.destination = "Unknown"
-
-    runway = regExper(lines, 'Runway', howmany=1, keytype='key:val')
-    flight.drunway = keyValuePair(runway.group(), "Runway", dtype=str)
-
-    legs = regExper(lines, 'Legs', howmany=1, keytype='key:val')
-    flight.nlegs = keyValuePair(legs.group(), "Legs", dtype=int)
-
-    mach = regExper(lines, 'Mach', howmany=1, keytype='key:val')
-    flight.mach = keyValuePair(mach.group(), "Mach", dtype=float)
-
-    takeoff = regExper(lines, 'Takeoff', howmany=1, keytype='key:dtime')
-    flight.takeoff = keyValuePairDT(takeoff.group(), "Takeoff")
-
-    obstime = regExper(lines, 'Obs Time', howmany=1, keytype='key:val')
-    flight.obstime = keyValuePairTD(obstime.group(), "Obs Time")
-
-    flttime = regExper(lines, 'Flt Time', howmany=1, keytype='key:val')
-    flight.flighttime = keyValuePairTD(flttime.group(), "Flt Time")
-
-    landing = regExper(lines, 'Landing', howmany=1, keytype='key:dtime')
-    flight.landing = keyValuePairDT(landing.group(), "Landing")
+    with guard('Airport'):
+        airports = regExper(lines, 'Airport', howmany=2, keytype='key:val')
+        if airports is not None and len(airports) == 2:
+            flight.origin = keyValuePair(airports[0].group(),
+                                         "Airport", dtype=str)
+            flight.destination = keyValuePair(airports[1].group(),
+                                              "Airport", dtype=str)
+        elif len(airports) != 2 or airports is None:
+            print("WARNING: Couldn't find departure/arrival information!")
+            flight.origin = "Unknown"
+            flight.destination = "Unknown"
+
+    with guard('Runway'):
+        runway = regExper(lines, 'Runway', howmany=1, keytype='key:val')
+        flight.drunway = keyValuePair(runway.group(), "Runway", dtype=str)
+
+    with guard('Legs'):
+        legs = regExper(lines, 'Legs', howmany=1, keytype='key:val')
+        flight.nlegs = keyValuePair(legs.group(), "Legs", dtype=int)
+
+    with guard('Mach'):
+        mach = regExper(lines, 'Mach', howmany=1, keytype='key:val')
+        flight.mach = keyValuePair(mach.group(), "Mach", dtype=float)
+
+    with guard('Takeoff'):
+        takeoff = regExper(lines, 'Takeoff', howmany=1, keytype='key:dtime')
+        flight.takeoff = keyValuePairDT(takeoff.group(), "Takeoff")
+
+    with guard('Obs Time'):
+        obstime = regExper(lines, 'Obs Time', howmany=1, keytype='key:val')
+        flight.obstime = keyValuePairTD(obstime.group(), "Obs Time")
+
+    with guard('Flt Time'):
+        flttime = regExper(lines, 'Flt Time', howmany=1, keytype='key:val')
+        flight.flighttime = keyValuePairTD(flttime.group(), "Flt Time")
+
+    with guard('Landing'):
+        landing = regExper(lines, 'Landing', howmany=1, keytype='key:dtime')
+        flight.landing = keyValuePairDT(landing.group(), "Landing")
 
     # NOTE: I hate fp. It sometimes doesn't write sunrise info.
     sunset = regExper(lines, 'Sunset', howmany=1, keytype='key:val')
@@ -906,73 +1524,305 @@ def parseMISPreamble(lines, flight, summarize=False):
     return flight
 
 
-def parseMISlightly(infile, summarize=False):
+def fallbackTakeoff(flight, contents, diags, offset=0):
+    """
+    If the takeoff time couldn't be parsed, use the time of the first
+    waypoint of leg 1 (given its block of lines as contents) instead so
+    that every leg's times still have something to count from.  The date
+    comes from the landing time, or failing that the date it was saved.
+    The substitution is noted in diags; if there's nothing usable, the
+    takeoff is left alone.
+    """
+    if isinstance(flight.takeoff, datetime):
+        return flight
+
+    start = False
+    for j, line in enumerate(contents):
+        words = line.split()
+        if words == []:
+            continue
+        if words[0] == 'UTC':
+            start = True
+        elif start is True:
+            try:
+                sod = hmsToSeconds(words[0])
+            except ValueError:
+                continue
+            break
+    else:
+        return flight
+
+    if isinstance(flight.landing, datetime):
+        day = datetime.combine(flight.landing.date(), datetime.min.time())
+        lsod = flight.landing.hour*3600 + flight.landing.minute*60 + \
+            flight.landing.second
+        # Took off the day before if it landed after midnight UTC
+        if lsod < sod:
+            day -= timedelta(days=1)
+        source = 'landing'
+    elif isinstance(flight.saved, datetime):
+        day = datetime.combine(flight.saved.date(), datetime.min.time())
+        source = 'saved'
+    else:
+        return flight
+
+    flight.takeoff = day + timedelta(seconds=sod)
+    diags.append((offset + j + 1, 'Takeoff', "taken from the first waypoint"
+                  " of leg 1 (date from the %s time)" % (source)))
+    countParse('diagnostics')
+
+    return flight
+
+
+def parseMISlightly(infile, summarize=False, resilient=False,
+                    dialect='auto'):
     """
     Given a SOFIA .MIS file, just parse the header block and return it
+
+    If resilient is True, problems in the file are noted in
+    flight.diagnostics (see parseMIS) rather than raised.
+
+    dialect is the name of the .mis vintage to parse it as (see
+    dialects.py), 'auto' to work it out from the top of the file, or None
+    to always use the general parsing.
     """
     # Create an empty base class that we'll fill up as we read through
     flight = flightprofile()
+    if resilient is True:
+        diags = flight.diagnostics
+    else:
+        diags = None
 
     # Read the file into memory so we can quickly parse stuff
-    f = open(infile, 'r')
-    cont = f.readlines()
-    f.close()
-
-    flight.hash = computeHash(infile)
-
-    # Search for the header lines which will tell us how many legs there are.
-    #  Use a regular expression to make the searching less awful
-    #  Note: regexp searches can be awful no matter what
-    head1 = "Leg \d* \(.*\)"
-    lhed = findLegHeaders(cont, re.compile(head1))
+    with parseTimer('read'):
+        f = open(infile, 'r')
+        cont = f.readlines()
+        f.close()
+    countParse('files')
+    countParse('lines', len(cont))
+
+    flight.filepath = infile
+    with parseTimer('hash'):
+        flight.hash = computeHash(infile)
+
+    # Find the leg header and waypoint data header lines, which tell us
+    #   how many legs there are, all in one go
+    with parseTimer('legheaders'):
+        segs = segmentMIS(cont)
+    flight.anomalies = segs.anomalies
+
+    errors = segs.errors()
+    if errors != [] and resilient is False:
+        msg = "Can't find the leg structure of %s:\n" % (infile)
+        msg += '\n'.join(["  line %d: %s" % (lno, why)
+                          for lno, sev, why in errors])
+        raise MISFormatError(msg, anomalies=segs.anomalies)
+    for lno, sev, why in errors:
+        diags.append((lno, 'structure', why))
+    lhed, ldat = segs.lhed, segs.ldat
 
     # Guarantee that the loop matches the number of legs found
     flight.nlegs = len(lhed)
 
-    head2 = "UTC\s*MHdg"
-    ldat = findLegHeaders(cont, re.compile(head2))
-
-    if len(lhed) != len(ldat):
-        print("FATAL ERROR: Couldn't find the same amount of legs and data!")
-        print("Check the formatting of the file?  Or the regular expressions")
-        print("need updating because they changed the file format?")
-        print("Looking for '%s' and '%s'" % (head1, head2))
-        return -1
-
     # Since we know where the first leg line is, we can define the preamble.
     #   Takes the flight class as an argument and returns it all filled up.
-    flight = parseMISPreamble(cont[0:lhed[0]], flight, summarize=summarize)
+    #   No legs at all means it's all preamble, as far as we can tell.
+    if len(lhed) > 0:
+        preamble = cont[0:lhed[0]]
+    else:
+        preamble = cont
+    with parseTimer('preamble'):
+        if dialect == 'auto':
+            if len(lhed) > 0:
+                dialect = sniffDialect(cont, leghead=lhed[0])
+            else:
+                dialect = None
+        elif dialect is not None:
+            dialect = getDialect(dialect)
+
+        if dialect is not None:
+            try:
+                flight = dialect.parsePreamble(preamble, flight)
+                flight.dialect = dialect.name
+                if summarize is True:
+                    print(flight.summarize())
+            except Exception:
+                # Not quite what it looked like; start over the long way
+                countParse('fallbacks')
+                dialect = None
+        if dialect is None:
+            flight = parseMISPreamble(preamble, flight, summarize=summarize,
+                                      diags=diags)
+
+    # Without a takeoff time no leg can work out its times, so make do
+    if diags is not None and len(lhed) > 0 and ldat[0] is not None:
+        if len(lhed) > 1:
+            end = lhed[1]
+        else:
+            end = len(cont)
+        flight = fallbackTakeoff(flight, cont[ldat[0]:end], diags,
+                                 offset=ldat[0])
+
+    # Legs parsed later on will need to know whether to be resilient too
+    flight.resilient = resilient
 
     return flight, lhed, ldat, cont
 
 
-def parseMIS(infile, summarize=False):
+def parseLeg(i, flight, lhed, ldat, cont):
     """
-    Read a SOFIA .MIS file, parse it, and return a nice thing we can work with
+    Parse the i-th leg (metadata and waypoint data) of a flight, given the
+    line locations found in parseMISlightly, and return it.
+
+    If the flight was parsed resiliently, anything wrong with the leg is
+    noted in flight.diagnostics and as much of the leg as possible is
+    returned, rather than raising.
     """
-    flight, lhed, ldat, cont = parseMISlightly(infile, summarize)
+    if i < len(lhed) - 1:
+        end = lhed[i+1]
+    else:
+        end = len(cont)
+    # A leg with no waypoint data header (only possible when resilient)
+    #   is all metadata
+    if ldat[i] is None:
+        dstart = end
+    else:
+        dstart = ldat[i]
 
-    for i, datastart in enumerate(lhed):
-        if i == 0:
-            # First leg is always takeoff
-            leg = parseLegMetadata(i, cont[lhed[i]:ldat[i]], ltype='Takeoff')
-        elif i == (flight.nlegs - 1):
-            # Last is always landing
-            leg = parseLegMetadata(i, cont[lhed[i]:ldat[i]], ltype='Landing')
-        else:
-            # Middle legs can be almost anything
-            leg = parseLegMetadata(i, cont[lhed[i]:ldat[i]])
+    if flight.resilient is True:
+        diags = flight.diagnostics
+    else:
+        diags = None
+
+    if i == 0:
+        # First leg is always takeoff
+        ltype = 'Takeoff'
+    elif i == (flight.nlegs - 1):
+        # Last is always landing
+        ltype = 'Landing'
+    else:
+        # Middle legs can be almost anything
+        ltype = None
+
+    leg = legprofile()
+    leg.legno = i + 1
+    legguard = guardField(diags, 'Leg %d' % (i + 1), offset=lhed[i])
+    with legguard:
+        with parseTimer('legmetadata'):
+            leg = parseLegMetadata(i, cont[lhed[i]:dstart], ltype=ltype,
+                                   diags=diags, offset=lhed[i],
+                                   dialect=getDialect(flight.dialect))
 #        print leg.summarize()
-        if i < len(lhed) - 1:
-            leg = parseLegData(i, cont[ldat[i]:lhed[i+1]], leg, flight)
-        else:
-            leg = parseLegData(i, cont[ldat[i]:], leg, flight)
+        with parseTimer('waypoints'):
+            leg = parseLegData(i, cont[dstart:end], leg, flight,
+                               diags=diags, offset=dstart)
+
+        # No start time, but the first waypoint says when it really started
+        if diags is not None and leg.start == '' and \
+                len(leg.relative_time) > 0:
+            leg.start = timedelta(seconds=int(flight.takeoff.hour*3600 +
+                                              flight.takeoff.minute*60 +
+                                              flight.takeoff.second +
+                                              leg.relative_time[0]) % 86400)
+            diags.append((lhed[i] + 1, 'Start', "taken from the first "
+                          "waypoint"))
+    if diags is not None and legguard.failed is True:
+        # Whatever went wrong, the waypoints can't be trusted to line up
+        #   with each other, so every per-waypoint array goes together
+        for attr in waypointlists + ['relative_time', 'elapsedtime']:
+            setattr(leg, attr, [])
+        leg.utcdt = None
+    countParse('legs')
+    countParse('waypointrows', len(leg.relative_time))
+
+    return leg
+
+
+def parseMIS(infile, summarize=False, lazy=False, resilient=False,
+             dialect='auto'):
+    """
+    Read a SOFIA .MIS file, parse it, and return a nice thing we can work with
+
+    If lazy is True, only the preamble is parsed right away and each leg
+    is parsed the first time it's asked for (see lazylegs).
 
-        flight.legs.append(leg)
+    If resilient is True, nothing in the file short of not being able to
+    read it raises.  Instead each problem is noted in flight.diagnostics
+    as (line number, field, reason), the field in question is left at its
+    default, and as much of the rest is parsed as possible: bad waypoint
+    rows are skipped, and a leg that's beyond saving is left mostly empty
+    without taking the rest of the flight with it.
+
+    dialect is passed along to parseMISlightly; leave it as 'auto' unless
+    the file is known to be odd.
+    """
+    flight, lhed, ldat, cont = parseMISlightly(infile, summarize,
+                                               resilient=resilient,
+                                               dialect=dialect)
+
+    if lazy is True:
+        flight.legs = lazylegs(flight, lhed, ldat, cont)
+    else:
+        for i, datastart in enumerate(lhed):
+            flight.legs.append(parseLeg(i, flight, lhed, ldat, cont))
 
     return flight
 
 
+def ingestFlights(infiles, resilient=True):
+    """
+    Parse a bunch of .mis files in one go, resiliently by default, and
+    return a dict of filename -> flight class for the ones that could be
+    parsed and a dict of filename -> reason for the ones that couldn't
+    (which, when resilient, should just be the ones that can't be read).
+
+    Check each flight's diagnostics to see what it had to skip.
+    """
+    flights = {}
+    failed = {}
+    for infile in infiles:
+        try:
+            flights[infile] = parseMIS(infile, resilient=resilient)
+        except Exception as why:
+            failed[infile] = "%s: %s" % (type(why).__name__, why)
+
+    return flights, failed
+
+
+def ingestDirectory(indir, pattern='*.mis', recursive=False,
+                    resilient=True):
+    """
+    ingestFlights for every file matching pattern in the given directory
+    (and every directory below it, if recursive is True)
+    """
+    if recursive is True:
+        infiles = []
+        for root, dirnames, filenames in os.walk(indir):
+            for filename in fnmatch.filter(filenames, pattern):
+                infiles.append(os.path.join(root, filename))
+    else:
+        infiles = glob.glob(os.path.join(indir, pattern))
+
+    return ingestFlights(sorted(infiles), resilient=resilient)
+
+
+def diagnosticComments(flight, comments=None):
+    """
+    Given a (resiliently) parsed flight, add a warning to the (optionally
+    given) flightcomments for each problem in its diagnostics, and return
+    the comments
+    """
+    if comments is None:
+        comments = flightcomments()
+
+    for lno, field, reason in flight.diagnostics:
+        basetag = "* Line %d: " % (lno)
+        ntag = "Parse problem with %s, %s" % (field, reason)
+        comments = commentinator(comments, 'warning', basetag, ntag)
+
+    return comments
+
+
 def computeHash(infile):
     """
     Given an input file, compute and return the sha1() hash of it so
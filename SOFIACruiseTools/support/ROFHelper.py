@@ -3,47 +3,162 @@
 Created on Fri Aug 30 18:57:54 2013
 
 @author: rhamilton
-"""
 
-import numpy as np
-import matplotlib.pyplot as plt
+Working out when the LOS has to be rewound on each observing leg.
 
-import MISparse as fpmis
+The telescope's line of sight (LOS) rotator only has so much range, so as
+the ROF changes over a leg the LOS has to be rewound every los_int degrees
+or so.  rewindSchedule figures out when that is for every observing leg of
+every flight given, straight from the planned ROF at the waypoints.
+"""
 
+from __future__ import division, print_function
 
-#infile = '/SalusaSecundus/rhamilton/Research/HAWC/201705/Flights/WXed/02_201705_HA_EAMES_WX12.mis'
-infile = '/Users/rhamilton/Research/HAWC/201705/Flights/WXed/02_201705_HA_EAMES_WX12.mis'
+import numpy as np
+from astropy.table import Table
 
-# Read the .mis into a helpful class
-flight = fpmis.parseMIS(infile, summarize=True)
-oleg = flight.legs[6]
-print(oleg.summarize())
+from .MISparse import parseMIS
 
-# Expand the coverage of that flight into something with more points
-iflight = fpmis.interp_flight(flight, 2000)
 
 # Interval between LOS rewinds, in degrees of LOS
 #   this is the most sensible total range from one end to when the MD starts
 #   getting antsy and asking if anyone is going to rewind
 los_int = 1.5
-los_angle = np.arange(oleg.rof[0], oleg.rof[-1]-los_int, -los_int)
-
-# WARNING WARNING WARNING
-# This is just awfully lazy, but np.interp expects monotonically increasing x
-#  and we've got decreasing angles on this leg, so just fit it backwards
-los_times = np.interp(los_angle[::-1], oleg.rof[::-1], oleg.elapsedtime[::-1])
-los_times = los_times[::-1][1:]
-# WARNING WARNING WARNING
-
-print("\nObserving interval between LOS rewinds (mins):")
-plt.plot(np.array(oleg.elapsedtime)/60., oleg.rof)
-i = 0
-for each in los_times:
-    plt.axhline(los_angle[i], color='grey', linewidth=1, linestyle=':')
-    plt.axvline(each/60., color='r', linewidth=1, linestyle=":")
-    if i == 0:
-        print("%04.2f" % (each/60.))
-    else:
-        print("%04.2f" % ((each - los_times[i-1])/60.))
-    i += 1
-plt.show()
+
+rewindcols = ['flight', 'hash', 'legno', 'target', 'rewind', 'reltime',
+              'utc', 'legtime', 'interval', 'rof', 'direction']
+rewinddtypes = [str, str, int, str, int, float, str, float, float, float,
+                int]
+
+
+def rewindTimes(reltime, rof, los_int=los_int):
+    """
+    Given the waypoint times (seconds) and planned ROF (degrees) of a leg,
+    return the times at which the ROF has moved los_int degrees from where
+    it was at the start of the leg or the last rewind, along with the
+    ROF at each of those times and which way it was going (+1/-1).
+
+    The ROF is taken to change linearly between waypoints, so the times
+    are exact crossings rather than the nearest waypoint.  ROF can be
+    increasing, decreasing, or change direction partway through.
+    """
+    reltime = np.asarray(reltime, dtype=np.float64)
+    rof = np.asarray(rof, dtype=np.float64)
+    good = np.isfinite(rof)
+    reltime, rof = reltime[good], rof[good]
+
+    times, rofs, directions = [], [], []
+    if rof.size < 2:
+        return np.array(times), np.array(rofs), np.array(directions, dtype=int)
+
+    # Take care of the wrap at 0/360 so the rotation is continuous
+    rof = np.degrees(np.unwrap(np.radians(rof)))
+
+    refrof = rof[0]
+    i = 0
+    while True:
+        # First waypoint after i that's los_int or more from the last rewind
+        hits = np.flatnonzero(np.abs(rof[i+1:] - refrof) >= los_int)
+        if hits.size == 0:
+            break
+        j = i + 1 + hits[0]
+        direction = int(np.sign(rof[j] - refrof))
+        refrof += direction*los_int
+
+        # Crossing point within the segment from j-1 to j
+        frac = (refrof - rof[j-1])/(rof[j] - rof[j-1])
+        times.append(reltime[j-1] + frac*(reltime[j] - reltime[j-1]))
+        rofs.append(refrof % 360.)
+        directions.append(direction)
+        i = j - 1
+
+    return np.array(times), np.array(rofs), np.array(directions, dtype=int)
+
+
+def legRewinds(leg, los_int=los_int):
+    """
+    Given a leg, return rewindTimes for its planned ROF
+    """
+    return rewindTimes(leg.relative_time, leg.rof, los_int=los_int)
+
+
+def rewindSchedule(flights, los_int=los_int, legtypes=['Observing']):
+    """
+    Given a dict of parsed flight classes (keyed by hash, just like in
+    seriesreview.flights) or just a list of them, return a table of LOS
+    rewinds for every observing leg of every flight, in time order within
+    each flight.
+
+    Columns are the flight filename and hash, leg number and target, the
+    rewind number within the leg, the time since takeoff (s) and UTC of the
+    rewind, the time since the start of the leg and since the previous
+    rewind (min), the ROF at the rewind and its direction (+1/-1).
+    """
+    if isinstance(flights, dict):
+        flights = list(flights.values())
+
+    rows = []
+    for flight in flights:
+        for leg in flight.legs:
+            if leg.legtype not in legtypes:
+                continue
+            # Can't need a rewind if the ROF never spans los_int; across
+            #   the 0/360 wrap the span looks huge, so those still get done
+            rofmin, rofmax, rofmean = leg.stats.rof
+            if rofmax - rofmin < los_int:
+                continue
+            times, rofs, directions = legRewinds(leg, los_int=los_int)
+            if times.size == 0:
+                continue
+            legstart = float(leg.relative_time[0])
+            intervals = np.diff(np.append(legstart, times))/60.
+            for k in range(times.size):
+                utc = flight.takeoff + \
+                    np.timedelta64(int(round(times[k])), 's').item()
+                rows.append((flight.filename, flight.hash, leg.legno,
+                             leg.target, k+1, times[k], utc.isoformat(),
+                             (times[k] - legstart)/60., intervals[k],
+                             rofs[k], directions[k]))
+
+    if rows == []:
+        return Table(names=rewindcols, dtype=rewinddtypes)
+
+    return Table(rows=rows, names=rewindcols)
+
+
+def nextRewind(schedule, reltime):
+    """
+    Given a rewindSchedule table for a single flight and the time since
+    takeoff (s), return the row of the next rewind coming up, or None if
+    there aren't any more
+    """
+    k = np.searchsorted(schedule['reltime'], reltime, side='right')
+    if k >= len(schedule):
+        return None
+
+    return schedule[k]
+
+
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    #infile = '/SalusaSecundus/rhamilton/Research/HAWC/201705/Flights/WXed/02_201705_HA_EAMES_WX12.mis'
+    infile = '/Users/rhamilton/Research/HAWC/201705/Flights/WXed/02_201705_HA_EAMES_WX12.mis'
+
+    # Read the .mis into a helpful class
+    flight = parseMIS(infile, summarize=True)
+    oleg = flight.legs[6]
+    print(oleg.summarize())
+
+    schedule = rewindSchedule([flight], los_int=los_int)
+    legsched = schedule[schedule['legno'] == oleg.legno]
+
+    print("\nObserving interval between LOS rewinds (mins):")
+    plt.plot(np.array(oleg.elapsedtime)/60., oleg.rof)
+    legstart = oleg.relative_time[0] - oleg.elapsedtime[0]
+    for row in legsched:
+        plt.axhline(row['rof'], color='grey', linewidth=1, linestyle=':')
+        plt.axvline((row['reltime'] - legstart)/60., color='r', linewidth=1,
+                    linestyle=":")
+        print("%04.2f" % (row['interval']))
+    plt.show()
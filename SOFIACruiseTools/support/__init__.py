@@ -3,3 +3,14 @@ from __future__ import absolute_import, division, print_function
 from .MISparse import *
 from .autoreview import *
 from .summaries import *
+from .snapshots import *
+from .AORcatalog import *
+from .tablewriter import *
+from .cheatsheets import *
+from .validation import *
+from .ROFHelper import *
+from .timeindex import *
+from .drift import *
+from .looptimers import *
+from .dialects import *
+from .columnar import *
@@ -6,7 +6,8 @@ Created on Tue Aug 29 11:37:09 2017
 @author: rhamilton
 """
 
-import numpy as np
+import multiprocessing
+
 from .MISparse import flightcomments, commentinator
 
 
@@ -21,6 +22,9 @@ def autoReview(flight, clear=True):
         - Fast rotation
         - Fast heading changes
         - Combination of those last two
+
+    Every check goes off the leg's cached ranges and rates
+    (legprofile.stats), so any single waypoint past a threshold counts.
     """
     if clear is True:
         comments = flightcomments()
@@ -31,15 +35,18 @@ def autoReview(flight, clear=True):
         if leg.legtype == 'Observing':
             basetag = "* Leg %02i: " % (leg.legno)
             
-            if np.where(np.array(leg.sunelev) >= -5) != np.array([]):
+            # Ranges and rates are computed once per leg and cached there
+            lstats = leg.stats
+
+            if lstats.sunelev[1] >= -5:
                 comments = commentinator(comments, 'error', basetag,
                                                "Uh, it's daytime")
                                 
-            if np.where(np.array(leg.elev) <= 23) != np.array([]):
+            if lstats.elev[0] <= 23:
                 comments = commentinator(comments, 'warning', basetag,
                                                "Low target elevations")
 
-            elif np.where(np.array(leg.elev) >= 57) != np.array([]):
+            elif lstats.elev[1] >= 57:
                 comments = commentinator(comments, 'warning', basetag,
                                                "High target elevations")
             
@@ -58,9 +65,9 @@ def autoReview(flight, clear=True):
                 comments = commentinator(comments, 'warning', basetag,
                                                "Close moon (< 20 degrees)")
             
-            # Need the [1:] because the first ROF rate is always N/A
-            if np.where(np.array(leg.rofrt[1:]) < -0.2) != np.array([]):
-                if np.where(np.array(leg.rofrt[1:]) < -0.325) != np.array([]):
+            # The first ROF rate is always N/A, but the stats ignore NaNs
+            if lstats.rofrt[0] < -0.2:
+                if lstats.rofrt[0] < -0.325:
                     comments = commentinator(comments, 'warning', 
                                                    basetag,
                                                    "Fast negative rotator")
@@ -69,8 +76,8 @@ def autoReview(flight, clear=True):
                                                    basetag,
                                                    "Moderate negative rotator")
                             
-            if np.where(np.array(leg.rofrt[1:]) > 0.2) != np.array([]):
-                if np.where(np.array(leg.rofrt[1:]) > 0.325) != np.array([]):
+            if lstats.rofrt[1] > 0.2:
+                if lstats.rofrt[1] > 0.325:
                     comments = commentinator(comments, 'warning', 
                                                    basetag,
                                                    "Fast positive rotator")
@@ -79,30 +86,62 @@ def autoReview(flight, clear=True):
                                                    basetag,
                                                    "Moderate positive rotator")
 
-            # Check up on the heading changes combined with ROF rates
-            #   degrees/step; not time units yet
-            thr = (np.array(leg.thdg[1:]) - np.array(leg.thdg[:-1]))
-            # Elapsed time is time since start of leg; assuming a sensible
-            #   linear spacing, just take the 2nd step as the interval
-            thr /= leg.elapsedtime[1]/60.
-            
-            comborate = np.array(leg.rofrt[1:]) + thr
-            if np.where(thr >= 0.2) != np.array([]):
+            # Check up on the heading changes combined with ROF rates;
+            #   both are in degrees/minute
+            if lstats.thdgrt[1] >= 0.2:
                 comments = commentinator(comments, 'warning', basetag,
                                                "Fast positive heading changes")
 
-            if np.where(thr <= -0.2) != np.array([]):
+            if lstats.thdgrt[0] <= -0.2:
                 comments = commentinator(comments, 'warning', basetag,
                                                "Fast negative heading changes")
 
-            if np.where(comborate >= 0.325) != np.array([]):
+            if lstats.comborate[1] >= 0.325:
                 ntag = "Fast combined positive (ROF + THdg) rotator"
                 comments = commentinator(comments, 'warning', 
                                                basetag, ntag)
                 
-            if np.where(comborate <= -0.325) != np.array([]):
+            if lstats.comborate[0] <= -0.325:
                 ntag = "Fast combined negative (ROF + THdg) rotator"
                 comments = commentinator(comments, 'warning', 
                                                basetag, ntag)
     
     return comments
+
+
+def reviewHashedFlight(hashedflight):
+    """
+    Helper for autoReviewSeries; takes a (hash, flight) tuple so it can be
+    handed to worker processes, and gives back (hash, comments).
+    """
+    fhash, flight = hashedflight
+    return fhash, autoReview(flight)
+
+
+def autoReviewSeries(flights, processes=None):
+    """
+    Given a dict of parsed flight classes (keyed by hash, just like in
+    seriesreview.flights), auto review all of them.
+
+    This is a generator; it yields (hash, comments) tuples as each review
+    finishes, so results can be used as they come in.  By default they're
+    done one after another, in order, since each review is quick and
+    shipping the flights off to other processes costs more than it saves;
+    a pool of that many worker processes is only used if processes is
+    given (and more than 1), and only from headless code since forking
+    from a GUI thread isn't safe.
+    """
+    hashedflights = list(flights.items())
+
+    if processes is None or processes < 2 or len(hashedflights) < 2:
+        for each in hashedflights:
+            yield reviewHashedFlight(each)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for result in pool.imap_unordered(reviewHashedFlight,
+                                              hashedflights):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 02:15:37 2026
+
+Processing whole directories of flight plans (.mis) and AOR files (.aor)
+without any of the GUIs, e.g. a deployment's worth overnight on a server.
+
+Each file is parsed, and flight plans are auto reviewed (and optionally
+validated against recomputed elevations/ROFs) and summarized, across a
+pool of worker processes.  Everything that comes back from a worker is a
+plain dict of JSON friendly values, so the results can go straight out
+to a JSON file or be flattened into a CSV with one row per file.
+
+Run it via CruiseBatch.py at the top of the repository, or call
+processFiles directly.
+"""
+
+from __future__ import division, print_function
+
+import os
+import sys
+import json
+import fnmatch
+import argparse
+import multiprocessing
+from timeit import default_timer
+
+from .MISparse import parseMIS, diagnosticComments, computeHash
+from .AORinator import parseAOR
+from .autoreview import autoReview
+from .validation import validateFlight, validationComments
+from .tablewriter import renderTable
+
+
+# File extension -> kind of file, which decides what's done with it
+filekinds = {'.mis': 'mis', '.aor': 'aor'}
+
+# Columns of the CSV output, one row per file
+csvcols = ['file', 'kind', 'status', 'hash', 'name', 'start', 'items',
+           'notes', 'warnings', 'errors', 'diagnostics', 'seconds',
+           'reason']
+
+
+def findInputs(paths, recursive=False, kinds=filekinds):
+    """
+    Given a list of files and/or directories, return the sorted list of
+    all the files with one of the given extensions.  Files given
+    explicitly are always kept; directories are searched (and every
+    directory below them too, if recursive is True).
+    """
+    patterns = ['*' + ext for ext in kinds.keys()]
+    infiles = []
+    for path in paths:
+        if os.path.isdir(path) is False:
+            infiles.append(path)
+            continue
+        for root, dirnames, filenames in os.walk(path):
+            for pattern in patterns:
+                for filename in fnmatch.filter(filenames, pattern):
+                    infiles.append(os.path.join(root, filename))
+            if recursive is False:
+                break
+
+    return sorted(set(infiles))
+
+
+def copyComments(comments, result):
+    """
+    Copy a flightcomments into the result dict
+    """
+    result['notes'] = comments.notes
+    result['warnings'] = comments.warnings
+    result['errors'] = comments.errors
+    result['tips'] = comments.tips
+
+    return result
+
+
+def isoTime(dt):
+    """
+    ISO string of a datetime, or '' if it was never set
+    """
+    try:
+        return dt.isoformat()
+    except AttributeError:
+        return ''
+
+
+def tdSeconds(td):
+    """
+    Seconds of a timedelta, or None if it was never set
+    """
+    try:
+        return td.total_seconds()
+    except AttributeError:
+        return None
+
+
+def flightResult(flight, validate=False):
+    """
+    Given a (resiliently) parsed flight class, auto review and summarize
+    it and return everything as a dict
+    """
+    comments = autoReview(flight)
+    comments = diagnosticComments(flight, comments)
+    if validate is True:
+        comments = validationComments(validateFlight(flight), comments)
+
+    legs = []
+    # Observing time (s) per obsplan
+    obsplans = {}
+    for leg in flight.legs:
+        legs.append({'legno': leg.legno,
+                     'legtype': leg.legtype,
+                     'target': leg.target,
+                     'start': str(leg.start),
+                     'duration': tdSeconds(leg.duration),
+                     'obsdur': tdSeconds(leg.obsdur),
+                     'altitude': str(leg.altitude),
+                     'obsplan': leg.obsplan,
+                     'obsblk': leg.obsblk,
+                     'ra': leg.ra,
+                     'dec': leg.dec})
+        if leg.legtype == 'Observing' and legs[-1]['obsdur'] is not None:
+            obsplans[leg.obsplan] = obsplans.get(leg.obsplan, 0.) + \
+                legs[-1]['obsdur']
+
+    result = {'hash': flight.hash,
+              'name': flight.filename,
+              'start': isoTime(flight.takeoff),
+              'items': len(flight.legs),
+              'dialect': flight.dialect,
+              'origin': flight.origin,
+              'destination': flight.destination,
+              'takeoff': isoTime(flight.takeoff),
+              'landing': isoTime(flight.landing),
+              'flighttime': tdSeconds(flight.flighttime),
+              'obstime': tdSeconds(flight.obstime),
+              'instrument': flight.instrument,
+              'summary': flight.summarize(),
+              'obsplans': obsplans,
+              'legs': legs,
+              'diagnostics': [list(each) for each in flight.diagnostics],
+              'anomalies': [list(each) for each in flight.anomalies]}
+
+    return copyComments(comments, result)
+
+
+def aorResult(aor):
+    """
+    Given a parsed AOR class, return its proposal info and observations
+    as a dict
+    """
+    observations = []
+    for aorid in sorted(aor.observations.keys()):
+        obs = aor.observations[aorid]
+        observations.append({'aorid': aorid,
+                             'target': obs.target,
+                             'instrument': obs.instrument,
+                             'mode': obs.obsplanmode,
+                             'duration': obs.duration})
+
+    return {'name': aor.propid,
+            'start': '',
+            'items': len(observations),
+            'title': aor.title,
+            'pi': aor.pi,
+            'observations': observations,
+            'diagnostics': []}
+
+
+def processFile(task):
+    """
+    Worker for processFiles; takes a (filename, options) tuple so it can
+    be handed to worker processes, and gives back the result dict.
+
+    Nothing raises out of here; a file that can't be handled comes back
+    with a status of 'failed' and the reason why.
+    """
+    infile, options = task
+    kind = filekinds.get(os.path.splitext(infile)[1].lower())
+    result = {'file': infile, 'kind': kind, 'status': 'ok', 'hash': '',
+              'reason': ''}
+
+    t0 = default_timer()
+    try:
+        if kind == 'mis':
+            flight = parseMIS(infile, resilient=True)
+            result.update(flightResult(flight,
+                                       validate=options.get('validate',
+                                                            False)))
+            if result['diagnostics'] != []:
+                result['status'] = 'partial'
+        elif kind == 'aor':
+            # parseAOR bails out entirely if the file's missing
+            if os.path.isfile(infile) is False:
+                raise IOError("No such file: %s" % (infile))
+            result.update(aorResult(parseAOR(infile)))
+            result['hash'] = computeHash(infile)
+        else:
+            raise ValueError("Don't know what to do with %s" % (infile))
+    except Exception as why:
+        result['status'] = 'failed'
+        result['reason'] = "%s: %s" % (type(why).__name__, why)
+    result['seconds'] = default_timer() - t0
+
+    return result
+
+
+def processFiles(infiles, processes=None, validate=False):
+    """
+    Given a list of .mis and .aor files, process all of them across a
+    pool of worker processes (see processFile).
+
+    This is a generator; it yields the result dicts in the order that
+    they finish, so progress can be shown as they come in.
+    processes defaults to the number of CPUs available.
+    """
+    options = {'validate': validate}
+    tasks = [(infile, options) for infile in infiles]
+
+    # Not worth spinning up a pool for just one file
+    if processes == 1 or len(tasks) < 2:
+        for task in tasks:
+            yield processFile(task)
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            for result in pool.imap_unordered(processFile, tasks):
+                yield result
+        finally:
+            pool.close()
+            pool.join()
+
+
+def resultRow(result):
+    """
+    Flatten a result dict into the values for the csvcols
+    """
+    row = []
+    for col in csvcols:
+        val = result.get(col, '')
+        if isinstance(val, list):
+            val = len(val)
+        elif isinstance(val, float):
+            val = "%.3f" % (val)
+        row.append(val)
+
+    return row
+
+
+def writeResults(results, outfile=None, output=None):
+    """
+    Write the results out to outfile (stdout if None) as either 'json'
+    (everything) or 'csv' (one summary row per file); by default it's
+    decided by the extension of outfile, and JSON if that doesn't help
+    """
+    if output is None:
+        if outfile is not None and \
+                os.path.splitext(outfile)[1].lower() == '.csv':
+            output = 'csv'
+        else:
+            output = 'json'
+    if output not in ['json', 'csv']:
+        raise ValueError("Unknown output type '%s'; expected json or csv"
+                         % (output))
+
+    if outfile is None:
+        f = sys.stdout
+    else:
+        f = open(outfile, 'w')
+    try:
+        if output == 'json':
+            json.dump(results, f, indent=1, sort_keys=True)
+            f.write('\n')
+        else:
+            rows = [resultRow(result) for result in results]
+            columns = [[row[k] for row in rows] for k in range(len(csvcols))]
+            renderTable(csvcols, columns, output='csv', outie=f)
+    finally:
+        if outfile is not None:
+            f.close()
+
+
+def progressLine(n, total, result):
+    """
+    One line of progress for a finished result
+    """
+    line = "[%*d/%d] %-7s %s" % (len(str(total)), n, total,
+                                 result['status'], result['file'])
+    if result['status'] == 'failed':
+        line += " (%s)" % (result['reason'])
+    elif result['kind'] == 'mis':
+        line += " (%d warnings, %d errors)" % (len(result['warnings']),
+                                               len(result['errors']))
+    elif result['kind'] == 'aor':
+        line += " (%d observations)" % (result['items'])
+
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse, review and "
+                                     "summarize SOFIA flight plans (.mis) "
+                                     "and AOR files (.aor) in bulk, without "
+                                     "any of the GUIs.")
+    parser.add_argument('paths', nargs='+',
+                        help="files and/or directories to process")
+    parser.add_argument('-o', '--output', default=None,
+                        help="write the results to this file (.json or "
+                             ".csv) instead of stdout")
+    parser.add_argument('-f', '--format', choices=['json', 'csv'],
+                        default=None, help="output format, if the "
+                        "extension of --output isn't enough")
+    parser.add_argument('-r', '--recursive', action='store_true',
+                        help="search directories below the ones given too")
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help="number of worker processes (default: one "
+                             "per CPU)")
+    parser.add_argument('--validate', action='store_true',
+                        help="also recompute elevations/ROFs and flag "
+                             "planned values that disagree")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="no progress output")
+    args = parser.parse_args(argv)
+
+    infiles = findInputs(args.paths, recursive=args.recursive)
+    if infiles == []:
+        print("No .mis or .aor files found!", file=sys.stderr)
+        return 1
+
+    t0 = default_timer()
+    results = []
+    for result in processFiles(infiles, processes=args.processes,
+                               validate=args.validate):
+        results.append(result)
+        if args.quiet is False:
+            print(progressLine(len(results), len(infiles), result),
+                  file=sys.stderr)
+    results.sort(key=lambda x: x['file'])
+
+    nfailed = len([r for r in results if r['status'] == 'failed'])
+    if args.quiet is False:
+        print("%d files in %.1f s, %d failed" %
+              (len(results), default_timer() - t0, nfailed),
+              file=sys.stderr)
+
+    writeResults(results, args.output, output=args.format)
+
+    return 2 if nfailed > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
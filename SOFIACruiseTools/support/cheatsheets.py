@@ -0,0 +1,648 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 18:20:14 2026
+
+Making the cheat sheets for a whole flight series in one go: a reST sheet
+for each flight (with the per-leg AOR details from its .conf file) plus the
+series overview document.
+
+Each flight plan is parsed at most once, all of the AOR files mentioned in
+the .conf files are loaded once into a shared aorcatalog, and then the
+flights are rendered across a pool of worker processes.  Every document
+is built up in memory and written out in a single write.
+
+Generated documents are made up of sections (the header, the metadata, each
+leg's details, each flight in the series) that start with a reST comment
+recording a digest of the input files that went into them.  When a plan is
+re-issued, only the sections whose inputs changed are rendered again and
+spliced into the existing document; the rest are kept as they were.
+"""
+
+from __future__ import division, print_function
+
+import os
+import io
+import re
+import hashlib
+import getpass
+import datetime
+import multiprocessing
+
+try:
+    import configparser as conf
+except ImportError:
+    import ConfigParser as conf
+
+from .MISparse import parseMIS, parseMISlightly, computeHash
+from .AORcatalog import aorcatalog
+from .AORinator import underliner, groupObservations, iterHAWCGroups, \
+    obsGroupTitle, skippedGroupsNote, hawcAORrenderer
+from .tablewriter import renderTable, flightLegTable
+
+
+def heading(title, char="=", overline=False):
+    """
+    Given a title, return it as a reST section heading
+    """
+    line = underliner(title, char=char)
+    if overline is True:
+        return "%s\n%s\n%s\n" % (line, title, line)
+    else:
+        return "%s\n%s\n" % (title, line)
+
+
+def readLegConfig(infile):
+    """
+    Given a flight plan filename, read the matching .conf file (if there
+    is one) that has the extra details for each leg.
+
+    Returns a dict of leg number -> {'aorfile': filename or None,
+    'aors': list of AOR IDs, 'items': list of (key, value) of everything
+    else in that leg's section}.  AOR filenames are relative to the .conf.
+    """
+    confname = infile[:-4] + '.conf'
+    legconf = {}
+    if os.path.exists(confname) is False:
+        return legconf
+
+    legconfig = conf.ConfigParser()
+    legconfig.read(confname)
+    confdir = os.path.dirname(os.path.abspath(confname))
+    for section in legconfig.sections():
+        if section.startswith("Leg ") is False:
+            continue
+        try:
+            legno = int(section[4:])
+        except ValueError:
+            continue
+
+        ldict = {'aorfile': None, 'aors': [], 'items': []}
+        if legconfig.has_option(section, 'aorfile'):
+            aorfile = legconfig.get(section, 'aorfile')
+            ldict['aorfile'] = os.path.join(confdir, aorfile)
+            legconfig.remove_option(section, 'aorfile')
+        if legconfig.has_option(section, 'aors'):
+            aors = legconfig.get(section, 'aors').split(',')
+            ldict['aors'] = [each.strip() for each in aors]
+            legconfig.remove_option(section, 'aors')
+        ldict['items'] = legconfig.items(section)
+        legconf[legno] = ldict
+
+    return legconf
+
+
+def readNotes(infile):
+    """
+    Given a flight plan filename, return the lines of the supplemental notes
+    (the matching .rst file) if there are any
+    """
+    try:
+        f = open(infile[:-4] + '.rst')
+        flightnotes = f.readlines()
+        f.close()
+    except IOError:
+        flightnotes = []
+
+    return flightnotes
+
+
+def commentTemplate(infile, clobber=False):
+    """
+    Given a flight plan filename, write out a blank supplemental notes
+    file (the matching .rst file) to fill in.  Won't overwrite an existing
+    one unless clobber is True.
+    """
+    flightComFile = infile[:-4] + '.rst'
+    if os.path.exists(flightComFile) is True and clobber is False:
+        print("FATAL ERROR: Output %s exists!" % (flightComFile))
+        return -1
+
+    cf = open(flightComFile, 'w')
+    cf.write(".. note::\n"
+             "    * General statements\n"
+             "\n"
+             ".. warning::\n"
+             "    * Risky observations or caveats\n"
+             "\n"
+             ".. error::\n"
+             "    * Broken observations/must be changed\n"
+             "\n")
+    cf.close()
+
+    return 0
+
+
+def flightMetadata(flight):
+    """
+    Given a flight class, return the plan filename/vintage and the flight
+    summary as a reST bulleted list
+    """
+    txt = "* Plan Filename: %s, Vintage: %s\n" % (flight.filename,
+                                                  flight.saved)
+    # Break at the line breaks so we can bullet each one
+    for line in flight.summarize().split("\n"):
+        txt += "* %s\n" % (line)
+
+    return txt
+
+
+def legDetails(legno, ldict, aors):
+    """
+    Given a leg number, its .conf details, and a dict of AOR filename ->
+    AOR class, return the reST section with the leg details and the tables
+    of the requested AORs grouped by observing mode.
+    """
+    out = io.StringIO()
+    out.write("\n")
+    out.write(heading("Leg %d" % (legno), char="-"))
+    for key, value in ldict['items']:
+        out.write("%s \n  %s\n" % (key.capitalize(), value))
+    out.write("\n")
+
+    if ldict['aorfile'] is not None:
+        aor = aors[ldict['aorfile']]
+        aorids = ldict['aors']
+        if aorids == []:
+            aorids = list(aor.observations.keys())
+        obsgroups = groupObservations([aor.observations[aorid]
+                                       for aorid in aorids])
+        out.write("%s\n" % (aor.summarize()))
+
+        skipped = []
+        for key, key1, key2, group in iterHAWCGroups(obsgroups, skipped):
+            out.write("\n**%s**\n\n" % (obsGroupTitle(key)))
+            hawcAORrenderer(group, key1, key2, output='rst', outie=out)
+        if skipped != []:
+            out.write("\n%s" % (skippedGroupsNote(skipped)))
+
+    return out.getvalue()
+
+
+def flightSheetOrder(flight, role='Team', legconf={}):
+    """
+    Given a parsed flight, return the names of the sections that go into
+    its cheat sheet, in document order
+    """
+    names = ['header', 'metadata']
+    if role == 'Team':
+        names.append('legdetails')
+        names += ["Leg %d" % (leg.legno) for leg in flight.legs
+                  if leg.legno in legconf]
+
+    return names
+
+
+def flightSheetSection(name, flight, infile, title, role='Team', legconf={},
+                       aors={}, stamp=None):
+    """
+    Given a section name (from flightSheetOrder), return the reST text of
+    just that section of the flight's cheat sheet.  Only 'metadata' needs
+    the parsed flight, so flight can be None for the rest.
+    """
+    if name == 'header':
+        if stamp is None:
+            stamp = datetime.datetime.now()
+        txt = heading(title, overline=True) + "\n"
+        txt += "Cheat Sheet generated on %s" % (stamp)
+        txt += " by %s in %s mode \n\n" % (getpass.getuser(), role)
+        if role == 'Team':
+            txt += heading("Flight Path") + "\n"
+            txt += ".. image:: %s\n\n" % (infile[:-4] + ".png")
+        return txt
+    elif name == 'metadata':
+        out = io.StringIO()
+        out.write(heading("Flight Metadata"))
+        out.write("%s\n" % (flightMetadata(flight)))
+        # Note that this will grab the table of JUST the
+        #   takeoff, observing, and landing leg details
+        names, columns = flightLegTable(flight, rates=True)
+        if role == 'Team':
+            renderTable(names, columns, output='rst', outie=out)
+        elif role == 'TO':
+            renderTable(names, columns, output='csv', outie=out)
+        return out.getvalue()
+    elif name == 'legdetails':
+        return "\n" + heading("Leg Specific Details")
+    elif name.startswith("Leg "):
+        legno = int(name[4:])
+        return legDetails(legno, legconf[legno], aors)
+    else:
+        raise ValueError("Unknown cheat sheet section '%s'" % (name))
+
+
+def flightSheetSections(flight, infile, title, role='Team', legconf={},
+                        aors={}, stamp=None):
+    """
+    Given a parsed flight (and its .mis filename), return the cheat sheet
+    for it as a list of (section name, reST text) tuples in document order.
+
+    role is either 'Team' (reST tables, flight path and leg/AOR details) or
+    'TO' (CSV leg table and just the flight metadata).  legconf is from
+    readLegConfig, and aors is a dict of AOR filename -> AOR class for every
+    aorfile mentioned in it.  stamp is when the sheet was generated.
+    """
+    return [(name, flightSheetSection(name, flight, infile, title, role=role,
+                                      legconf=legconf, aors=aors,
+                                      stamp=stamp))
+            for name in flightSheetOrder(flight, role=role, legconf=legconf)]
+
+
+def seriesFlightSection(flight, infile):
+    """
+    Given a parsed flight (and its .mis filename), return its part of the
+    series overview document as reST text.  The "FLIGHT XX" heading is
+    left off since that depends on where it ends up in the series.
+    """
+    out = io.StringIO()
+    out.write(".. image:: %s\n\n" % (infile[:-4] + ".png"))
+    out.write(heading("Flight Information and Summary"))
+    out.write("%s\n" % (flightMetadata(flight)))
+    names, columns = flightLegTable(flight)
+    renderTable(names, columns, output='rst', outie=out)
+    out.write("\n")
+
+    out.write("%s\n" % (heading("Comments")))
+    flightnotes = readNotes(infile)
+    if flightnotes == []:
+        out.write("No supplemental notes\n")
+    else:
+        for com in flightnotes:
+            out.write("%s\n" % (com.rstrip()))
+    out.write("\n")
+
+    return out.getvalue()
+
+
+def seriesHeader(title):
+    """
+    Given the series title, return the top of the series document
+    """
+    txt = heading(title, char="#") + "\n"
+    txt += ".. contents:: Table of Contents\n"
+    txt += "    :depth: 1\n"
+    txt += "    :backlinks: top\n\n"
+
+    return txt
+
+
+def joinSections(sections):
+    return "".join([text for name, text in sections])
+
+
+# Each section of a generated document starts with one of these reST
+#   comments, which records the section name and the digest of everything
+#   that went into it so it can be found and replaced on the next update
+sectionMarker = "\n.. cheatsheet: %s %s\n\n"
+sectionMatcher = re.compile(r"\n\.\. cheatsheet: (.+) ([0-9a-f]{40})\n\n")
+
+
+def inputHash(infile):
+    """
+    Given a filename, return its hash (from computeHash), or '' if
+    there's no such file (i.e. an optional .conf or notes file)
+    """
+    if infile is None or os.path.exists(infile) is False:
+        return ''
+    return computeHash(infile)
+
+
+def sectionDigest(*inputs):
+    """
+    Given the input hashes and any parameters that a section depends on,
+    return a single sha1 digest for the lot of them
+    """
+    return hashlib.sha1("\n".join([str(each) for each in
+                                   inputs]).encode('utf-8')).hexdigest()
+
+
+def joinTrackedSections(sections):
+    """
+    Given a list of (section name, digest, reST text) tuples, return the
+    whole document with the section markers in place
+    """
+    return "".join([sectionMarker % (name, digest) + text
+                    for name, digest, text in sections])
+
+
+def splitTrackedSections(text):
+    """
+    Undo joinTrackedSections; anything before the first marker is dropped
+    """
+    parts = sectionMatcher.split(text)
+    return [(parts[i], parts[i+1], parts[i+2])
+            for i in range(1, len(parts), 3)]
+
+
+def readDocument(outfile):
+    """
+    Read a previously generated document back in, returning its list of
+    (section name, digest, reST text).  Empty if it doesn't exist yet.
+    """
+    if os.path.exists(outfile) is False:
+        return []
+    f = io.open(outfile, 'r', encoding='utf-8')
+    text = f.read()
+    f.close()
+
+    return splitTrackedSections(text)
+
+
+def writeDocument(outfile, text):
+    """
+    Write out a whole document in one go
+    """
+    f = io.open(outfile, 'w', encoding='utf-8')
+    f.write(text)
+    f.close()
+
+
+def flightSheetDigests(infile, title, role='Team', legconf={}, hashes={}):
+    """
+    Given a flight plan and its .conf details, return a dict of section
+    name -> digest for every section that could go into its cheat sheet.
+    hashes is a dict of filename -> inputHash for the .mis, .conf and all
+    of the AOR files in legconf.  Each leg section depends on its AOR file
+    and its own entries in the .conf rather than the whole .conf file.
+
+    The 'legdetails' digest also covers which leg sections follow it, so
+    if it's unchanged the old document's section order is still good.
+    """
+    mishash = hashes[infile]
+    confhash = hashes[infile[:-4] + '.conf']
+    digests = {'header': sectionDigest('header', infile, title, role),
+               'metadata': sectionDigest('metadata', role, mishash)}
+    if role == 'Team':
+        digests['legdetails'] = sectionDigest('legdetails', mishash,
+                                              confhash)
+        # Leg sections only depend on their own part of the .conf
+        for legno, ldict in legconf.items():
+            name = "Leg %d" % (legno)
+            digests[name] = sectionDigest(name, ldict['items'], ldict['aors'],
+                                          ldict['aorfile'],
+                                          hashes.get(ldict['aorfile'], ''))
+
+    return digests
+
+
+def planFlightSheet(infile, title, outfile, role='Team', legconf={}, aors={},
+                    hashes={}, stamp=None):
+    """
+    Given a flight plan and where its cheat sheet goes, compare the section
+    digests against the ones recorded in the existing cheat sheet (if any)
+    and return the task for renderFlight.
+
+    The task's 'stale' is the set of sections that need to be rendered
+    again, and 'order' is the existing section order if it's still good
+    (None if the flight plan has to be parsed to figure it out).
+    """
+    old = readDocument(outfile)
+    olddigests = dict([(name, digest) for name, digest, text in old])
+    digests = flightSheetDigests(infile, title, role=role, legconf=legconf,
+                                 hashes=hashes)
+
+    stale = set([name for name in digests
+                 if olddigests.get(name) != digests[name]])
+    # The header has the timestamp in it, so it's redone on every update
+    if stale != set():
+        stale.add('header')
+
+    order = None
+    if old != []:
+        if role != 'Team' or 'legdetails' not in stale:
+            order = [name for name, digest, text in old]
+
+    # Only hand over the AORs for the leg sections that are actually stale
+    needed = set([legconf[int(name[4:])]['aorfile'] for name in stale
+                  if name.startswith("Leg ")])
+
+    return {'infile': infile,
+            'title': title,
+            'role': role,
+            'outfile': outfile,
+            'legconf': legconf,
+            'aors': dict([(each, aors[each]) for each in needed
+                          if each is not None]),
+            'stamp': stamp,
+            'digests': digests,
+            'stale': stale,
+            'order': order,
+            'old': dict([(name, text) for name, digest, text in old])}
+
+
+def renderFlight(task):
+    """
+    Worker for renderSeries; given a task from planFlightSheet, render just
+    the stale sections of the flight's cheat sheet (and its part of the
+    series document, if task['series'] is True).  The flight plan is only
+    parsed if something actually needs it.
+    """
+    series = task.get('series', False)
+    flight = None
+    if task['order'] is None or 'metadata' in task['stale'] or series:
+        flight = parseMIS(task['infile'])
+
+    order = task['order']
+    if order is None:
+        order = flightSheetOrder(flight, role=task['role'],
+                                 legconf=task['legconf'])
+
+    sheet = {}
+    for name in order:
+        if name in task['stale']:
+            sheet[name] = flightSheetSection(name, flight, task['infile'],
+                                             task['title'], role=task['role'],
+                                             legconf=task['legconf'],
+                                             aors=task['aors'],
+                                             stamp=task['stamp'])
+
+    result = {'infile': task['infile'],
+              'takeoff': None,
+              'order': order,
+              'sheet': sheet,
+              'series': None}
+    if flight is not None:
+        result['takeoff'] = flight.takeoff
+    if series is True:
+        result['series'] = seriesFlightSection(flight, task['infile'])
+
+    return result
+
+
+def finishFlightSheet(task, result):
+    """
+    Splice the freshly rendered sections from renderFlight into the old
+    cheat sheet and write it out, if anything actually changed.
+
+    Returns the list of section names that were rendered again.
+    """
+    sections = []
+    for name in result['order']:
+        if name in result['sheet']:
+            text = result['sheet'][name]
+        else:
+            text = task['old'][name]
+        sections.append((name, task['digests'][name], text))
+
+    if result['sheet'] != {}:
+        writeDocument(task['outfile'], joinTrackedSections(sections))
+
+    return [name for name in result['order'] if name in result['sheet']]
+
+
+def loadInputs(infiles, catalog, processes=None):
+    """
+    Given a list of flight plans, read all of their .conf files and load
+    every AOR file mentioned into the catalog in one batch.
+
+    Returns the dict of flight plan -> readLegConfig, the dict of AOR
+    filename -> AOR class, and the dict of filename -> inputHash for all
+    of the inputs (.mis, .conf, notes and AOR files).
+    """
+    legconfs = {}
+    aorfiles = set()
+    for infile in infiles:
+        legconfs[infile] = readLegConfig(infile)
+        for ldict in legconfs[infile].values():
+            if ldict['aorfile'] is not None:
+                aorfiles.add(ldict['aorfile'])
+    aorfiles = sorted(aorfiles)
+    ahashes = catalog.loadFiles(aorfiles, processes=processes)
+
+    aors = dict(zip(aorfiles, [catalog.aors[ahash] for ahash in ahashes]))
+    hashes = dict(zip(aorfiles, ahashes))
+    for infile in infiles:
+        for each in [infile, infile[:-4] + '.conf', infile[:-4] + '.rst']:
+            hashes[each] = inputHash(each)
+
+    return legconfs, aors, hashes
+
+
+def updateFlightSheet(infile, title, outfile, role='Team', catalog=None):
+    """
+    Make (or bring up to date) the cheat sheet for a single flight plan.
+    Only the sections whose .mis, .conf or AOR files changed since the last
+    time are rendered again and spliced into the existing outfile.
+
+    Returns the list of section names that were rendered again.
+    """
+    if catalog is None:
+        catalog = aorcatalog()
+    legconfs, aors, hashes = loadInputs([infile], catalog, processes=1)
+
+    task = planFlightSheet(infile, title, outfile, role=role,
+                           legconf=legconfs[infile], aors=aors,
+                           hashes=hashes, stamp=datetime.datetime.now())
+    if task['stale'] == set():
+        return []
+
+    return finishFlightSheet(task, renderFlight(task))
+
+
+def sheetFilename(infile, outdir, role='Team'):
+    """
+    Given a flight plan filename, return where its cheat sheet goes
+    """
+    base = os.path.basename(infile)[:-4]
+    return os.path.join(outdir, "%s_%s_CheatSheet.rst" % (base, role))
+
+
+def renderSeries(infiles, title, outdir, seriesfile=None, role='Team',
+                 catalog=None, processes=None, autosort=True):
+    """
+    Given a list of flight plans (.mis) in a series, make the cheat sheet
+    for each one (in outdir) as well as the series overview document
+    (seriesfile, defaulting to series.rst in outdir).
+
+    Existing documents are updated in place; each section records the
+    hashes of the .mis, .conf, notes and AOR files it came from, and only
+    the sections whose inputs have changed are rendered again.
+
+    If an aorcatalog is given, AORs come from (and are added to) it, so
+    repeated calls don't re-parse any AOR files that haven't changed.
+    If autosort is True the series document is in takeoff order, otherwise
+    it's in the order given.  processes defaults to the number of CPUs.
+
+    Returns a dict of flight plan filename -> list of the cheat sheet
+    sections that were rendered again (plus 'series' for the series file).
+    """
+    if catalog is None:
+        catalog = aorcatalog()
+    if seriesfile is None:
+        seriesfile = os.path.join(outdir, 'series.rst')
+    stamp = datetime.datetime.now()
+
+    # Collect all the AOR files first so they're all parsed in one batch
+    legconfs, aors, hashes = loadInputs(infiles, catalog,
+                                        processes=processes)
+
+    oldseries = readDocument(seriesfile)
+    oldlayout = [(name, digest) for name, digest, text in oldseries]
+    oldseries = dict([(name, (digest, text)) for name, digest, text
+                      in oldseries])
+    seriesdigests = {}
+    tasks = []
+    for infile in infiles:
+        task = planFlightSheet(infile, title,
+                               sheetFilename(infile, outdir, role=role),
+                               role=role, legconf=legconfs[infile],
+                               aors=aors, hashes=hashes, stamp=stamp)
+
+        name = os.path.basename(infile)
+        seriesdigests[name] = sectionDigest(name, hashes[infile],
+                                            hashes[infile[:-4] + '.rst'])
+        task['series'] = oldseries.get(name, (None,))[0] != \
+            seriesdigests[name]
+        tasks.append(task)
+
+    # Only bother the workers with flights that have something to do
+    busy = [task for task in tasks
+            if task['stale'] != set() or task['series'] is True]
+    if processes == 1 or len(busy) < 2:
+        results = [renderFlight(task) for task in busy]
+    else:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(renderFlight, busy)
+        finally:
+            pool.close()
+            pool.join()
+    results = dict([(result['infile'], result) for result in results])
+
+    rendered = {}
+    takeoffs = {}
+    for task in tasks:
+        infile = task['infile']
+        result = results.get(infile)
+        rendered[infile] = []
+        if result is not None:
+            rendered[infile] = finishFlightSheet(task, result)
+            takeoffs[infile] = result['takeoff']
+
+    if autosort is True:
+        for infile in infiles:
+            if takeoffs.get(infile) is None:
+                takeoffs[infile] = parseMISlightly(infile)[0].takeoff
+        infiles = sorted(infiles, key=lambda x: takeoffs[x])
+
+    series = [('header', sectionDigest('header', title), seriesHeader(title))]
+    for i, infile in enumerate(infiles):
+        h1 = "FLIGHT %02d" % (i+1)
+        series.append((h1, sectionDigest(h1),
+                       heading(h1, overline=True) + "\n"))
+
+        name = os.path.basename(infile)
+        result = results.get(infile)
+        if result is not None and result['series'] is not None:
+            text = result['series']
+        else:
+            text = oldseries[name][1]
+        series.append((name, seriesdigests[name], text))
+
+    rendered['series'] = [name for name, digest, text in series
+                          if oldseries.get(name, (None,))[0] != digest]
+    # Reordered flights need writing out too, even if nothing else changed
+    layout = [(name, digest) for name, digest, text in series]
+    if rendered['series'] != [] or layout != oldlayout:
+        writeDocument(seriesfile, joinTrackedSections(series))
+
+    return rendered
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 03:04:52 2026
+
+Exporting the waypoints of a whole bunch of flights (a series, or several
+seasons of them) into one columnar file, so that studies across many
+flights can just load the columns they need instead of re-parsing every
+.mis file each time.
+
+The file is an uncompressed .npz style zip archive, just like the
+seriesreview snapshots, with one .npy file per column of three tables:
+    manifest.json              format, version and the column order
+    flights/<column>.npy       one row per flight
+    legs/<column>.npy          one row per leg
+    waypoints/<column>.npy     one row per waypoint, of every leg
+
+Every leg and waypoint row carries the hash of its flight along with the
+row number of that flight in the flights table ('flight'), its leg number
+and its leg type (as an index into legtypes), so rows can be picked out
+directly from the key columns; each leg also knows which waypoint rows
+are its own (wstart:wstop).  Since nothing is compressed, every column
+can be memory mapped straight out of the archive on load and only the
+parts that are actually used are ever read.
+"""
+
+from __future__ import division, print_function
+
+import json
+import zipfile
+
+import numpy as np
+
+from .snapshots import writeArray, readArray, waypointcols
+
+
+columnarformat = 'SOFIACruiseTools.flightcolumns'
+columnarversion = 1
+
+# Leg types, in the order of their codes in the legtype columns
+legtypes = ['', 'Takeoff', 'Observing', 'Other', 'Landing']
+
+
+def legtypeCode(legtype):
+    """
+    Return the code used in the legtype columns for the given leg type
+    """
+    try:
+        return legtypes.index(legtype)
+    except ValueError:
+        raise ValueError("Unknown leg type '%s'; expected one of %s" %
+                         (legtype, legtypes[1:]))
+
+
+def tdSeconds(td):
+    """
+    Given a timedelta (or '' if it was never set), return its seconds
+    """
+    try:
+        return td.total_seconds()
+    except AttributeError:
+        return np.nan
+
+
+def stringColumn(vals):
+    """
+    Fixed width unicode array of the given values, since .npy files that
+    can be memory mapped can't have python objects in them
+    """
+    return np.array([str(val) for val in vals], dtype=np.str_)
+
+
+def flightColumns(flights):
+    """
+    Given a list of parsed flight classes, return the (flights, legs,
+    waypoints) tables as dicts of column name -> array, along with the
+    column order of each
+    """
+    ftab = {'hash': [], 'filename': [], 'instrument': [], 'fancyname': [],
+            'origin': [], 'destination': [], 'takeoff': [], 'landing': [],
+            'flighttime': [], 'obstime': [], 'nlegs': []}
+    ltab = {'hash': [], 'flight': [], 'legno': [], 'legtype': [],
+            'target': [], 'obsplan': [], 'obsblk': [], 'ra': [], 'dec': [],
+            'epoch': [], 'altitude': [], 'start': [], 'duration': [],
+            'obsdur': [], 'wstart': [], 'wstop': []}
+    wkeys = {'hash': [], 'flight': [], 'legno': [], 'legtype': []}
+    wtimes = {'relative_time': [], 'elapsedtime': []}
+    wcols = dict([(col, []) for col in waypointcols])
+
+    nrows = 0
+    for i, flight in enumerate(flights):
+        legs = list(flight.legs)
+        ftab['hash'].append(flight.hash)
+        ftab['filename'].append(flight.filename)
+        ftab['instrument'].append(flight.instrument)
+        ftab['fancyname'].append(flight.fancyname)
+        ftab['origin'].append(flight.origin)
+        ftab['destination'].append(flight.destination)
+        ftab['takeoff'].append(np.datetime64(flight.takeoff, 's'))
+        ftab['landing'].append(np.datetime64(flight.landing, 's'))
+        ftab['flighttime'].append(tdSeconds(flight.flighttime))
+        ftab['obstime'].append(tdSeconds(flight.obstime))
+        ftab['nlegs'].append(len(legs))
+
+        for leg in legs:
+            npts = len(leg.relative_time)
+            code = legtypeCode(leg.legtype)
+
+            ltab['hash'].append(flight.hash)
+            ltab['flight'].append(i)
+            ltab['legno'].append(leg.legno)
+            ltab['legtype'].append(code)
+            for attr in ['target', 'obsplan', 'obsblk', 'ra', 'dec',
+                         'epoch', 'altitude']:
+                ltab[attr].append(getattr(leg, attr))
+            for attr in ['start', 'duration', 'obsdur']:
+                ltab[attr].append(tdSeconds(getattr(leg, attr)))
+            ltab['wstart'].append(nrows)
+            ltab['wstop'].append(nrows + npts)
+            nrows += npts
+
+            wkeys['hash'].append(np.repeat(flight.hash, npts))
+            wkeys['flight'].append(np.repeat(i, npts))
+            wkeys['legno'].append(np.repeat(leg.legno, npts))
+            wkeys['legtype'].append(np.repeat(code, npts))
+            for col in wtimes:
+                wtimes[col].append(np.asarray(getattr(leg, col),
+                                              dtype=np.int64))
+            for col in waypointcols:
+                wcols[col].append(np.asarray(getattr(leg, col),
+                                             dtype=np.float64))
+
+    ftable = {}
+    for col in ['hash', 'filename', 'instrument', 'fancyname', 'origin',
+                'destination']:
+        ftable[col] = stringColumn(ftab[col])
+    ftable['takeoff'] = np.array(ftab['takeoff'], dtype='datetime64[s]')
+    ftable['landing'] = np.array(ftab['landing'], dtype='datetime64[s]')
+    ftable['flighttime'] = np.array(ftab['flighttime'], dtype=np.float64)
+    ftable['obstime'] = np.array(ftab['obstime'], dtype=np.float64)
+    ftable['nlegs'] = np.array(ftab['nlegs'], dtype=np.int32)
+
+    ltable = {}
+    for col in ['hash', 'target', 'obsplan', 'obsblk', 'ra', 'dec',
+                'epoch', 'altitude']:
+        ltable[col] = stringColumn(ltab[col])
+    ltable['flight'] = np.array(ltab['flight'], dtype=np.int32)
+    ltable['legno'] = np.array(ltab['legno'], dtype=np.int16)
+    ltable['legtype'] = np.array(ltab['legtype'], dtype=np.int8)
+    for col in ['start', 'duration', 'obsdur']:
+        ltable[col] = np.array(ltab[col], dtype=np.float64)
+    ltable['wstart'] = np.array(ltab['wstart'], dtype=np.int64)
+    ltable['wstop'] = np.array(ltab['wstop'], dtype=np.int64)
+
+    # The hashes are all the same length, so they can go in as bytes
+    #   and take a quarter of the room
+    wtable = {}
+    dtypes = {'hash': 'S40', 'flight': np.int32, 'legno': np.int16,
+              'legtype': np.int8}
+    for col, parts in list(wkeys.items()) + list(wtimes.items()) + \
+            list(wcols.items()):
+        dtype = dtypes.get(col, np.int64 if col in wtimes else np.float64)
+        if parts == []:
+            wtable[col] = np.zeros(0, dtype=dtype)
+        else:
+            wtable[col] = np.concatenate(parts).astype(dtype)
+
+    forder = list(ftab.keys())
+    lorder = list(ltab.keys())
+    worder = list(wkeys.keys()) + list(wtimes.keys()) + waypointcols
+
+    return (ftable, forder), (ltable, lorder), (wtable, worder)
+
+
+def exportFlights(flights, outfile):
+    """
+    Given a dict of parsed flight classes (keyed by hash, just like in
+    seriesreview.flights) or just a list of them, write all of their legs
+    and waypoints out to a columnar file (see loadFlightColumns)
+    """
+    if isinstance(flights, dict):
+        flights = list(flights.values())
+
+    tables = flightColumns(flights)
+    manifest = {'format': columnarformat,
+                'version': columnarversion,
+                'legtypes': legtypes,
+                'columns': {}}
+
+    zf = zipfile.ZipFile(outfile, 'w', zipfile.ZIP_STORED, allowZip64=True)
+    try:
+        for name, (table, order) in zip(['flights', 'legs', 'waypoints'],
+                                        tables):
+            manifest['columns'][name] = order
+            for col in order:
+                writeArray(zf, "%s/%s.npy" % (name, col), table[col])
+        zf.writestr('manifest.json', json.dumps(manifest))
+    finally:
+        zf.close()
+
+
+class flightcolumns(object):
+    """
+    The flights, legs and waypoints tables from a columnar file, each a
+    dict of column name -> array.  Columns are only read (or mapped) the
+    first time they're asked for via column().
+    """
+    def __init__(self, infile, manifest, mmap=True):
+        self.infile = infile
+        self.mmap = mmap
+        self.legtypes = manifest['legtypes']
+        self.columns = manifest['columns']
+        self.flights = {}
+        self.legs = {}
+        self.waypoints = {}
+
+    def column(self, table, col):
+        """
+        Return the given column of the given table ('flights', 'legs'
+        or 'waypoints')
+        """
+        loaded = getattr(self, table)
+        if col not in loaded:
+            if col not in self.columns[table]:
+                raise KeyError("No column '%s' in the %s table" %
+                               (col, table))
+            zf = zipfile.ZipFile(self.infile, 'r')
+            try:
+                loaded[col] = readArray(zf, self.infile,
+                                        "%s/%s.npy" % (table, col),
+                                        self.mmap)
+            finally:
+                zf.close()
+
+        return loaded[col]
+
+    def loadAll(self):
+        """
+        Read (or map) every column of every table
+        """
+        for table, order in self.columns.items():
+            for col in order:
+                self.column(table, col)
+
+        return self
+
+    def selectWaypoints(self, legtype=None, hashes=None, legnos=None):
+        """
+        Return a boolean mask of the waypoint rows from legs of the given
+        type (name), from the flights with the given hashes, and/or with
+        the given leg numbers; anything left as None isn't checked
+        """
+        mask = np.ones(len(self.column('waypoints', 'legno')), dtype=bool)
+        if legtype is not None:
+            mask &= self.column('waypoints', 'legtype') == \
+                self.legtypes.index(legtype)
+        if hashes is not None:
+            mask &= np.in1d(self.column('waypoints', 'hash'),
+                            np.array(hashes, dtype='S40'))
+        if legnos is not None:
+            mask &= np.in1d(self.column('waypoints', 'legno'), legnos)
+
+        return mask
+
+    def legWaypoints(self, k, col):
+        """
+        Return the given waypoint column for just the leg at row k of
+        the legs table
+        """
+        a = self.column('legs', 'wstart')[k]
+        b = self.column('legs', 'wstop')[k]
+
+        return self.column('waypoints', col)[a:b]
+
+
+def loadFlightColumns(infile, mmap=True):
+    """
+    Open a columnar file written by exportFlights and return its
+    flightcolumns class.
+
+    If mmap is True, columns are read-only views memory mapped from the
+    file rather than copies in memory.
+    """
+    zf = zipfile.ZipFile(infile, 'r')
+    try:
+        manifest = json.loads(zf.read('manifest.json').decode('utf-8'))
+    finally:
+        zf.close()
+    if manifest.get('format') != columnarformat:
+        raise ValueError("%s isn't a flight columns file!" % (infile))
+    if manifest.get('version', 0) > columnarversion:
+        raise ValueError("Columnar file version %s is newer than this code"
+                         " understands (%d)" % (manifest.get('version'),
+                                                columnarversion))
+
+    return flightcolumns(infile, manifest, mmap=mmap)
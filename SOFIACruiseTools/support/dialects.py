@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Oct 20 00:41:19 2026
+
+The different vintages of .mis files, and how to tell them apart.
+
+The planner's output has shifted around a bit over the years (see the
+parsers in obsolete/fp_helper.py), mostly in where things sit in the
+preamble and what the leg altitude is called.  Each vintage is a
+misdialect in the registry; sniffDialect looks at the top of the file,
+up to and including the first leg header, and picks the first registered
+dialect that claims it.  The dialect then knows exactly which line each
+preamble value is on and what the first line of each leg header looks
+like, so those can be picked straight out rather than searched for.
+
+Anything the dialect doesn't expect makes it raise, and MISparse goes
+back to its general (search everything) way of parsing.
+"""
+
+from __future__ import division, print_function
+
+import re
+from datetime import datetime, timedelta
+
+
+# Preamble values pulled out of the "Key: value" lines, in order:
+#   (layout line name, key, how many words make up the value)
+preamblekeys = [('filename', 'Filename', 1),
+                ('filename', 'Saved', 3),
+                ('airport', 'Airport', 1),
+                ('airport', 'Runway', 1),
+                ('airport', 'Legs', 1),
+                ('airport', 'Mach', 1),
+                ('takeoff', 'Takeoff', 3),
+                ('times', 'Obs Time', 1),
+                ('times', 'Flt Time', 1),
+                ('landing', 'Landing', 3),
+                ('landing', 'Airport', 1),
+                ('sun', 'Sunset', 1),
+                ('sun', 'Sunrise', 1)]
+
+# What each of the layout lines starts with
+layoutkeys = {'filename': 'Filename:', 'fpid': 'Flight Plan ID:',
+              'airport': 'Airport:', 'takeoff': 'Takeoff:',
+              'times': 'Obs Time:', 'landing': 'Landing:', 'sun': 'Sunset:'}
+
+
+def lineValue(line, key, nwords=1):
+    """
+    Given a line and a key on it, return the nwords words following the
+    "key:" joined by spaces; raises ValueError if the key isn't there
+    """
+    loc = line.index(key + ':')
+    words = line[loc + len(key) + 1:].split()[0:nwords]
+    if len(words) != nwords:
+        raise ValueError("Not enough words after '%s' in '%s'" %
+                         (key, line.strip()))
+
+    return ' '.join(words)
+
+
+def hmsDelta(hms):
+    """
+    Given a "HH:MM:SS" string, return it as a timedelta
+    """
+    return timedelta(hours=int(hms[0:2]), minutes=int(hms[3:5]),
+                     seconds=int(hms[6:8]))
+
+
+def utcStamp(stamp):
+    """
+    Given a "YYYY-Mon-DD HH:MM:SS UTC" string, return it as a datetime
+    """
+    return datetime.strptime(stamp, "%Y-%b-%d %H:%M:%S %Z")
+
+
+def numberOrNot(val, dtype):
+    """
+    Same rule as MISparse.keyValuePair; turn it into the dtype if it can
+    be, otherwise leave it as the string it was (e.g. step climbs)
+    """
+    try:
+        return dtype(val)
+    except ValueError:
+        return val
+
+
+class misdialect(object):
+    """
+    One vintage of .mis file.
+
+    layout gives the line number of each line in the preamble (filename,
+    airport, takeoff, times, landing and sun; fpid too if there's a Flight
+    Plan ID line), altkey is what the leg altitude is called, and
+    leghead is a regex for the first line of a leg header with groups for
+    its start, duration and altitude.
+    """
+    def __init__(self, name, description, layout, altkey, since=None):
+        self.name = name
+        self.description = description
+        self.layout = layout
+        self.altkey = altkey
+        self.since = since
+        self.leghead = re.compile("Leg \\d+ \\(.*\\)\\s+Start: (\\S+)\\s+"
+                                  "Leg Dur: (\\S+)\\s+%s: (\\S+)" %
+                                  (re.escape(altkey)))
+
+    def sniff(self, head, saved):
+        """
+        Given the lines from the top of the file down to and including the
+        first leg header (last), and the saved date (or None if it can't be
+        read), return True if this looks like our kind of file
+        """
+        if head[-1].find(' %s: ' % (self.altkey)) == -1:
+            return False
+        if self.since is not None and (saved is None or saved < self.since):
+            return False
+        for name, lno in self.layout.items():
+            if lno >= len(head) or \
+                    head[lno].startswith(layoutkeys[name]) is False:
+                return False
+
+        return True
+
+    def parsePreamble(self, lines, flight):
+        """
+        Fill in the flight class from the preamble lines, going straight
+        to where everything should be.  Raises if anything isn't.
+        """
+        vals = []
+        for name, key, nwords in preamblekeys:
+            vals.append(lineValue(lines[self.layout[name]], key, nwords))
+        (filename, saved, origin, runway, nlegs, mach, takeoff, obstime,
+         flttime, landing, destination, sunset, sunrise) = vals
+
+        flight.filename = filename
+        flight.saved = utcStamp(saved)
+        flight.origin = origin
+        flight.destination = destination
+        flight.drunway = runway
+        flight.nlegs = numberOrNot(nlegs, int)
+        flight.mach = numberOrNot(mach, float)
+        flight.takeoff = utcStamp(takeoff)
+        flight.obstime = hmsDelta(obstime)
+        flight.flighttime = hmsDelta(flttime)
+        flight.landing = utcStamp(landing)
+        # fp doesn't always write the sun stuff
+        try:
+            flight.sunset = hmsDelta(sunset)
+        except ValueError:
+            flight.sunset = "NONE"
+        try:
+            flight.sunrise = hmsDelta(sunrise)
+        except ValueError:
+            flight.sunrise = "NONE"
+
+        if 'fpid' in self.layout:
+            fid = lineValue(lines[self.layout['fpid']],
+                            'Flight Plan ID').split('_')
+            if len(fid) > 1 and fid[1] != '':
+                flight.instrument = flight.instdict.get(fid[1].strip(), '')
+            if len(fid) > 2 and fid[2] != '':
+                flight.fancyname = fid[2]
+
+        return flight
+
+    def parseLegHead(self, line):
+        """
+        Given the first line of a leg header, return its start, duration
+        and altitude; raises if the line isn't what we expect
+        """
+        match = self.leghead.match(line)
+        if match is None:
+            raise ValueError("Leg header doesn't match the %s dialect: %s" %
+                             (self.name, line.strip()))
+        start, dur, alt = match.groups()
+
+        return hmsDelta(start), hmsDelta(dur), numberOrNot(alt, float)
+
+
+# The registry; sniffDialect tries these in order
+dialects = []
+
+
+def registerDialect(dialect, first=False):
+    """
+    Add a dialect to the registry, at the front if first is True so it
+    gets a chance to claim files before any of the others
+    """
+    if first is True:
+        dialects.insert(0, dialect)
+    else:
+        dialects.append(dialect)
+
+    return dialect
+
+
+def getDialect(name):
+    """
+    Return the registered dialect with the given name, or None
+    """
+    for dialect in dialects:
+        if dialect.name == name:
+            return dialect
+    return None
+
+
+def savedDate(line):
+    """
+    Given the first line of a .mis file, return the date it was saved or
+    None if it can't be found
+    """
+    try:
+        return utcStamp(lineValue(line, 'Saved', 3))
+    except ValueError:
+        return None
+
+
+def sniffDialect(lines, leghead=None):
+    """
+    Given the lines of a .mis file (via readlines()) and the line number
+    of the first leg header if it's already known, return the first
+    registered dialect that claims it, or None if none of them do
+    """
+    if leghead is None:
+        for i, line in enumerate(lines):
+            if line.startswith('Leg '):
+                leghead = i
+                break
+    if leghead is None or leghead == 0:
+        return None
+
+    head = lines[0:leghead + 1]
+    saved = savedDate(head[0])
+    for dialect in dialects:
+        if dialect.sniff(head, saved) is True:
+            return dialect
+
+    return None
+
+
+# Ordered newest to oldest; the dates come from when fp_helper's parsers
+#   were written for each of them, and are only used to split vintages
+#   that otherwise look the same.
+_basic = {'filename': 0, 'airport': 4, 'takeoff': 5, 'times': 6,
+          'landing': 7, 'sun': 8}
+_withid = {'filename': 0, 'fpid': 4, 'airport': 5, 'takeoff': 6,
+           'times': 7, 'landing': 8, 'sun': 9}
+
+registerDialect(misdialect('cycle5', "Cycle 5 (2017) and later; has a "
+                           "Flight Plan ID and calls it 'Alt.'",
+                           _withid, 'Alt.'))
+registerDialect(misdialect('cycle4id', "2016 with a Flight Plan ID and "
+                           "'Req. Alt'", _withid, 'Req. Alt',
+                           since=datetime(2016, 3, 1)))
+registerDialect(misdialect('cycle4', "March 2016 onwards (fp_helper's "
+                           "parse_fpmis_new_new); NAIF ID lines show up",
+                           _basic, 'Req. Alt', since=datetime(2016, 3, 1)))
+registerDialect(misdialect('cycle3', "February 2015 to March 2016 "
+                           "(fp_helper's parse_fpmis_new)", _basic,
+                           'Req. Alt', since=datetime(2015, 2, 1)))
+registerDialect(misdialect('legacy', "Before February 2015 (fp_helper's "
+                           "parse_fpmis_old); one more line before the "
+                           "airport", {'filename': 0, 'airport': 5,
+                                       'takeoff': 6, 'times': 7,
+                                       'landing': 8, 'sun': 9},
+                           'Req. Alt'))
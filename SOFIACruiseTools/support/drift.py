@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 23:26:08 2026
+
+Keeping track of how far behind (or ahead of) the flight plan we are.
+
+Marks come in as they happen (takeoff, on heading, on target, turning off
+target, landing), each one is compared against when the plan says it
+should have happened, and that's the schedule slip.  In between marks,
+if the next milestone is overdue the slip keeps growing until it's
+marked.  Everything needed for the next milestone is worked out when a
+mark comes in, so each tick is a constant amount of work no matter how
+long the flight or the log is.
+
+Marks don't need to be told which leg they're for; that's worked out
+from the log (a leg's marks come in order, and legs only go forward)
+along with whichever leg's milestone is closest to when the mark was
+expected, given the slip so far.  That way marks still land on the right
+leg even if the plan's timeline has stalled waiting on an overdue one.
+"""
+
+from __future__ import division, print_function
+
+from datetime import timedelta
+
+from .timeindex import plannedLegStarts
+
+
+class driftmark(object):
+    """
+    One mark: what happened, to which leg (position in flight.legs, or -1
+    for takeoff/landing), when it actually happened (UTC), when the plan
+    said it would (seconds since planned takeoff), and the slip (seconds).
+    """
+    def __init__(self, kind, legindex, when, planned, slip):
+        self.kind = kind
+        self.legindex = legindex
+        self.when = when
+        self.planned = planned
+        self.slip = slip
+
+
+class drifttracker(object):
+    """
+    Running schedule slip for one flight.  Positive slip means behind.
+
+    Call the mark methods as things happen and tick() on every clock
+    update; the slip, liveslip, plantime and projected landing attributes
+    are then current as of that tick.
+    """
+    def __init__(self, flight):
+        self.takeoff = flight.takeoff
+        self.landing = flight.landing
+        self.legstarts = plannedLegStarts(flight)
+        self.legends = []
+        self.ontargets = []
+        for start, leg in zip(self.legstarts, flight.legs):
+            duration = leg.duration.total_seconds()
+            self.legends.append(start + duration)
+            # Any setup time comes before the observing part of the leg
+            setup = duration - leg.obsdur.total_seconds()
+            self.ontargets.append(start + max(setup, 0.))
+        self.plannedlanding = (self.landing - self.takeoff).total_seconds()
+
+        self.marks = []
+        # The most recent mark that was for a leg, as (kind, legindex)
+        self.lastleg = None
+        # Per-leg slip at each leg start, by position in flight.legs
+        self.legslips = {}
+
+        # Slip as of the last mark, and what's supposed to happen next
+        #   (seconds since planned takeoff) so ticks don't have to go look
+        self.slip = 0.
+        self.nextplanned = None
+        self.started = False
+
+        self.liveslip = 0.
+        self.plantime = 0.
+        self.projectedlanding = self.landing
+
+    def mark(self, kind, when, planned, legindex=-1, nextplanned=None):
+        """
+        Record a mark that happened at when (naive UTC datetime) which the
+        plan had at planned seconds since takeoff, and what's due next
+        """
+        elapsed = (when - self.takeoff).total_seconds()
+        self.slip = elapsed - planned
+        self.nextplanned = nextplanned
+        self.marks.append(driftmark(kind, legindex, when, planned, self.slip))
+        if legindex >= 0:
+            self.lastleg = (kind, legindex)
+        self.tick(when)
+
+        return self.slip
+
+    def legFor(self, kind, when):
+        """
+        Work out which leg (position in flight.legs) a mark of the given
+        kind ('legstart', 'ontarget' or 'legend') at when is for.  It's
+        the one whose milestone is closest to where we are in the plan,
+        going by the slip as of the last mark, but never a leg before the
+        last one marked or a milestone of it that's already been marked.
+        """
+        milestones = {'legstart': self.legstarts,
+                      'ontarget': self.ontargets,
+                      'legend': self.legends}[kind]
+        if milestones == []:
+            return -1
+
+        order = ['legstart', 'ontarget', 'legend']
+        first = 0
+        if self.lastleg is not None:
+            lastkind, lastindex = self.lastleg
+            if order.index(lastkind) < order.index(kind):
+                first = lastindex
+            else:
+                first = lastindex + 1
+        first = min(first, len(milestones) - 1)
+
+        plantime = (when - self.takeoff).total_seconds() - self.slip
+        return min(range(first, len(milestones)),
+                   key=lambda i: abs(milestones[i] - plantime))
+
+    def markTakeoff(self, when):
+        self.started = True
+        return self.mark('takeoff', when, 0., nextplanned=self.legends[0]
+                         if self.legends != [] else None)
+
+    def markLegStart(self, when, legindex=None):
+        """
+        On heading at the start of the leg at legindex (worked out from
+        the log if None)
+        """
+        if legindex is None:
+            legindex = self.legFor('legstart', when)
+        slip = self.mark('legstart', when, self.legstarts[legindex],
+                         legindex=legindex,
+                         nextplanned=self.ontargets[legindex])
+        self.legslips[legindex] = slip
+        return slip
+
+    def markOnTarget(self, when, legindex=None):
+        """
+        On target, so the setup part of the leg at legindex is done
+        """
+        if legindex is None:
+            legindex = self.legFor('ontarget', when)
+        return self.mark('ontarget', when, self.ontargets[legindex],
+                         legindex=legindex,
+                         nextplanned=self.legends[legindex])
+
+    def markLegEnd(self, when, legindex=None):
+        """
+        Turning off target at the end of the leg at legindex, which is
+        also the start of the next one
+        """
+        if legindex is None:
+            legindex = self.legFor('legend', when)
+        if legindex + 1 < len(self.legstarts):
+            nextplanned = self.legends[legindex + 1]
+        else:
+            nextplanned = self.plannedlanding
+        return self.mark('legend', when, self.legends[legindex],
+                         legindex=legindex, nextplanned=nextplanned)
+
+    def markLanding(self, when):
+        return self.mark('landing', when, self.plannedlanding)
+
+    def tick(self, now):
+        """
+        Bring the live slip, plan time and projected landing up to the
+        given time (naive UTC datetime).  If the next milestone is overdue,
+        the slip grows by however late it is.
+        """
+        elapsed = (now - self.takeoff).total_seconds()
+        self.liveslip = self.slip
+        if self.nextplanned is not None:
+            overdue = elapsed - (self.nextplanned + self.slip)
+            if overdue > 0:
+                self.liveslip += overdue
+
+        # Where we are in the plan's timeline, allowing for the slip
+        self.plantime = elapsed - self.liveslip
+        self.projectedlanding = self.landing + \
+            timedelta(seconds=self.liveslip)
+
+        return self.liveslip
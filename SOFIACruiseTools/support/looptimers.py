@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 23:58:41 2026
+
+Keeping an eye on how long the things in the Director's GUI loop take.
+
+Each named timer keeps the last so many durations in a ring buffer so the
+percentiles always describe recent behavior (i.e. now that the datalog is
+big) rather than the whole night, while the call count, total and max
+cover everything since the start.  Adding a sample is just an append, so
+it's fine to leave on all the time.
+"""
+
+from __future__ import division, print_function
+
+import collections
+from datetime import datetime
+from timeit import default_timer
+
+import numpy as np
+
+
+# Number of recent durations each timer keeps for its percentiles
+window = 1000
+
+# Percentiles reported, in percent
+pcts = [50, 90, 99]
+
+
+class rollingtimer(object):
+    """
+    Durations (seconds) for one thing being timed; the last window of them
+    for the percentiles, plus running totals over everything
+    """
+    def __init__(self, name, window=window):
+        self.name = name
+        self.samples = collections.deque(maxlen=window)
+        self.calls = 0
+        self.total = 0.
+        self.max = 0.
+        self.last = 0.
+
+    def add(self, duration):
+        self.samples.append(duration)
+        self.calls += 1
+        self.total += duration
+        self.last = duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentiles(self, pcts=pcts):
+        """
+        Return the given percentiles (seconds) of the recent durations,
+        or NaNs if there aren't any yet
+        """
+        if len(self.samples) == 0:
+            return [np.nan for each in pcts]
+        return list(np.percentile(np.fromiter(self.samples, dtype=float,
+                                              count=len(self.samples)),
+                                  pcts))
+
+
+class _timedblock(object):
+    """
+    Adds the time spent inside the with block to the given rollingtimer
+    """
+    def __init__(self, timer):
+        self.timer = timer
+
+    def __enter__(self):
+        self.t0 = default_timer()
+        return self
+
+    def __exit__(self, *args):
+        self.timer.add(default_timer() - self.t0)
+        return False
+
+
+class looptimers(object):
+    """
+    A collection of rollingtimers, keyed by name and made as needed
+    """
+    def __init__(self, window=window):
+        self.window = window
+        self.timers = collections.OrderedDict()
+        self.started = datetime.utcnow()
+
+    def timer(self, name):
+        if name not in self.timers:
+            self.timers[name] = rollingtimer(name, window=self.window)
+        return self.timers[name]
+
+    def add(self, name, duration):
+        self.timer(name).add(duration)
+
+    def time(self, name):
+        """
+        Context manager that times its block under the given name
+        """
+        return _timedblock(self.timer(name))
+
+    def wrap(self, name, func):
+        """
+        Return func wrapped so each call is timed under the given name
+        """
+        timer = self.timer(name)
+
+        def timed(*args, **kwargs):
+            with _timedblock(timer):
+                return func(*args, **kwargs)
+        timed.__name__ = getattr(func, '__name__', name)
+        timed.__doc__ = getattr(func, '__doc__', None)
+
+        return timed
+
+    def report(self, pcts=pcts):
+        """
+        Return a little text table of every timer, times in milliseconds
+        """
+        lines = ["Since %s UTC (percentiles over the last %i)" %
+                 (self.started.strftime('%Y-%m-%d %H:%M:%S'), self.window)]
+        pheads = ''.join([" %8s" % ("p%i" % (p)) for p in pcts])
+        lines.append("%-14s %8s %8s%s %8s %8s" % ("Timer", "Calls", "Last",
+                                                 pheads, "Max", "Mean"))
+        for name, timer in self.timers.items():
+            if timer.calls > 0:
+                mean = timer.total/timer.calls
+            else:
+                mean = np.nan
+            pvals = ''.join([" %8.2f" % (p*1000.)
+                             for p in timer.percentiles(pcts)])
+            lines.append("%-14s %8i %8.2f%s %8.2f %8.2f" %
+                         (name, timer.calls, timer.last*1000., pvals,
+                          timer.max*1000., mean*1000.))
+
+        return '\n'.join(lines)
+
+    def dump(self, outfile, samples=False):
+        """
+        Write the report (and optionally every recent sample, in ms) to the
+        given file
+        """
+        f = open(outfile, 'w')
+        f.write("Written %s UTC\n" %
+                (datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')))
+        f.write(self.report() + '\n')
+        if samples is True:
+            for name, timer in self.timers.items():
+                f.write("\n%s:\n" % (name))
+                f.write(' '.join(["%.3f" % (each*1000.)
+                                  for each in timer.samples]) + '\n')
+        f.close()
@@ -3,21 +3,230 @@
 Created on Tue Apr 26 15:01:37 2016
 
 @author: rhamilton
+
+Target elevation, azimuth, parallactic angle (VPA) and rotation of field
+(ROF) along a flight track.
+
+horizonCoords/trackROF do the whole track (and any number of targets) in
+one go with plain numpy: Julian dates, mean sidereal time, precession from
+the target equinox to the date of observation, and then the usual
+spherical trig.  Nutation, aberration and refraction are left out; they're
+all well under the ~0.1 degree that the .mis file reports things to.
+
+checkVPAatTime does a single time/place/target with ephem, and ephemTrack
+does a whole track the same slow way to cross-check the vectorized results.
 """
 
-import ephem
+from __future__ import division, print_function
+
 import datetime
 
+import numpy as np
+from astropy.coordinates import Angle
+
+try:
+    import ephem
+except ImportError:
+    ephem = None
+
+
+# SOFIA mission-type parameters
+airtemp = -50.0     # Decent average flight altitude temperature
+altitude = 12100    # 12100 meters ~= 39700 ft
+horizon = 20        # 20 degrees is lower limit of vignetting
+
+# The aircraft flies a few degrees nose-up, which tilts the field as seen
+#   by the telescope; the planner's ROF is the VPA plus this (see rofFromVPA)
+pitch = 2.5
+
+# Julian date of J2000.0 and the Unix epoch
+jdJ2000 = 2451545.0
+jdUnix = 2440587.5
+
+
+def julianDate(times):
+    """
+    Given a datetime, or a sequence/array of datetimes or numpy datetime64
+    values (all UTC), return the Julian date(s) as float64
+    """
+    times = np.asarray(times, dtype='datetime64[us]')
+    usecs = times.astype(np.int64).astype(np.float64)
+
+    return jdUnix + usecs/86400e6
+
+
+def trackTimes(takeoff, reltimes):
+    """
+    Given the takeoff datetime and the times since takeoff along a track
+    (integer seconds from parseMIS, or timedeltas from interp_flight and
+    flatprofile), return the absolute times as a datetime64 array
+    """
+    if len(reltimes) > 0 and isinstance(reltimes[0], datetime.timedelta):
+        reltimes = [each.total_seconds() for each in reltimes]
+    reltimes = np.round(np.asarray(reltimes, dtype=np.float64)*1e6)
+
+    return np.datetime64(takeoff, 'us') + \
+        reltimes.astype(np.int64).astype('timedelta64[us]')
+
+
+def siderealTime(jd, lon):
+    """
+    Given Julian date(s) and east longitude(s) in degrees, return the local
+    mean sidereal time in degrees (IAU 1982 GMST; UT1 is taken as UTC)
+    """
+    d = np.asarray(jd) - jdJ2000
+    t = d/36525.
+    gmst = 280.46061837 + 360.98564736629*d + \
+        0.000387933*t**2 - t**3/38710000.
+
+    return (gmst + np.asarray(lon)) % 360.
+
+
+def epochToJD(epoch):
+    """
+    Given an equinox like 2000, 'J2000', 'J2000.0' or 'B1950', return its
+    Julian date
+    """
+    if isinstance(epoch, str):
+        epoch = epoch.strip().upper()
+        if epoch.startswith('B'):
+            return 2415020.31352 + (float(epoch[1:]) - 1900.)*365.242198781
+        epoch = epoch.lstrip('J')
+
+    return jdJ2000 + (float(epoch) - 2000.)*365.25
+
+
+def precess(ra, dec, jd0, jd):
+    """
+    Given RA/Dec (degrees) for the equinox at Julian date jd0, return them
+    precessed to the equinox of date jd (IAU 1976 precession, as in Meeus
+    "Astronomical Algorithms" 21.2).  Everything broadcasts.
+    """
+    T = (np.asarray(jd0) - jdJ2000)/36525.
+    t = (np.asarray(jd) - np.asarray(jd0))/36525.
+
+    # These are all in arcseconds
+    w = 2306.2181 + 1.39656*T - 0.000139*T**2
+    zeta = w*t + (0.30188 - 0.000344*T)*t**2 + 0.017998*t**3
+    z = w*t + (1.09468 + 0.000066*T)*t**2 + 0.018203*t**3
+    theta = (2004.3109 - 0.85330*T - 0.000217*T**2)*t - \
+        (0.42665 + 0.000217*T)*t**2 - 0.041833*t**3
+    zeta, z, theta = np.radians(np.array([zeta, z, theta])/3600.)
+
+    ra = np.radians(ra)
+    dec = np.radians(dec)
+    A = np.cos(dec)*np.sin(ra + zeta)
+    B = np.cos(theta)*np.cos(dec)*np.cos(ra + zeta) - \
+        np.sin(theta)*np.sin(dec)
+    C = np.sin(theta)*np.cos(dec)*np.cos(ra + zeta) + \
+        np.cos(theta)*np.sin(dec)
+
+    pra = (np.degrees(np.arctan2(A, B) + z)) % 360.
+    pdec = np.degrees(np.arctan2(C, np.hypot(A, B)))
+
+    return pra, pdec
+
+
+def targetCoords(ra, dec):
+    """
+    Given RA/Dec as strings (like the .mis '02h32m00.00s' '89d16m00.0s',
+    or '02:32:00.0' '89:16:00'), numbers in degrees, or lists of either,
+    return them as float64 arrays in degrees
+    """
+    def toDegrees(val, unit):
+        val = np.atleast_1d(val)
+        if val.dtype.kind in 'fiu':
+            return val.astype(np.float64)
+        return Angle(val, unit=unit).degree
+
+    return toDegrees(ra, 'hourangle'), toDegrees(dec, 'deg')
+
+
+def horizonCoords(times, lat, lon, ra, dec, epoch=2000.):
+    """
+    Given times (datetimes or datetime64), latitudes and east longitudes
+    (degrees) along a track, and a target's RA/Dec in degrees for the given
+    equinox, return the target's elevation, azimuth (east of north) and
+    parallactic angle (VPA) in degrees at every point.
+
+    Everything broadcasts, so for several targets at once pass ra/dec with
+    shape (ntargets, 1) to get back (ntargets, npoints) arrays.
+    """
+    jd = julianDate(times)
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lst = siderealTime(jd, np.asarray(lon, dtype=np.float64))
+
+    ra, dec = precess(ra, dec, epochToJD(epoch), jd)
+    ha = np.radians(lst - ra)
+    dec = np.radians(dec)
+
+    sinel = np.sin(lat)*np.sin(dec) + np.cos(lat)*np.cos(dec)*np.cos(ha)
+    elev = np.degrees(np.arcsin(np.clip(sinel, -1., 1.)))
+    az = np.degrees(np.arctan2(-np.cos(dec)*np.sin(ha),
+                               np.sin(dec)*np.cos(lat) -
+                               np.cos(dec)*np.sin(lat)*np.cos(ha))) % 360.
+    vpa = np.degrees(np.arctan2(np.sin(ha),
+                                np.tan(lat)*np.cos(dec) -
+                                np.sin(dec)*np.cos(ha)))
+
+    return elev, az, vpa
+
+
+def rofFromVPA(vpa, elev, pitch=pitch):
+    """
+    Given the VPA and elevation (degrees), return the ROF in [0, 360).
+    The aircraft's nose-up pitch rotates the field by pitch/cos(elev)
+    on top of the parallactic angle.
+    """
+    return (vpa + pitch/np.cos(np.radians(elev))) % 360.
+
+
+def trackROF(times, lat, lon, ra, dec, epoch=2000., pitch=pitch):
+    """
+    Given a track and a target (see horizonCoords; RA/Dec can also be
+    strings or lists of them, one per target), return the elevation, VPA
+    and ROF arrays in degrees.
+
+    With a list of targets everything comes back as (ntargets, npoints).
+    """
+    ra, dec = targetCoords(ra, dec)
+    if ra.size == 1:
+        ra, dec = ra[0], dec[0]
+    else:
+        ra, dec = ra[:, np.newaxis], dec[:, np.newaxis]
+
+    elev, az, vpa = horizonCoords(times, lat, lon, ra, dec, epoch=epoch)
+
+    return elev, vpa, rofFromVPA(vpa, elev, pitch=pitch)
+
+
+def legROF(flight, leg, pitch=pitch):
+    """
+    Given a flight and one of its (observing) legs, return the elevation,
+    VPA and ROF of the leg's target at each of the leg's waypoints
+    """
+    times = trackTimes(flight.takeoff, leg.relative_time)
+
+    return trackROF(times, leg.lat, leg.long, leg.ra, leg.dec,
+                    epoch=leg.epoch, pitch=pitch)
+
+
+def checkVPAatTime(location, otime, targ, epoch="2000", refraction=True):
+    """
+    Given a [lat, lon] location (strings, degrees), a datetime and a
+    target [ra, dec, pmra, pmdec, name] (ra/dec as sexagesimal strings),
+    return the VPA in degrees as computed by ephem
+
+    Refraction is included (at the standard pressure for SOFIA's
+    altitude) unless refraction is False, which is what horizonCoords
+    does.
+    """
+    if ephem is None:
+        raise ImportError("checkVPAatTime needs ephem (pip install ephem)")
 
-def checkVPAatTime(location, otime, targ):
     # Create an observer at the start location/date/time of SOFIA
     sofia = ephem.Observer()
 
-    # SOFIA mission-type parameters
-    airtemp = -50.0     # Decent average flight altitude temperature
-    altitude = 12100    # 12100 meters ~= 39700 ft
-    horizon = 20        # 20 degrees is lower limit of vignetting
-
     # Pyephem needs string inputs. Annoying, but whatevs.
     sofia.lat = location[0]
     sofia.lon = location[1]
@@ -26,7 +235,10 @@ def checkVPAatTime(location, otime, targ):
     sofia.temp = airtemp
     sofia.date = otime
     sofia.horizon = horizon
-    sofia.compute_pressure()
+    if refraction is True:
+        sofia.compute_pressure()
+    else:
+        sofia.pressure = 0
     sofia.name = "eSOFIA"
 
     targetpos = ephem.FixedBody()
@@ -35,60 +247,96 @@ def checkVPAatTime(location, otime, targ):
     targetpos._pmra = targ[2]
     targetpos._pmdec = targ[3]
     targetpos.name = targ[4]
-    targetpos._epoch = "2000"
+    targetpos._epoch = epoch
 
     targetpos.compute(sofia)
-    print(targetpos._ra, targetpos._dec)
-    print(targetpos.alt, targetpos.az)
     return targetpos.parallactic_angle().real * 180./ephem.pi
 
 
-#============================================================
-moons = ((ephem.Io(), 'i'),
-         (ephem.Europa(), 'e'),
-         (ephem.Ganymede(), 'g'),
-         (ephem.Callisto(), 'c'))
-
-# How to place discrete characters on a line that actually represents
-# the real numbers -maxradii to +maxradii.
-
-linelen = 65
-maxradii = 30.
-
-
-def put(line, character, radii):
-    if abs(radii) > maxradii:
-        return
-    offset = radii / maxradii * (linelen - 1) / 2
-    i = int(linelen / 2 + offset)
-    line[i] = character
-
-interval = ephem.hour * 1
-now = ephem.now()
-now += ephem.hour
-now -= now % interval
-
-t = now
-while t < now + 2:
-    line = [' '] * linelen
-    put(line, 'J', 0)
-    for moon, character in moons:
-        moon.compute(t)
-        put(line, character, moon.x)
-    print(str(ephem.date(t))[5:], ''.join(line).rstrip())
-    t += interval
-
-print('East is to the right;',)
-print(', '.join([ '%s = %s' % (c, m.name) for m, c in moons ]))
-
-# =======
-otime = datetime.datetime(2016, 12, 1, 7, 59, 20)
-targ = ['2:25:40.5999', '62:05:51.590', 0., 0., "W3"]
-lat = '28.927002'
-lon = '-127.8479'
-
-targvpa = checkVPAatTime([lat, lon], otime, targ)
-st = "Target: %s\t\tVPA: %.3lf\tROF: %.3lf" % \
-    (targ[4], targvpa, (targvpa + 360.) % 360.)
-print(st)
-# =======
\ No newline at end of file
+def ephemTrack(times, lat, lon, ra, dec, epoch=2000.):
+    """
+    Slow, point-by-point version of horizonCoords (single target, RA/Dec
+    in degrees) using ephem, for cross-checking.  Returns the elevation,
+    azimuth and VPA arrays in degrees.
+    """
+    if ephem is None:
+        raise ImportError("ephemTrack needs ephem (pip install ephem)")
+
+    times = np.asarray(times, dtype='datetime64[us]').astype(object)
+    # ephem dates are days since JD 2415020 (noon on 1899 December 31)
+    epoch = ephem.Date(epochToJD(epoch) - 2415020.)
+    elev, az, vpa = [], [], []
+    for otime, olat, olon in zip(times, lat, lon):
+        sofia = ephem.Observer()
+        sofia.lat = str(olat)
+        sofia.lon = str(olon)
+        sofia.elevation = altitude
+        sofia.pressure = 0
+        sofia.date = otime
+
+        targetpos = ephem.FixedBody()
+        targetpos._ra = np.radians(ra)
+        targetpos._dec = np.radians(dec)
+        targetpos._epoch = epoch
+        targetpos.compute(sofia)
+
+        elev.append(np.degrees(float(targetpos.alt)))
+        az.append(np.degrees(float(targetpos.az)))
+        vpa.append(np.degrees(float(targetpos.parallactic_angle())))
+
+    return np.array(elev), np.array(az), np.array(vpa)
+
+
+if __name__ == "__main__":
+    #============================================================
+    moons = ((ephem.Io(), 'i'),
+             (ephem.Europa(), 'e'),
+             (ephem.Ganymede(), 'g'),
+             (ephem.Callisto(), 'c'))
+
+    # How to place discrete characters on a line that actually represents
+    # the real numbers -maxradii to +maxradii.
+
+    linelen = 65
+    maxradii = 30.
+
+    def put(line, character, radii):
+        if abs(radii) > maxradii:
+            return
+        offset = radii / maxradii * (linelen - 1) / 2
+        i = int(linelen / 2 + offset)
+        line[i] = character
+
+    interval = ephem.hour * 1
+    now = ephem.now()
+    now += ephem.hour
+    now -= now % interval
+
+    t = now
+    while t < now + 2:
+        line = [' '] * linelen
+        put(line, 'J', 0)
+        for moon, character in moons:
+            moon.compute(t)
+            put(line, character, moon.x)
+        print(str(ephem.date(t))[5:], ''.join(line).rstrip())
+        t += interval
+
+    print('East is to the right;',)
+    print(', '.join(['%s = %s' % (c, m.name) for m, c in moons]))
+
+    # =======
+    otime = datetime.datetime(2016, 12, 1, 7, 59, 20)
+    targ = ['2:25:40.5999', '62:05:51.590', 0., 0., "W3"]
+    lat = '28.927002'
+    lon = '-127.8479'
+
+    targvpa = checkVPAatTime([lat, lon], otime, targ)
+    st = "Target: %s\t\tVPA: %.3lf\tROF: %.3lf" % \
+        (targ[4], targvpa, (targvpa + 360.) % 360.)
+    print(st)
+
+    elev, vpa, rof = trackROF([otime], [float(lat)], [float(lon)],
+                              targ[0].replace(':', ' '),
+                              targ[1].replace(':', ' '))
+    print("Vectorized:\t\tVPA: %.3lf\tROF: %.3lf" % (vpa[0], rof[0]))
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 10:12:31 2026
+
+Saving and restoring a whole seriesreview (flights, comments, reviewer,
+series title) to a single binary snapshot file so it doesn't all have to
+be re-parsed and re-reviewed each time the Reviewer starts up.
+
+The snapshot is an uncompressed .npz style zip archive:
+    manifest.json              everything that isn't a waypoint array
+    <hash>/waypoints.npy       float waypoint columns, one row per column
+    <hash>/times.npy           relative_time and elapsedtime (int seconds)
+    <hash>/lst.npy             LST strings
+    <hash>/comments.npy        waypoint comment strings
+    <hash>/legbounds.npy       where each leg starts/stops in the above
+
+Since nothing is compressed, the arrays can be memory mapped straight out
+of the archive on load rather than read in.
+"""
+
+from __future__ import division, print_function
+
+import io
+import json
+import struct
+import zipfile
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from .MISparse import seriesreview, flightprofile, legprofile, \
+    flightcomments
+
+
+snapshotformat = 'SOFIACruiseTools.seriesreview'
+snapshotversion = 2
+
+# Waypoint columns that are stored in <hash>/waypoints.npy, in row order
+waypointcols = ['mhdg', 'thdg', 'lat', 'long', 'wind_dir', 'wind_speed',
+                'temp', 'elev', 'rof', 'rofrt', 'loswv', 'sunelev']
+
+# Simple (non-waypoint) attributes that go into the manifest
+flightattrs = ['filename', 'filepath', 'hash', 'saved', 'origin',
+               'destination', 'drunway', 'takeoff', 'landing', 'obstime',
+               'flighttime', 'mach', 'sunset', 'sunrise', 'fancyname',
+               'instrument', 'nlegs', 'diagnostics', 'anomalies', 'dialect']
+
+# Flight attributes that are lists of tuples, which json makes into lists
+tupleattrs = ['diagnostics', 'anomalies']
+
+legattrs = ['legno', 'legtype', 'target', 'nonsiderial', 'start',
+            'duration', 'obsdur', 'altitude', 'ra', 'dec', 'epoch',
+            'range_elev', 'range_rof', 'range_rofrt', 'range_rofrtu',
+            'range_thdg', 'range_thdgrt', 'range_thdgrtu', 'moonangle',
+            'moonillum', 'obsplan', 'obsblk', 'nonsid', 'naifid']
+
+commentattrs = ['notes', 'warnings', 'errors', 'tips', 'rating']
+
+
+def jsonEncoder(obj):
+    """
+    Teach json how to deal with the handful of non-JSON things that end
+    up in the flight/leg classes.  jsonDecoder undoes it.
+    """
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    elif isinstance(obj, timedelta):
+        return {'__timedelta__': obj.total_seconds()}
+    elif isinstance(obj, np.generic):
+        return obj.item()
+    elif isinstance(obj, np.ndarray):
+        return obj.tolist()
+    raise TypeError("Can't put %s into a snapshot manifest" % (type(obj)))
+
+
+def jsonDecoder(obj):
+    if '__datetime__' in obj:
+        tstr = obj['__datetime__']
+        if '.' in tstr:
+            return datetime.strptime(tstr, "%Y-%m-%dT%H:%M:%S.%f")
+        else:
+            return datetime.strptime(tstr, "%Y-%m-%dT%H:%M:%S")
+    elif '__timedelta__' in obj:
+        return timedelta(seconds=obj['__timedelta__'])
+    return obj
+
+
+def writeArray(zf, name, arr):
+    """
+    Write a numpy array into the (uncompressed) zip archive as a .npy file
+    """
+    buf = io.BytesIO()
+    np.lib.format.write_array(buf, np.ascontiguousarray(arr),
+                              allow_pickle=False)
+    zf.writestr(name, buf.getvalue(), compress_type=zipfile.ZIP_STORED)
+
+
+def readArray(zf, infile, name, mmap=True):
+    """
+    Read a .npy file back out of the zip archive.  If mmap is True, the
+    array is memory mapped straight from the archive (read-only) instead
+    of being read into memory; this works since nothing was compressed.
+    """
+    info = zf.getinfo(name)
+    if mmap is False or info.compress_type != zipfile.ZIP_STORED:
+        return np.lib.format.read_array(io.BytesIO(zf.read(name)),
+                                        allow_pickle=False)
+
+    with open(infile, 'rb') as f:
+        # The local file header is 30 bytes plus the variable length
+        #   filename and extra field; the .npy file starts right after
+        f.seek(info.header_offset)
+        lhead = f.read(30)
+        nlen, xlen = struct.unpack('<HH', lhead[26:30])
+        f.seek(info.header_offset + 30 + nlen + xlen)
+
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+        offset = f.tell()
+
+    # Zero length things can't be mapped, but they're also free to read
+    if np.prod(shape) == 0:
+        return np.zeros(shape, dtype=dtype)
+
+    order = 'F' if fortran else 'C'
+    return np.memmap(infile, dtype=dtype, mode='r', offset=offset,
+                     shape=shape, order=order)
+
+
+def saveSeries(review, outfile):
+    """
+    Given a seriesreview class, write the whole thing (flights, their legs
+    and waypoints, and all the review comments) into a snapshot file.
+    """
+    manifest = {'format': snapshotformat,
+                'version': snapshotversion,
+                'seriesname': review.seriesname,
+                'reviewername': review.reviewername,
+                'summary': review.summary,
+                'flights': []}
+
+    zf = zipfile.ZipFile(outfile, 'w', zipfile.ZIP_STORED, allowZip64=True)
+    try:
+        for fhash, flight in review.flights.items():
+            fdict = {'key': fhash}
+            for attr in flightattrs:
+                fdict[attr] = getattr(flight, attr)
+            fdict['reviewComments'] = {}
+            for attr in commentattrs:
+                fdict['reviewComments'][attr] = getattr(flight.reviewComments,
+                                                        attr)
+
+            # Stack all the waypoints for the flight into one table, and
+            #   keep track of where each leg starts/stops in it
+            legs = list(flight.legs)
+            bounds = np.cumsum([0] + [len(leg.relative_time)
+                                      for leg in legs])
+            npts = bounds[-1]
+            waypoints = np.empty((len(waypointcols), npts), dtype=np.float64)
+            times = np.empty((2, npts), dtype=np.int64)
+            lst, coms = [], []
+            fdict['legs'] = []
+            for j, leg in enumerate(legs):
+                ldict = {}
+                for attr in legattrs:
+                    ldict[attr] = getattr(leg, attr)
+                fdict['legs'].append(ldict)
+
+                a, b = bounds[j], bounds[j+1]
+                for k, col in enumerate(waypointcols):
+                    waypoints[k, a:b] = getattr(leg, col)
+                times[0, a:b] = leg.relative_time
+                times[1, a:b] = leg.elapsedtime
+                lst += list(leg.lst)
+                coms += list(leg.comments)
+            manifest['flights'].append(fdict)
+
+            writeArray(zf, fhash + '/waypoints.npy', waypoints)
+            writeArray(zf, fhash + '/times.npy', times)
+            writeArray(zf, fhash + '/lst.npy', np.array(lst, dtype=np.str_))
+            writeArray(zf, fhash + '/comments.npy',
+                       np.array(coms, dtype=np.str_))
+            writeArray(zf, fhash + '/legbounds.npy', bounds.astype(np.int64))
+
+        zf.writestr('manifest.json', json.dumps(manifest,
+                                                default=jsonEncoder))
+    finally:
+        zf.close()
+
+
+def loadSeries(infile, mmap=True):
+    """
+    Read a snapshot file written by saveSeries and return the seriesreview
+    class, fully populated.
+
+    If mmap is True, the waypoint arrays in each leg are read-only views
+    memory mapped from the snapshot file rather than copies in memory.
+    """
+    zf = zipfile.ZipFile(infile, 'r')
+    try:
+        manifest = json.loads(zf.read('manifest.json').decode('utf-8'),
+                              object_hook=jsonDecoder)
+        if manifest.get('format') != snapshotformat:
+            raise ValueError("%s isn't a seriesreview snapshot!" % (infile))
+        if manifest.get('version', 0) > snapshotversion:
+            raise ValueError("Snapshot version %s is newer than this code"
+                             " understands (%d)" % (manifest.get('version'),
+                                                    snapshotversion))
+
+        review = seriesreview()
+        review.seriesname = manifest['seriesname']
+        review.reviewername = manifest['reviewername']
+        review.summary = manifest['summary']
+
+        for fdict in manifest['flights']:
+            fhash = fdict['key']
+            flight = flightprofile()
+            for attr in flightattrs:
+                # Older snapshots won't have everything; keep the defaults
+                if attr in fdict:
+                    setattr(flight, attr, fdict[attr])
+            for attr in tupleattrs:
+                setattr(flight, attr, [tuple(each) for each in
+                                       getattr(flight, attr)])
+            coms = flightcomments()
+            for attr in commentattrs:
+                setattr(coms, attr, fdict['reviewComments'][attr])
+            flight.reviewComments = coms
+
+            waypoints = readArray(zf, infile, fhash + '/waypoints.npy', mmap)
+            times = readArray(zf, infile, fhash + '/times.npy', mmap)
+            lst = readArray(zf, infile, fhash + '/lst.npy', mmap)
+            wcoms = readArray(zf, infile, fhash + '/comments.npy', mmap)
+            bounds = readArray(zf, infile, fhash + '/legbounds.npy', False)
+
+            for j, ldict in enumerate(fdict['legs']):
+                leg = legprofile()
+                for attr in legattrs:
+                    setattr(leg, attr, ldict[attr])
+
+                a, b = bounds[j], bounds[j+1]
+                for k, col in enumerate(waypointcols):
+                    setattr(leg, col, waypoints[k, a:b])
+                leg.reftime = flight.takeoff
+                leg.relative_time = times[0, a:b]
+                leg.elapsedtime = times[1, a:b]
+                leg.lst = lst[a:b].tolist()
+                leg.comments = wcoms[a:b].tolist()
+                flight.legs.append(leg)
+
+            review.flights[fhash] = flight
+    finally:
+        zf.close()
+
+    return review
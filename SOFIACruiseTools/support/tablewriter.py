@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 16:41:05 2026
+
+Writing out simple tables (AOR groups, flight leg summaries) as reST,
+Confluence wiki markup, CSV or Markdown.
+
+Tables are given as a list of column names and a list of columns (each a
+list/array of values), so they're only ever turned into strings once,
+column by column, and then written out row by row.  No astropy tables are
+made along the way since they're relatively expensive to make just to
+immediately write them out and throw them away.
+"""
+
+from __future__ import division, print_function
+
+import sys
+import csv
+
+import numpy as np
+
+
+def cellStrings(column, fmt=None):
+    """
+    Given a column of values (and optionally a format string to use for
+    all of them), return the list of strings that'll go into the table
+    """
+    if fmt is None:
+        return [str(val) for val in column]
+    else:
+        return [fmt % (val) for val in column]
+
+
+def rstWriter(names, strcols, outie):
+    """
+    reST "simple" table, like astropy's ascii.rst writer makes
+    """
+    widths = [max([len(name)] + [len(val) for val in col])
+              for name, col in zip(names, strcols)]
+    rule = " ".join(["=" * width for width in widths]) + "\n"
+
+    outie.write(rule)
+    outie.write(" ".join([name.rjust(width)
+                          for name, width in zip(names, widths)]) + "\n")
+    outie.write(rule)
+    outie.writelines(" ".join([val.rjust(width)
+                               for val, width in zip(row, widths)]) + "\n"
+                     for row in zip(*strcols))
+    outie.write(rule)
+
+
+def confluenceWriter(names, strcols, outie):
+    """
+    Confluence wiki markup table
+    """
+    outie.write("||" + "||".join(["*%s*" % (name) for name in names]) +
+                "||\n")
+    outie.writelines("|" + "|".join(row) + "|\n" for row in zip(*strcols))
+
+
+def csvWriter(names, strcols, outie):
+    """
+    Comma separated values, with a header line of the column names
+    """
+    writer = csv.writer(outie, lineterminator='\n')
+    writer.writerow(names)
+    writer.writerows(zip(*strcols))
+
+
+def markdownWriter(names, strcols, outie):
+    """
+    GitHub flavored Markdown pipe table
+    """
+    outie.write("| " + " | ".join(names) + " |\n")
+    outie.write("|" + "|".join(["---"] * len(names)) + "|\n")
+    outie.writelines("| " + " | ".join(row) + " |\n"
+                     for row in zip(*strcols))
+
+
+# Output type -> function that writes out the table; 'tab' is kept around
+#   since that's what the TO versions of the cheat sheets have always used
+tableWriters = {'rst': rstWriter,
+                'confluence': confluenceWriter,
+                'csv': csvWriter,
+                'tab': csvWriter,
+                'markdown': markdownWriter}
+
+
+def renderTable(names, columns, output='rst', outie=None, formats=None):
+    """
+    Given a list of column names and a matching list of columns, write
+    the table out to outie (a file-like object, stdout by default) in the
+    given output style.
+
+    formats is an optional dict of column name -> format string for
+    any columns that need something other than str() to look nice.
+    """
+    try:
+        writer = tableWriters[output]
+    except KeyError:
+        raise ValueError("Unknown table output type '%s'; expected one of %s"
+                         % (output, sorted(tableWriters.keys())))
+
+    if outie is None:
+        outie = sys.stdout
+    if formats is None:
+        formats = {}
+    strcols = [cellStrings(col, formats.get(name))
+               for name, col in zip(names, columns)]
+
+    writer(names, strcols, outie)
+
+
+def flightLegTable(flight, legtypes=['Takeoff', 'Observing', 'Landing'],
+                   rates=False):
+    """
+    Given a flight class, return the (names, columns) of the leg summary
+    table that goes into the cheat sheets, for just the given leg types.
+
+    Only observing legs have a target position and ranges; the rest are
+    left as None.  If rates is True, the ROF and heading rate ranges are
+    added on the end as well.
+
+    The elevation and ROF ranges are the planner's (start, end) values
+    from the leg header, which keep the direction and the 0/360 wrap.  The
+    rate ranges are the slowest/fastest from the leg's cached stats, so
+    they come out the same as what autoReview judged, even for plans
+    that don't give a heading rate in the header.
+    """
+    legs = [leg for leg in flight.legs if leg.legtype in legtypes]
+    obs = [leg.legtype == 'Observing' for leg in legs]
+
+    def observingOnly(attr):
+        return [getattr(leg, attr) if isobs else None
+                for leg, isobs in zip(legs, obs)]
+
+    def rangeOnly(attr):
+        return [", ".join([str(val) for val in getattr(leg, attr)])
+                if isobs else None for leg, isobs in zip(legs, obs)]
+
+    def statsOnly(attr):
+        return ["%.2f, %.2f" % getattr(leg.stats, attr)[0:2]
+                if isobs else None for leg, isobs in zip(legs, obs)]
+
+    # A leg whose waypoints couldn't be parsed has no start to go by
+    def startHours(leg):
+        if len(leg.relative_time) == 0:
+            return np.nan
+        return leg.relative_time[0]/60./60.
+
+    names = ["Leg Number",
+             "Time Since Takeoff at Leg Start (hrs)",
+             "Leg Type", "ObsBlk", "Target",
+             "RA (2000)", "Dec (2000)",
+             "Obs Duration",
+             "Elevation Range",
+             "ROF Range"]
+    columns = [[leg.legno for leg in legs],
+               np.round([startHours(leg) for leg in legs], 1),
+               [leg.legtype for leg in legs],
+               [leg.obsblk for leg in legs],
+               [leg.target for leg in legs],
+               observingOnly('ra'),
+               observingOnly('dec'),
+               [leg.obsdur for leg in legs],
+               rangeOnly('range_elev'),
+               rangeOnly('range_rof')]
+
+    if rates is True:
+        names += ["ROF Rate", "THdg Rate"]
+        columns += [statsOnly('rofrt'),
+                    statsOnly('thdgrt')]
+
+    return names, columns
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 22:41:53 2026
+
+Looking up where a flight is supposed to be at any given time: which leg
+it's on, and the planned position/heading/elevation/ROF interpolated
+between the waypoints.
+
+Everything is sorted and flattened once up front, so each lookup is just
+a couple of bisections plus one linear interpolation; cheap enough to do
+on every tick of a clock.
+"""
+
+from __future__ import division, print_function
+
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+
+
+def plannedLegStarts(flight):
+    """
+    Given a parsed flight, return the planned start of each leg as seconds
+    since takeoff.  legprofile.start is a time of day, so anything after
+    midnight UTC wraps around.
+    """
+    takeoff = flight.takeoff
+    tsod = takeoff.hour*3600 + takeoff.minute*60 + takeoff.second
+
+    return [(leg.start.total_seconds() - tsod) % 86400 for leg in flight.legs]
+
+
+class flightstate(object):
+    """
+    The planned state of the flight at one instant; angles are in degrees
+    and reltime is seconds since takeoff.  legindex is the position of the
+    leg in flight.legs (not the leg number), or -1 before takeoff.
+    """
+    def __init__(self, reltime):
+        self.reltime = reltime
+        self.legindex = -1
+        self.leg = None
+        self.lat = np.nan
+        self.lon = np.nan
+        self.mhdg = np.nan
+        self.thdg = np.nan
+        self.elev = np.nan
+        self.rof = np.nan
+        self.rofrt = np.nan
+
+
+class flightindex(object):
+    """
+    Time index over a parsed flight.  Leg boundaries come from the planned
+    leg start times (legprofile.start) and each leg's waypoints from its
+    relative_time, both as seconds since takeoff.
+    """
+    # Waypoint quantities that are interpolated; the angles ones are
+    #   unwrapped first so they go the short way around
+    linearcols = ('lat', 'elev')
+    anglecols = ('long', 'mhdg', 'thdg', 'rof')
+
+    def __init__(self, flight):
+        self.takeoff = flight.takeoff
+        self.legs = list(flight.legs)
+
+        self.legstarts = plannedLegStarts(flight)
+        # The landing leg's waypoints can run a little past its duration
+        self.end = 0.
+        if len(self.legs) > 0:
+            self.end = self.legstarts[-1] + \
+                self.legs[-1].duration.total_seconds()
+            if len(self.legs[-1].relative_time) > 0:
+                self.end = max(self.end,
+                               float(self.legs[-1].relative_time[-1]))
+
+        self.times = []
+        self.values = []
+        for leg in self.legs:
+            self.times.append([float(t) for t in leg.relative_time])
+            vals = {}
+            for col in self.linearcols:
+                vals[col] = np.asarray(getattr(leg, col), dtype=np.float64)
+            for col in self.anglecols:
+                ang = np.asarray(getattr(leg, col), dtype=np.float64)
+                good = np.isfinite(ang)
+                ang[good] = np.degrees(np.unwrap(np.radians(ang[good])))
+                vals[col] = ang
+            vals['rofrt'] = np.asarray(leg.rofrt, dtype=np.float64)
+            self.values.append(vals)
+
+    def sinceTakeoff(self, when):
+        """
+        Given a (naive, UTC) datetime or seconds since takeoff, return
+        the seconds since takeoff
+        """
+        if isinstance(when, datetime):
+            return (when - self.takeoff).total_seconds()
+        return float(when)
+
+    def legIndexAt(self, when):
+        """
+        Return the position in flight.legs of the leg in progress at the
+        given time, or -1 if it's before takeoff or after landing
+        """
+        t = self.sinceTakeoff(when)
+        if t < 0 or t > self.end:
+            return -1
+
+        return bisect_right(self.legstarts, t) - 1
+
+    def stateAt(self, when):
+        """
+        Given a (naive, UTC) datetime or seconds since takeoff, return the
+        flightstate with the planned values at that time
+        """
+        t = self.sinceTakeoff(when)
+        state = flightstate(t)
+        i = self.legIndexAt(t)
+        state.legindex = i
+        if i < 0:
+            return state
+        state.leg = self.legs[i]
+
+        times = self.times[i]
+        vals = self.values[i]
+        if len(times) == 0:
+            return state
+
+        # Interpolate between the waypoints either side, holding the
+        #   first/last values outside of them; never across legs
+        k = bisect_right(times, t)
+        if k == 0:
+            a, b, frac = 0, 0, 0.
+        elif k == len(times):
+            a, b, frac = k-1, k-1, 0.
+        else:
+            a, b = k-1, k
+            frac = (t - times[a])/(times[b] - times[a])
+
+        def interp(col):
+            return vals[col][a] + frac*(vals[col][b] - vals[col][a])
+
+        state.lat = interp('lat')
+        state.elev = interp('elev')
+        state.lon = (interp('long') + 180.) % 360. - 180.
+        state.mhdg = interp('mhdg') % 360.
+        state.thdg = interp('thdg') % 360.
+        state.rof = interp('rof') % 360.
+        # ROF rate is for the segment ending at each waypoint
+        state.rofrt = vals['rofrt'][b]
+
+        return state
@@ -0,0 +1,341 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 21:07:16 2026
+
+Checking the planner's numbers: the .mis waypoint table only gives the
+target elevation, ROF and ROF rate at the (sparse) waypoints, so recompute
+them from each leg's RA/Dec/equinox along an interpolated version of the
+track and flag anything that doesn't agree.
+
+Every point of every leg of every flight goes through rofcheck in a
+single vectorized call, so a whole series only takes a moment.
+Non-sidereal legs are skipped since there's no fixed RA/Dec to check, and
+legs whose RA/Dec/equinox can't be understood are reported as unchecked
+rather than holding up the rest.
+"""
+
+from __future__ import division, print_function
+
+import numpy as np
+
+from .MISparse import flightcomments, commentinator
+from . import rofcheck
+
+
+# Default tolerances; elevation and ROF in degrees, ROF rate in deg/min
+elevtol = 0.5
+roftol = 1.0
+rofrttol = 0.05
+
+
+def wrapAngle(ang):
+    """
+    Given angle(s) or angle differences in degrees, return them in the
+    range [-180, 180)
+    """
+    return (np.asarray(ang) + 180.) % 360. - 180.
+
+
+def segmentRates(reltime, ang, minstep=60.):
+    """
+    Given times (seconds) and angles (degrees) at waypoints, return the
+    rate (deg/min) over the segment leading up to each waypoint, just like
+    ROFrt in the .mis file.  The first one is always NaN, as are any
+    segments shorter than minstep seconds since the planner doesn't
+    actually compute a rate over those.
+    """
+    rates = np.full(len(ang), np.nan)
+    if len(ang) > 1:
+        dtime = np.diff(reltime)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rates[1:] = np.where(dtime >= minstep,
+                                 wrapAngle(np.diff(ang))/(dtime/60.), np.nan)
+
+    return rates
+
+
+def interpAngle(x, xp, fp):
+    """
+    np.interp for angles in degrees, going the short way around
+    """
+    fp = np.degrees(np.unwrap(np.radians(fp)))
+    return np.interp(x, xp, fp) % 360.
+
+
+def legTrackTimes(reltime, timestep=60.):
+    """
+    Given the waypoint times (seconds since takeoff) of a leg, return
+    the times along its interpolated track every timestep seconds,
+    always including the last waypoint
+    """
+    if len(reltime) < 2:
+        return np.asarray(reltime, dtype=np.float64)
+    track = np.arange(reltime[0], reltime[-1], timestep, dtype=np.float64)
+
+    return np.append(track, float(reltime[-1]))
+
+
+class legvalidation(object):
+    """
+    The recomputed values for one leg, and how they compare to the plan.
+
+    The waypoint arrays line up with the leg's waypoints; the track_
+    arrays are along the interpolated track, where the planned values are
+    interpolated from the waypoints.  The d* arrays are always recomputed
+    minus planned.  flags is a list of (seconds since takeoff, field,
+    planned, recomputed) for everything outside of the tolerances.
+    unchecked is the reason the leg couldn't be checked at all, or ''.
+    """
+    def __init__(self, leg):
+        self.legno = leg.legno
+        self.target = leg.target
+        self.reltime = np.asarray(leg.relative_time, dtype=np.float64)
+        self.elev = np.array([])
+        self.rof = np.array([])
+        self.rofrt = np.array([])
+        self.delev = np.array([])
+        self.drof = np.array([])
+        self.drofrt = np.array([])
+
+        self.track_time = np.array([])
+        self.track_elev = np.array([])
+        self.track_rof = np.array([])
+        self.track_delev = np.array([])
+        self.track_drof = np.array([])
+
+        self.flags = []
+        self.unchecked = ''
+
+    def worst(self):
+        """
+        Return the largest (absolute) elevation, ROF and ROF rate
+        differences at the waypoints
+        """
+        def biggest(vals):
+            vals = np.abs(vals)
+            vals = vals[np.isfinite(vals)]
+            if vals.size == 0:
+                return 0.
+            return vals.max()
+
+        return biggest(self.delev), biggest(self.drof), biggest(self.drofrt)
+
+
+def checkableLegs(flight):
+    """
+    Return the observing legs of a flight that have a sidereal target
+    and enough of a waypoint table to check
+    """
+    return [leg for leg in flight.legs
+            if leg.legtype == 'Observing' and leg.nonsid is False and
+            leg.ra not in ['', None] and leg.dec not in ['', None] and
+            len(leg.relative_time) > 0]
+
+
+def legCoords(leg):
+    """
+    Return the J2000 RA/Dec (degrees) of a leg's target
+    """
+    ra, dec = rofcheck.targetCoords(leg.ra, leg.dec)
+    ra, dec = ra[0], dec[0]
+    if rofcheck.epochToJD(leg.epoch) != rofcheck.jdJ2000:
+        ra, dec = rofcheck.precess(ra, dec, rofcheck.epochToJD(leg.epoch),
+                                   rofcheck.jdJ2000)
+
+    return ra, dec
+
+
+def flagDifferences(lval, leg, elevtol=elevtol, roftol=roftol,
+                    rofrttol=rofrttol):
+    """
+    Fill in lval.flags with every waypoint outside of the tolerances, plus
+    the worst point between the waypoints if that's out of tolerance too
+    """
+    flags = []
+    planned = [('Elev', np.asarray(leg.elev, dtype=np.float64),
+                lval.elev, lval.delev, elevtol),
+               ('ROF', np.asarray(leg.rof, dtype=np.float64),
+                lval.rof, lval.drof, roftol),
+               ('ROFrt', np.asarray(leg.rofrt, dtype=np.float64),
+                lval.rofrt, lval.drofrt, rofrttol)]
+    for field, plan, calc, diff, tol in planned:
+        with np.errstate(invalid='ignore'):
+            bad = np.flatnonzero(np.abs(diff) > tol)
+        for k in bad:
+            flags.append((lval.reltime[k], field, plan[k], calc[k]))
+
+    # Interpolating linearly between waypoints can hide things; the
+    #   waypoints themselves were already checked above
+    between = np.isin(lval.track_time, lval.reltime, invert=True)
+    tracked = [('Elev', lval.track_elev, lval.track_delev, elevtol),
+               ('ROF', lval.track_rof, lval.track_drof, roftol)]
+    for field, calc, diff, tol in tracked:
+        if not np.any(between):
+            continue
+        k = np.argmax(np.where(between, np.abs(diff), -1.))
+        if np.abs(diff[k]) > tol:
+            flags.append((lval.track_time[k], field + " (between waypoints)",
+                          calc[k] - diff[k], calc[k]))
+
+    lval.flags = sorted(flags, key=lambda x: x[0])
+
+    return lval
+
+
+def validateFlights(flights, timestep=60., pitch=rofcheck.pitch,
+                    elevtol=elevtol, roftol=roftol, rofrttol=rofrttol):
+    """
+    Given a list of parsed flight classes, recompute the target elevation,
+    ROF and ROF rate for every sidereal observing leg both at the
+    waypoints and along the track (sampled every timestep seconds), and
+    compare them against the planned values.
+
+    Returns a list (one per flight) of dicts of leg number ->
+    legvalidation class.
+    """
+    legs = []
+    for i, flight in enumerate(flights):
+        for leg in checkableLegs(flight):
+            legs.append((i, flight, leg))
+    results = [{} for flight in flights]
+
+    # Get every target into J2000 first, all in one batch if they're all
+    #   fine; otherwise one at a time so a bad one only loses its own leg
+    try:
+        ra, dec = rofcheck.targetCoords([leg.ra for i, flight, leg in legs],
+                                        [leg.dec for i, flight, leg in legs])
+        for j, (i, flight, leg) in enumerate(legs):
+            if rofcheck.epochToJD(leg.epoch) != rofcheck.jdJ2000:
+                ra[j], dec[j] = rofcheck.precess(ra[j], dec[j],
+                                                 rofcheck.epochToJD(
+                                                     leg.epoch),
+                                                 rofcheck.jdJ2000)
+    except Exception:
+        good, ra, dec = [], [], []
+        for i, flight, leg in legs:
+            try:
+                lra, ldec = legCoords(leg)
+            except Exception as why:
+                lval = legvalidation(leg)
+                lval.unchecked = "bad RA/Dec (%s: %s)" % \
+                    (type(why).__name__, why)
+                results[i][leg.legno] = lval
+                continue
+            good.append((i, flight, leg))
+            ra.append(lra)
+            dec.append(ldec)
+        legs = good
+    if legs == []:
+        return results
+
+    # Stack up the waypoints and the interpolated tracks for all the legs,
+    #   keeping track of where each one starts and stops
+    times, lats, lons, ras, decs, bounds = [], [], [], [], [], [0]
+    for j, (i, flight, leg) in enumerate(legs):
+        reltime = np.asarray(leg.relative_time, dtype=np.float64)
+        lon = np.degrees(np.unwrap(np.radians(np.asarray(leg.long,
+                                                         dtype=np.float64))))
+        lat = np.asarray(leg.lat, dtype=np.float64)
+        track = legTrackTimes(reltime, timestep=timestep)
+
+        for ptimes in [reltime, track]:
+            times.append(rofcheck.trackTimes(flight.takeoff, ptimes))
+            lats.append(np.interp(ptimes, reltime, lat))
+            lons.append(np.interp(ptimes, reltime, lon))
+            ras.append(np.repeat(ra[j], len(ptimes)))
+            decs.append(np.repeat(dec[j], len(ptimes)))
+            bounds.append(bounds[-1] + len(ptimes))
+
+    elev, az, vpa = rofcheck.horizonCoords(np.concatenate(times),
+                                           np.concatenate(lats),
+                                           np.concatenate(lons),
+                                           np.concatenate(ras),
+                                           np.concatenate(decs),
+                                           epoch=2000.)
+    rof = rofcheck.rofFromVPA(vpa, elev, pitch=pitch)
+
+    for j, (i, flight, leg) in enumerate(legs):
+        lval = legvalidation(leg)
+        a, b, c = bounds[2*j:2*j+3]
+
+        pelev = np.asarray(leg.elev, dtype=np.float64)
+        prof = np.asarray(leg.rof, dtype=np.float64)
+        profrt = np.asarray(leg.rofrt, dtype=np.float64)
+
+        lval.elev = elev[a:b]
+        lval.rof = rof[a:b]
+        lval.rofrt = segmentRates(lval.reltime, lval.rof)
+        lval.delev = lval.elev - pelev
+        lval.drof = wrapAngle(lval.rof - prof)
+        lval.drofrt = lval.rofrt - profrt
+
+        lval.track_time = legTrackTimes(lval.reltime, timestep=timestep)
+        lval.track_elev = elev[b:c]
+        lval.track_rof = rof[b:c]
+        lval.track_delev = lval.track_elev - np.interp(lval.track_time,
+                                                       lval.reltime, pelev)
+        lval.track_drof = wrapAngle(lval.track_rof -
+                                    interpAngle(lval.track_time,
+                                                lval.reltime, prof))
+
+        results[i][leg.legno] = flagDifferences(lval, leg, elevtol=elevtol,
+                                                roftol=roftol,
+                                                rofrttol=rofrttol)
+
+    return results
+
+
+def validateFlight(flight, **kwargs):
+    """
+    validateFlights for just one flight; returns the dict of leg number ->
+    legvalidation class
+    """
+    return validateFlights([flight], **kwargs)[0]
+
+
+def validateSeries(flights, **kwargs):
+    """
+    Given a dict of parsed flight classes (keyed by hash, just like in
+    seriesreview.flights), validate all of them in one go and return a
+    dict of hash -> (dict of leg number -> legvalidation class)
+    """
+    fhashes = list(flights.keys())
+    results = validateFlights([flights[fhash] for fhash in fhashes],
+                              **kwargs)
+
+    return dict(zip(fhashes, results))
+
+
+def validationComments(results, comments=None):
+    """
+    Given the results of validateFlight, add a warning to the (optionally
+    given) flightcomments for each leg with planned values that disagree
+    with the recomputed ones, and return the comments
+    """
+    if comments is None:
+        comments = flightcomments()
+
+    for legno in sorted(results.keys()):
+        lval = results[legno]
+        basetag = "* Leg %02i: " % (legno)
+        if lval.unchecked != '':
+            ntag = "Planned values not checked; %s" % (lval.unchecked)
+            comments = commentinator(comments, 'warning', basetag, ntag)
+            continue
+        if lval.flags == []:
+            continue
+        fields = []
+        for reltime, field, planned, computed in lval.flags:
+            if field not in fields:
+                fields.append(field)
+        for field in fields:
+            diffs = [computed - planned for reltime, fname, planned, computed
+                     in lval.flags if fname == field]
+            if field.startswith('ROF'):
+                diffs = wrapAngle(diffs)
+            worst = diffs[np.argmax(np.abs(diffs))]
+            ntag = "Planned %s disagrees with recomputed by up to %.2f" % \
+                (field, worst)
+            comments = commentinator(comments, 'warning', basetag, ntag)
+
+    return comments
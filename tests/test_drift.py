@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Replaying a flight through the drift tracker the way the Director does:
+a clock that ticks along, the planned state looked up from the drift's
+plan time on every tick, and marks that only say what happened.
+"""
+
+from __future__ import division, print_function
+
+import os
+from datetime import timedelta
+
+import SOFIACruiseTools.support as fpmis
+
+inputs = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      os.pardir, 'inputs')
+
+
+def replay(filename, late=30., step=10.):
+    """
+    Fly every milestone of the flight plan late by the given seconds,
+    ticking every step seconds, and return the drift tracker along with
+    the leg the Director would be showing at each mark
+    """
+    flight = fpmis.parseMIS(os.path.join(inputs, filename), resilient=True)
+    index = fpmis.flightindex(flight)
+    drift = fpmis.drifttracker(flight)
+
+    events = [(0., 'takeoff')]
+    for i in range(len(drift.legstarts)):
+        events.append((drift.legstarts[i], 'legstart'))
+        events.append((drift.ontargets[i], 'ontarget'))
+        events.append((drift.legends[i], 'legend'))
+    events.append((drift.plannedlanding, 'landing'))
+    marks = {'takeoff': drift.markTakeoff,
+             'legstart': drift.markLegStart,
+             'ontarget': drift.markOnTarget,
+             'legend': drift.markLegEnd,
+             'landing': drift.markLanding}
+
+    shown = []
+    t = 0.
+    for planned, kind in events:
+        while t < planned + late:
+            now = flight.takeoff + timedelta(seconds=t)
+            if drift.started is True:
+                drift.tick(now)
+                shown.append(index.stateAt(drift.plantime).legindex)
+            t += step
+        marks[kind](flight.takeoff + timedelta(seconds=planned + late))
+
+    return drift, shown
+
+
+def test_onschedule():
+    for filename in ['07_201705_HA_EZRA_WX12.mis', '201509_FO_04_Wx12.mis',
+                     '201604_HA_03_WX12.mis']:
+        drift, shown = replay(filename, late=30.)
+        legmarks = [mark for mark in drift.marks if mark.legindex >= 0]
+        assert len(legmarks) == 3*len(drift.legstarts)
+        for k, mark in enumerate(legmarks):
+            assert mark.legindex == k // 3
+        for mark in drift.marks:
+            assert abs(mark.slip - 30.) < 1e-6
+        # The displayed leg never goes backwards
+        assert shown == sorted(shown)